@@ -1,67 +1,40 @@
 import curses
-import json
-import hashlib
-import os
-from pathlib import Path
+from concurrent.futures import Future
+from modules import metrics
+from modules.passwords import hash_password_async, verify_password_async
+from modules.screen import color, screen_for
+from modules.session_tokens import issue_token, verify_token
+from modules.storage import get_backend
 
-DATA_DIR = Path("data")
-USERS_FILE = DATA_DIR / "users.json"
-STATS_DIR = DATA_DIR / "stats"
+# username -> session token from this process's last successful login. A
+# re-login with the same password checks the token instead of the KDF.
+session_tokens = {}
+STATUS_POLL_MS = 150  # How often the login screen redraws its status while the KDF runs
 
 def initialize_data_dir():
     """Create necessary directories and files with proper initialization"""
-    os.makedirs(DATA_DIR, exist_ok=True)
-    os.makedirs(STATS_DIR, exist_ok=True)
-    
-    # Initialize users file if empty or invalid
-    if not USERS_FILE.exists():
-        with open(USERS_FILE, 'w') as f:
-            json.dump({}, f)
-    else:
-        # Validate existing file
-        try:
-            with open(USERS_FILE, 'r') as f:
-                json.load(f)
-        except json.JSONDecodeError:
-            with open(USERS_FILE, 'w') as f:
-                json.dump({}, f)
+    get_backend().initialize()
 
-def hash_password(password):
-    """SHA-256 hashing with salt"""
-    salt = "zaman_salt_"
-    return hashlib.sha256((salt + password).encode()).hexdigest()
+def register_user(stdscr, username, password, password_hash=None, backend=None):
+    """Register new user; storage makes the existence check and insert atomic.
 
-def register_user(stdscr, username, password):
-    """Register new user with proper file locking"""
+    The KDF runs on the worker pool unless the caller already hashed the
+    password (`password_hash`). `backend` defaults to get_backend().
+    """
     try:
-        # Read existing users
-        with open(USERS_FILE, 'r') as f:
-            try:
-                users = json.load(f)
-            except json.JSONDecodeError:
-                users = {}
-        
-        # Check if user exists
-        if username in users:
-            return False
-            
-        # Add new user
-        users[username] = hash_password(password)
-        
-        # Write back to file
-        with open(USERS_FILE, 'w') as f:
-            json.dump(users, f)
-        
-        # Create user stats
+        # Create user with starting stats
         user_stats = {
             "toki_balance": 10,
             "eddie_balance": 500,
             "tasks_completed": 0
         }
-        stats_path = STATS_DIR / f"{username}.json"
-        with open(stats_path, 'w') as f:
-            json.dump(user_stats, f)
-            
+        backend = backend or get_backend()
+        if password_hash is None:
+            password_hash = hash_password_async(password).result()
+        if not backend.add_user(username, password_hash, user_stats):
+            return False
+
+        session_tokens[username] = issue_token(username, password, data_dir=backend.root)
         return True
         
     except Exception as e:
@@ -69,34 +42,55 @@ def register_user(stdscr, username, password):
             f.write(f"Registration error: {str(e)}\n")
         return False
 
-def verify_user(username, password):
-    """Verify user credentials with error handling"""
+def verify_user_async(username, password, backend=None):
+    """Future[bool] for a credential check; the KDF runs on the worker pool"""
+    result = Future()
+    backend = backend or get_backend()
+    token = session_tokens.get(username)
+    if token and verify_token(token, password, username, data_dir=backend.root):
+        result.set_result(True)
+        return result
+
+    def remember(check):
+        try:
+            ok = check.result()
+        except Exception:
+            ok = False
+        if ok:
+            session_tokens[username] = issue_token(username, password, data_dir=backend.root)
+        result.set_result(ok)
+
+    try:
+        stored = backend.get_password_hash(username)
+        verify_password_async(password, stored).add_done_callback(remember)
+    except Exception:
+        result.set_result(False)
+    return result
+
+@metrics.timed("verify_user")
+def verify_user(username, password, backend=None, wait=None):
+    """Verify user credentials with error handling; `wait(future)` may redraw while the KDF runs"""
     try:
-        with open(USERS_FILE, 'r') as f:
-            users = json.load(f)
-            return users.get(username) == hash_password(password)
+        future = verify_user_async(username, password, backend)
+        ok = wait(future) if wait else future.result()
     except:
-        return False
+        ok = False
+    if not ok:
+        metrics.count("logins_refused")
+    return ok
 
 class LoginUI:
     def __init__(self, stdscr):
         self.stdscr = stdscr
-        self.height, self.width = stdscr.getmaxyx()
+        self.screen = screen_for(stdscr)
         curses.curs_set(1)
-        curses.init_pair(1, curses.COLOR_CYAN, curses.COLOR_BLACK)
-        curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
-    
-    def clear_screen(self):
-        self.stdscr.clear()
-        self.height, self.width = self.stdscr.getmaxyx()
     
     def show_login_screen(self):
-        self.clear_screen()
-        self.stdscr.addstr(0, 0, "ZAMAN NETWORK", curses.A_BOLD | curses.color_pair(1))
-        self.stdscr.addstr(2, 0, "1. Login", curses.color_pair(1))
-        self.stdscr.addstr(3, 0, "2. Register", curses.color_pair(1))
-        self.stdscr.addstr(4, 0, "3. Exit", curses.color_pair(1))
-        self.stdscr.refresh()
+        with self.screen.frame("login_frame"):
+            self.screen.put(0, 0, "ZAMAN NETWORK", curses.A_BOLD | color("info"))
+            self.screen.put(2, 0, "1. Login", color("info"))
+            self.screen.put(3, 0, "2. Register", color("info"))
+            self.screen.put(4, 0, "3. Exit", color("info"))
         
         while True:
             key = self.stdscr.getch()
@@ -105,23 +99,47 @@ class LoginUI:
             if key == ord('3'): return "exit"
     
     def get_credentials(self):
-        self.clear_screen()
-        self.stdscr.addstr(0, 0, "Username: ", curses.color_pair(1))
+        with self.screen.frame("credentials_frame"):
+            self.screen.put(0, 0, "Username: ", color("info"))
         curses.echo()
         username = self.stdscr.getstr(0, 10, 20).decode().strip()
-        self.stdscr.addstr(1, 0, "Password: ", curses.color_pair(1))
+        self.screen.put(1, 0, "Password: ", color("info"))
         password = self.stdscr.getstr(1, 10, 20).decode().strip()
         curses.noecho()
+        self.screen.forget([0, 1])  # Echoed input
         return username, password
     
+    def show_status(self, msg):
+        """Note shown while a slow step runs; no key press needed"""
+        self.screen.set_line(5, msg, color("info"))
+        self.stdscr.refresh()
+
+    def wait(self, future, msg):
+        """Result of `future`, with `msg` animated on the status line until it is ready"""
+        self.stdscr.timeout(STATUS_POLL_MS)
+        try:
+            ticks = 0
+            while not future.done():
+                self.show_status(msg + "." * (ticks % 4))
+                ticks += 1
+                self.stdscr.getch()  # Sleeps up to STATUS_POLL_MS; keys typed meanwhile are dropped
+        finally:
+            self.stdscr.timeout(-1)
+        return future.result()
+
     def show_message(self, msg, is_error=True):
-        self.stdscr.addstr(5, 0, msg, curses.color_pair(2 if is_error else 1))
+        self.screen.set_line(5, msg, color("error" if is_error else "info"))  # Drops any status note
         self.stdscr.refresh()
         self.stdscr.getch()
 
-def authenticate_user(stdscr):
-    """Main authentication flow with error recovery"""
-    initialize_data_dir()
+def authenticate_user(stdscr, client=None):
+    """Main authentication flow with error recovery.
+
+    With a ZamanClient the credentials are checked by the server, which
+    also logs the connection in.
+    """
+    if client is None:
+        initialize_data_dir()
     ui = LoginUI(stdscr)
     
     while True:
@@ -138,11 +156,19 @@ def authenticate_user(stdscr):
                 continue
                 
             if choice == "login":
-                if verify_user(username, password):
+                ui.show_status("Checking credentials...")
+                if client.login(username, password) if client else verify_user(
+                        username, password, wait=lambda future: ui.wait(future, "Checking credentials")):
                     return username
                 ui.show_message("Invalid credentials!")
             elif choice == "register":
-                if register_user(stdscr, username, password):
+                ui.show_status("Creating account...")
+                if client:
+                    registered = client.register(username, password)
+                else:
+                    password_hash = ui.wait(hash_password_async(password), "Creating account")
+                    registered = register_user(stdscr, username, password, password_hash)
+                if registered:
                     ui.show_message("Registration successful!", False)
                     return username
                 ui.show_message("Username exists or registration failed!")
@@ -0,0 +1,124 @@
+"""Per-user stats files vs. the memory-mapped account table.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_account_table [--users 100000] [--ops 20000]
+
+A temp data/ directory gets --users stats/<user>.json files, the layout
+before the account table, which are then imported into accounts/ as on
+the first start after an upgrade. Both layouts are then put through the
+same work:
+- read: one random user's balances (stats: open and parse the file, as
+  the stats cache did on a miss; table: a cold lookup of the slot, then
+  a warm one);
+- update: store one user's new balances (stats: the atomic
+  temp-file-plus-rename write; table: the record rewritten in place);
+- scan: every user's balances, as migrate and reconcile read them.
+The report shows p50/p99 latency per operation and, per layout, the
+files, the bytes allocated on disk and the Python heap held by the index
+of a process that has seen every user.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from modules.account_table import AccountTable
+from modules.locking import atomic_write_json, read_json
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def disk_usage(path):
+    """(files, bytes allocated) under `path`"""
+    files = allocated = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            allocated += os.stat(os.path.join(root, name)).st_blocks * 512
+    return files, allocated
+
+
+def timed(call, names):
+    samples = []
+    for name in names:
+        start = time.perf_counter()
+        call(name)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    names = [f"user{n:07d}" for n in range(args.users)]
+    picks = [rng.choice(names) for _ in range(args.ops)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        stats_dir = data_dir / "stats"
+        stats_dir.mkdir(parents=True)
+        start = time.perf_counter()
+        for name in names:
+            with open(stats_dir / f"{name}.json", 'w') as f:
+                json.dump({"toki_balance": rng.randint(0, 500), "eddie_balance": rng.randint(0, 50000) / 100,
+                           "tasks_completed": rng.randint(0, 20), "version": 1}, f)
+        print(f"Wrote {args.users} stats files in {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        AccountTable(data_dir / "accounts", stats_dir).initialize()
+        print(f"Imported them into the account table in {time.perf_counter() - start:.1f} s")
+
+        results = {}
+        path = lambda name: stats_dir / f"{name}.json"
+        results[("stats files", "read")] = timed(lambda name: read_json(path(name)), picks)
+        results[("stats files", "update")] = timed(
+            lambda name: atomic_write_json(path(name), {**read_json(path(name)), "version": 2}), picks)
+        start = time.perf_counter()
+        scanned = sum(1 for entry in os.scandir(stats_dir) if read_json(entry.path) is not None)
+        scan_files = time.perf_counter() - start
+
+        table = AccountTable(data_dir / "accounts")
+        table.initialize()
+        results[("table", "read cold")] = timed(table.read, picks)
+        results[("table", "read warm")] = timed(table.read, picks)
+        results[("table", "update")] = timed(lambda name: table.write(name, {**table.read(name), "version": 2}), picks)
+        start = time.perf_counter()
+        scanned_table = sum(1 for _ in table)
+        scan_table = time.perf_counter() - start
+
+        tracemalloc.start()
+        fresh = AccountTable(data_dir / "accounts")
+        fresh.initialize()
+        for _ in fresh:
+            pass
+        index_heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        print(f"{'layout':<12} {'operation':<10} {'p50 us':>8} {'p99 us':>8} {'mean us':>8}")
+        for (layout, operation), samples in results.items():
+            print(f"{layout:<12} {operation:<10} {percentile(samples, 0.5) * 1e6:>8.1f} "
+                  f"{percentile(samples, 0.99) * 1e6:>8.1f} {statistics.mean(samples) * 1e6:>8.1f}")
+        print(f"{'stats files':<12} {'scan':<10} {scanned} users in {scan_files:.2f} s")
+        print(f"{'table':<12} {'scan':<10} {scanned_table} users in {scan_table:.2f} s")
+        for layout, directory in (("stats files", stats_dir), ("table", data_dir / "accounts")):
+            files, allocated = disk_usage(directory)
+            print(f"{layout:<12} {files} files, {allocated / 2**20:.1f} MiB on disk, "
+                  f"{allocated / args.users:.0f} bytes per user")
+        print(f"{'table':<12} index of {args.users} users: {index_heap / 2**20:.1f} MiB of Python heap")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Per-keypress latency of the Browse Tasks screen at several marketplace sizes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_browse [--sizes 10000 100000 500000]
+
+For each size a temp data/ directory is seeded with that many open tasks.
+The screen then runs for real under curses, inside a pseudo-terminal of
+120x40, while a scripted key sequence is fed to handle_key() + draw(). The
+time per key includes fetching task chunks and the terminal update.
+"""
+import argparse
+import json
+import os
+import pty
+import statistics
+import struct
+import tempfile
+import termios
+import time
+import fcntl
+from datetime import datetime
+
+ROWS, COLS = 40, 120
+
+
+def seed(size):
+    os.makedirs("data", exist_ok=True)
+    with open("data/tasks.json", 'w') as f:
+        json.dump([{
+            "id": i,
+            "description": f"Open task number {i}",
+            "creator": f"user{i % 50}",
+            "reward": 10 + i % 940,
+            "status": "open",
+            "created_at": datetime.now().isoformat(),
+            "completed_by": None
+        } for i in range(1, size + 1)], f)
+
+
+def child(size, results_file):
+    import curses
+    from modules.browse_tasks import BrowseTasks
+    from modules.state import AppState
+
+    state = AppState("bench")
+
+    def run(stdscr):
+        view = BrowseTasks(stdscr, state.task_manager, state)
+        view.reload()
+        view.draw()
+        timings = {}
+
+        def press(name, key):
+            start = time.perf_counter()
+            view.handle_key(key)
+            view.draw()
+            timings.setdefault(name, []).append((time.perf_counter() - start) * 1e6)
+
+        def jump(task_id):
+            start = time.perf_counter()
+            view.scroll_pos = min(view.task_manager.open_task_position(task_id), view.max_scroll())
+            view.draw()
+            timings.setdefault("jump", []).append((time.perf_counter() - start) * 1e6)
+
+        for _ in range(300):
+            press("down", curses.KEY_DOWN)
+        for _ in range(100):
+            press("page_down", curses.KEY_NPAGE)
+        for _ in range(50):
+            press("page_up", curses.KEY_PPAGE)
+        for _ in range(20):
+            press("end", curses.KEY_END)
+            press("home", curses.KEY_HOME)
+        for n in range(50):
+            jump(1 + (n * 7919) % size)
+        for _ in range(10):
+            press("sort", ord('s'))  # The first pass through each mode builds its index
+            for _ in range(20):
+                press("sorted_down", curses.KEY_NPAGE)
+
+        with open(results_file, 'w') as f:
+            json.dump({name: sorted(values) for name, values in timings.items()}, f)
+
+    curses.wrapper(run)
+
+
+def run(size):
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            seed(size)
+            results_file = os.path.join(tmp, "results.json")
+            pid, fd = pty.fork()
+            if pid == 0:
+                os.environ["TERM"] = "xterm-256color"
+                fcntl.ioctl(0, termios.TIOCSWINSZ, struct.pack("HHHH", ROWS, COLS, 0, 0))
+                try:
+                    child(size, results_file)
+                finally:
+                    os._exit(0)
+            terminal_bytes = 0
+            while True:
+                try:
+                    data = os.read(fd, 65536)  # Drain the terminal so the child never blocks
+                except OSError:
+                    break
+                if not data:
+                    break
+                terminal_bytes += len(data)
+            os.waitpid(pid, 0)
+            with open(results_file) as f:
+                timings = json.load(f)
+        finally:
+            os.chdir(cwd)
+    summary = {name: (round(statistics.median(v), 1), round(v[int(len(v) * 0.99) - 1], 1))
+               for name, v in timings.items()}
+    return summary, terminal_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    args = parser.parse_args()
+
+    keys = ("down", "page_down", "page_up", "end", "home", "jump", "sort", "sorted_down")
+    print(f"{'open tasks':>10}" + "".join(f" {k + ' p50/p99 us':>24}" for k in keys) + f" {'tty KB':>8}")
+    for size in args.sizes:
+        summary, terminal_bytes = run(size)
+        print(f"{size:>10}" + "".join(f" {f'{summary[k][0]} / {summary[k][1]}':>24}" for k in keys)
+              + f" {terminal_bytes // 1024:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Throughput of the streaming task import and export (modules.task_bulk).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_bulk_import [--rows 1000000] [--creators 20] [--format jsonl]
+                                           [--batch-size 10000] [--baseline 2000]
+
+A temp data/ directory gets --creators accounts with enough eddies for
+everything, and a --rows input file (about 1% of the rows invalid). The
+benchmark imports it and reports tasks per second and peak memory, then
+exports everything back. For comparison, --baseline tasks are first
+created one at a time through AppState.create_task, as the Create Task
+screen does.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+
+def write_input(path, fmt, rows, creators, rng):
+    with open(path, 'w', newline="") as f:
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer:
+            writer.writerow(("description", "creator", "reward", "time_era"))
+        for n in range(rows):
+            reward = rng.randint(10, 950) if rng.random() > 0.01 else 5  # Some rows break the reward rule
+            row = (f"Bulk task {n}: sort the archive shelves", f"partner{rng.randrange(creators)}", reward,
+                   rng.choice(("past", "present", "future")))
+            if writer:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(dict(zip(("description", "creator", "reward", "time_era"), row))) + "\n")
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--creators", type=int, default=20)
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--baseline", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            from modules.state import AppState
+            from modules.storage import get_backend
+            from modules.task_bulk import export_tasks, import_tasks
+            from modules.task_manager import TaskManager
+
+            backend = get_backend()
+            budget = 950 * args.rows
+            for n in range(args.creators):
+                backend.add_user(f"partner{n}", "x", {"toki_balance": 0, "eddie_balance": budget,
+                                                      "tasks_completed": 0})
+            input_file = f"tasks.{args.format}"
+            write_input(input_file, args.format, args.rows, args.creators, rng)
+            print(f"Input: {args.rows} rows, {os.path.getsize(input_file) / 1e6:.0f} MB {args.format}; "
+                  f"peak RSS before import {peak_rss_mb():.0f} MB")
+
+            if args.baseline:
+                state = AppState("partner0", backend)
+                start = time.perf_counter()
+                for n in range(args.baseline):
+                    state.create_task(f"Interactive task {n}", 100)
+                seconds = time.perf_counter() - start
+                print(f"create_task one by one: {args.baseline / seconds:>9.0f} tasks/s")
+
+            task_manager = TaskManager(backend)
+            with open(input_file, newline="") as f:
+                report = import_tasks(f, args.format, args.batch_size, backend, task_manager)
+            print(f"import-tasks:           {report['tasks_per_second']:>9} tasks/s "
+                  f"({report['imported']} imported, {report['rejected']} rejected, {report['batches']} batches, "
+                  f"{report['seconds']:.1f} s); peak RSS {peak_rss_mb():.0f} MB")
+
+            start = time.perf_counter()
+            with open("export.jsonl", 'w') as f:
+                written = export_tasks(f, "jsonl", task_manager=task_manager)
+            seconds = time.perf_counter() - start
+            print(f"export-tasks:           {written / seconds:>9.0f} tasks/s ({written} tasks)")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Balance-change throughput of the JSON backend in each commit mode.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_group_commit [--modes fsync batched async] [--threads 1 8 32]
+                                            [--ops 2000] [--users 64]
+
+For every mode and thread count, a fresh data/ directory is seeded with
+--users accounts. The threads then split --ops buy-style changes (toki
+up, eddies down, with a ledger entry) between them. The report shows
+throughput, per-change latency, how many batches were committed (one
+ledger write, and in fsync/batched mode one fsync, each) and how many
+changes each batch carried on average. Afterwards every account is
+checked against its ledger entries.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+SEED_STATS = {"toki_balance": 0, "eddie_balance": 10**9, "tasks_completed": 0}
+
+
+def run(mode, threads, ops, users):
+    os.environ["ZAMAN_COMMIT_MODE"] = mode
+    from modules.storage.json_backend import JSONBackend
+
+    backend = JSONBackend("data")
+    backend.initialize()
+    for n in range(users):
+        backend.add_user(f"user{n}", "x", dict(SEED_STATS))
+
+    latencies = []
+    per_thread = ops // threads
+
+    def client(seed):
+        rng = random.Random(seed)
+        mine = []
+        for _ in range(per_thread):
+            username = f"user{rng.randrange(users)}"
+            entry = {"username": username, "type": "buy", "amount": 1, "fee": 0, "timestamp": "bench"}
+            start = time.perf_counter()
+            backend.change_balances(username, toki=1, eddie=-190, ledger_entry=entry)
+            mine.append(time.perf_counter() - start)
+        latencies.extend(mine)
+
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    backend.flush()
+    elapsed = time.perf_counter() - start
+
+    bought = {}
+    for tx in backend.ledger.iter_transactions():
+        bought[tx["username"]] = bought.get(tx["username"], 0) + tx["amount"]
+    consistent = all(backend.load_stats(f"user{n}")["toki_balance"] == bought.get(f"user{n}", 0)
+                     for n in range(users))
+    return elapsed, sorted(latencies), backend.committer.batches, consistent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["fsync", "batched", "async"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'threads':>7} {'changes/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'batches':>8} {'per batch':>9}  ledger")
+    for mode in args.modes:
+        for threads in args.threads:
+            with tempfile.TemporaryDirectory() as tmp:
+                cwd = os.getcwd()
+                os.chdir(tmp)
+                try:
+                    elapsed, latencies, batches, consistent = run(mode, threads, args.ops, args.users)
+                finally:
+                    os.chdir(cwd)
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"{mode:<8} {threads:>7} {len(latencies) / elapsed:>10.0f} "
+                  f"{statistics.median(latencies) * 1e3:>8.2f} {p99 * 1e3:>8.2f} "
+                  f"{batches:>8} {len(latencies) / max(1, batches):>9.1f}  {'ok' if consistent else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Ledger aggregates from the columnar archive vs parsing the JSON segments.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ledger_archive [--rows 1000000] [--users 5000] [--days 90]
+
+A temp ledger is filled with --rows synthetic transactions spread over
+--days days, all in sealed segments. The archive is built once (timed).
+Then every query is answered from the archive and by the old method,
+which parses every segment into dicts and aggregates them. Both results
+must match. Sizes of the JSON segments and the column files are shown too.
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from modules.ledger import Ledger
+
+TYPES = ("buy", "cash_out", "task_reward", "task_created")
+SEGMENT_ROWS = 10_000
+QUERIES = [
+    ("fee total", "fee", None, {}),
+    ("count by type", "count", "type", {}),
+    ("amount by type", "amount", "type", {}),
+    ("fee by day", "fee", "day", {}),
+    ("amount by user", "amount", "user", {}),
+    ("buys in one week", "amount", None, {"types": "buy"}),
+    ("buys by user, week", "amount", "user", {"types": "buy"}),
+    ("buys by day, week", "count", "day", {"types": "buy"}),
+]
+
+
+def fill(ledger_dir, rows, users, days, rng):
+    """Write sealed segments directly (much faster than appending one by one)"""
+    ledger_dir.mkdir(parents=True)
+    (ledger_dir / "index").mkdir()  # History paging is not measured here
+    start = datetime(2026, 1, 1)
+    step = timedelta(days=days) / rows
+    number = 0
+    for first in range(0, rows, SEGMENT_ROWS):
+        number += 1
+        lines = []
+        for n in range(first, min(rows, first + SEGMENT_ROWS)):
+            tx_type = rng.choice(TYPES)
+            amount = rng.randint(1, 950)
+            lines.append(json.dumps({"username": f"user{rng.randrange(users)}", "type": tx_type,
+                                     "amount": amount, "fee": round(amount * 0.15, 2) if tx_type == "buy" else 0,
+                                     "timestamp": (start + step * n).isoformat(), "seq": n + 1}) + "\n")
+        with open(ledger_dir / f"segment-{number:06d}.jsonl", 'w') as f:
+            f.writelines(lines)
+    with open(ledger_dir / "checkpoint.json", 'w') as f:
+        json.dump({"total_fees": 0, "segment": number + 1, "offset": 0, "count": rows}, f)
+    return start
+
+
+def scan(ledger, metric, by, filters):
+    """The pre-archive way: parse everything, aggregate dicts"""
+    types = filters.get("types")
+    since = filters.get("since")
+    until = filters.get("until")
+    totals = Counter()
+    for tx in ledger.iter_transactions():
+        if types and tx["type"] != types:
+            continue
+        day = tx["timestamp"][:10]
+        if (since and day < since) or (until and day > until):
+            continue
+        key = {None: None, "day": day, "type": tx["type"], "user": tx["username"]}[by]
+        totals[key] += 1 if metric == "count" else round(tx[metric] * 100)
+    scale = 1 if metric == "count" else 100
+    if by is None:
+        return totals[None] / scale if scale != 1 else totals[None]
+    return {key: (value / scale if scale != 1 else value) for key, value in sorted(totals.items())}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger_dir = Path(tmp) / "ledger"
+        start = fill(ledger_dir, args.rows, args.users, args.days, random.Random(args.seed))
+        week = {"types": "buy", "since": (start + timedelta(days=7)).date().isoformat(),
+                "until": (start + timedelta(days=13)).date().isoformat()}
+        ledger = Ledger(ledger_dir, Path(tmp) / "none.json")
+        added, seconds = timed(ledger.archive.compact, ledger)
+        json_bytes = sum(p.stat().st_size for p in ledger_dir.glob("segment-*.jsonl"))
+        column_bytes = sum(p.stat().st_size for p in (ledger_dir / "archive").iterdir())
+        print(f"{args.rows} transactions: JSON segments {json_bytes / 2**20:.1f} MiB, "
+              f"archive {column_bytes / 2**20:.1f} MiB, built in {seconds:.1f} s ({added} rows)")
+
+        print(f"{'query':<18} {'archive ms':>11} {'json scan ms':>13} {'speed-up':>9}  match")
+        for label, metric, by, filters in QUERIES:
+            if "week" in label:
+                filters = week
+            fast, fast_seconds = timed(ledger.summarize, metric, by, **filters)
+            slow, slow_seconds = timed(scan, ledger, metric, by, filters)
+            match = fast == slow if not isinstance(fast, float) else abs(fast - slow) < 1e-6 * max(1, abs(slow))
+            print(f"{label:<18} {fast_seconds * 1e3:>11.1f} {slow_seconds * 1e3:>13.1f} "
+                  f"{slow_seconds / fast_seconds:>8.0f}x  {'ok' if match else 'MISMATCH'}")
+        ledger.archive.close()
+
+
+if __name__ == "__main__":
+    main()
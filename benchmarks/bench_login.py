@@ -0,0 +1,87 @@
+"""Login throughput under concurrent attempts at several KDF cost settings.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_login [--kdfs scrypt:12 scrypt:14 scrypt:15 pbkdf2:100000 pbkdf2:600000]
+                                     [--attempts 64] [--workers 1 4]
+
+For each KDF setting, accounts are created with hashes at that cost. A
+burst of login attempts (one in ten with a wrong password) is then
+submitted to auth.verify_user_async all at once, and throughput and
+per-attempt latency are reported for each pool size. The burst is then
+repeated as re-logins, which are answered from the session tokens issued
+by the first burst without running the KDF.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+ACCOUNTS = 32
+
+
+def burst(verify_user_async, attempts, rng):
+    """Run `attempts` concurrent logins; (seconds, sorted latencies, successes)"""
+    futures = []
+    start = time.perf_counter()
+    for n in range(attempts):
+        user = f"user{rng.randrange(ACCOUNTS)}"
+        password = "pw" if rng.random() >= 0.1 else "wrong"
+        submitted = time.perf_counter()
+        future = verify_user_async(user, password)
+        future.add_done_callback(lambda f, submitted=submitted: f.__setattr__("latency", time.perf_counter() - submitted))
+        futures.append(future)
+    successes = sum(future.result() for future in futures)
+    elapsed = time.perf_counter() - start
+    return elapsed, sorted(future.latency for future in futures), successes
+
+
+def run(kdf, attempts, workers):
+    os.environ["ZAMAN_KDF"] = kdf
+    import auth
+    from modules import passwords
+    from modules.storage import get_backend
+
+    passwords.set_pool_size(max(workers))
+    backend = get_backend()
+    hashes = [passwords.hash_password_async("pw") for _ in range(ACCOUNTS)]
+    for n, password_hash in enumerate(hashes):
+        backend.add_user(f"user{n}", password_hash.result(), {"toki_balance": 10, "eddie_balance": 500,
+                                                             "tasks_completed": 0})
+    rows = []
+    for pool_size in workers:
+        passwords.set_pool_size(pool_size)
+        auth.session_tokens.clear()
+        elapsed, latencies, _ = burst(auth.verify_user_async, attempts, random.Random(pool_size))
+        rows.append((f"{pool_size} workers", elapsed, latencies))
+    elapsed, latencies, _ = burst(auth.verify_user_async, attempts, random.Random(workers[-1]))
+    rows.append(("re-login (token)", elapsed, latencies))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kdfs", nargs="+",
+                        default=["scrypt:12", "scrypt:14", "scrypt:15", "pbkdf2:100000", "pbkdf2:600000"])
+    parser.add_argument("--attempts", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    print(f"{'kdf':<15} {'mode':<18} {'logins/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for kdf in args.kdfs:
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                for mode, elapsed, latencies in run(kdf, args.attempts, args.workers):
+                    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                    print(f"{kdf:<15} {mode:<18} {args.attempts / elapsed:>10.0f} "
+                          f"{statistics.median(latencies) * 1e3:>9.2f} {p99 * 1e3:>9.2f}")
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
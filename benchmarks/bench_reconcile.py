@@ -0,0 +1,130 @@
+"""Wall time of the balance audit (modules.reconcile) by worker count.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_reconcile [--users 100000] [--transactions 1000000] [--tasks 100000]
+                                         [--drift 50] [--workers 1 4]
+
+A temp data/ directory is written directly (no KDF, no locking). It
+holds --users accounts, a ledger of --transactions buys and cash-outs,
+and --tasks tasks, half of them completed, and every stats file agrees
+with all of that except --drift users whose eddies were nudged. The
+stats files are imported into the account table before the clock starts,
+as on the first start after an upgrade. The audit then runs once per
+worker count. Each run must report exactly the nudged users.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from modules.account_table import AccountTable
+from modules.reconcile import reconcile
+from modules.storage.base import DEFAULT_STATS
+from modules.user_directory import UserDirectory
+
+SEGMENT_ROWS = 10_000
+
+
+def seed(data_dir, users, transactions, tasks, drift, rng):
+    names = [f"user{n}" for n in range(users)]
+    balances = {name: dict(DEFAULT_STATS) for name in names}  # Opening balances the audit assumes
+
+    directory = UserDirectory(data_dir / "users")
+    directory.directory.mkdir(parents=True)
+    shards = {}
+    for name in names:
+        shards.setdefault(directory.shard(name), []).append(directory.record(name, "x"))
+    for shard, lines in shards.items():
+        with open(directory.shard_path(shard), 'w') as f:
+            f.writelines(lines)
+    with open(directory.meta_file, 'w') as f:
+        json.dump({"shards": directory.shards, "version": 1}, f)
+
+    ledger_dir = data_dir / "ledger"
+    (ledger_dir / "index").mkdir(parents=True)
+    timestamp = datetime.now().isoformat()
+    number = 0
+    for first in range(0, transactions, SEGMENT_ROWS):
+        number += 1
+        lines = []
+        for seq in range(first + 1, min(transactions, first + SEGMENT_ROWS) + 1):
+            name = names[rng.randrange(users)]
+            amount = rng.randint(1, 5)
+            if rng.random() < 0.5:
+                fee = round(amount * 190 * 0.15, 2)
+                deltas = {"toki": amount, "eddie": -(amount * 190 + fee), "tasks_completed": 0}
+                tx_type = "buy"
+            else:
+                fee = round(amount * 0.15, 2)
+                deltas = {"toki": -amount, "eddie": (amount - fee) * 190, "tasks_completed": 0}
+                tx_type = "cash_out"
+            stats = balances[name]
+            stats["toki_balance"] += deltas["toki"]
+            stats["eddie_balance"] += deltas["eddie"]
+            stats["ledger_seq"] = seq
+            lines.append(json.dumps({"username": name, "type": tx_type, "amount": amount, "fee": fee,
+                                     "timestamp": timestamp, "seq": seq, "deltas": deltas}) + "\n")
+        with open(ledger_dir / f"segment-{number:06d}.jsonl", 'w') as f:
+            f.writelines(lines)
+    with open(ledger_dir / "checkpoint.json", 'w') as f:
+        json.dump({"total_fees": 0, "segment": number + 1, "offset": 0, "count": transactions}, f)
+
+    task_list = []
+    for task_id in range(1, tasks + 1):
+        creator, worker = rng.choice(names), rng.choice(names)
+        reward = rng.randint(10, 950)
+        completed = task_id % 2 == 0
+        balances[creator]["eddie_balance"] -= reward
+        if completed:
+            balances[worker]["eddie_balance"] += reward
+            balances[worker]["tasks_completed"] += 1
+        task_list.append({"id": task_id, "description": f"Task {task_id}", "creator": creator, "reward": reward,
+                          "status": "completed" if completed else "open", "created_at": timestamp,
+                          "completed_by": worker if completed else None})
+    with open(data_dir / "tasks.json", 'w') as f:
+        json.dump(task_list, f)
+
+    nudged = set(rng.sample(names, drift))
+    (data_dir / "stats").mkdir()
+    for name, stats in balances.items():
+        if name in nudged:
+            stats["eddie_balance"] += 1
+        stats["eddie_balance"] = round(stats["eddie_balance"], 2)
+        with open(data_dir / "stats" / f"{name}.json", 'w') as f:
+            json.dump(stats, f)
+    AccountTable(data_dir / "accounts", data_dir / "stats").initialize()
+    return nudged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--drift", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        start = time.perf_counter()
+        nudged = seed(data_dir, args.users, args.transactions, args.tasks, args.drift, random.Random(args.seed))
+        print(f"Seeded {args.users} users, {args.transactions} transactions, {args.tasks} tasks "
+              f"in {time.perf_counter() - start:.1f} s")
+        print(f"{'workers':>7} {'map s':>8} {'total s':>8} {'users/s':>10}  found")
+        for workers in args.workers:
+            report = reconcile(data_dir, workers)
+            found = {problem["username"] for problem in report["details"]}
+            print(f"{workers:>7} {report['map_seconds']:>8.2f} {report['seconds']:>8.2f} "
+                  f"{report['users'] / report['seconds']:>10.0f}  "
+                  f"{'ok' if found == nudged else f'MISMATCH ({len(found)} reported)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Terminal output of a scripted session: bytes written per interaction.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_render [--tasks 2000] [--burst 30]
+
+A temp data/ directory is seeded with one account, some ledger history
+and --tasks open tasks. main.py then runs in an 80x24 pseudo-terminal
+and the script logs in, moves around the main menu one key at a time,
+holds the down arrow (--burst presses sent at once), pages through the
+transaction history, scrolls the marketplace and logs out. After each key
+press the output is read until the terminal goes quiet. The report shows
+the bytes the application wrote to the terminal in each phase and per key
+press, which is what crosses the network over SSH.
+"""
+import argparse
+import fcntl
+import json
+import os
+import pty
+import select
+import struct
+import sys
+import tempfile
+import termios
+import time
+from datetime import datetime
+
+ROWS, COLS = 24, 80
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUIET = 0.15  # Seconds without output that end one interaction
+UP, DOWN, PGUP, PGDN, ENTER = b"\x1bOA", b"\x1bOB", b"\x1b[5~", b"\x1b[6~", b"\n"
+
+
+def seed(tasks):
+    sys.path.insert(0, REPO)
+    import auth
+    from modules.state import AppState
+    auth.initialize_data_dir()
+    auth.register_user(None, "bench", "pw")
+    state = AppState("bench")
+    state.change_balances(eddie=10**6)
+    for _ in range(30):
+        state.buy_toki(1)
+    with open("data/tasks.json", 'w') as f:
+        json.dump([{"id": i, "description": f"Open task number {i}", "creator": f"user{i % 50}",
+                    "reward": 10 + i % 940, "status": "open", "created_at": datetime.now().isoformat(),
+                    "completed_by": None} for i in range(1, tasks + 1)], f)
+    state.logout()
+
+
+class Terminal:
+    def __init__(self):
+        self.pid, self.fd = pty.fork()
+        if self.pid == 0:
+            os.environ["TERM"] = "xterm-256color"
+            os.environ["PYTHONPATH"] = REPO
+            fcntl.ioctl(0, termios.TIOCSWINSZ, struct.pack("HHHH", ROWS, COLS, 0, 0))
+            os.execv(sys.executable, [sys.executable, os.path.join(REPO, "main.py")])
+
+    def drain(self, quiet=QUIET):
+        """Read until nothing arrives for `quiet` seconds; bytes read"""
+        total = 0
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], quiet)
+            if not ready:
+                return total
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError:
+                return total
+            if not data:
+                return total
+            total += len(data)
+
+    def press(self, *keys):
+        """Send keys one at a time, each followed by a drain; bytes written by the app"""
+        total = 0
+        for key in keys:
+            os.write(self.fd, key)
+            total += self.drain()
+        return total
+
+    def burst(self, key, count):
+        os.write(self.fd, key * count)
+        return self.drain()
+
+    def close(self):
+        try:
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            pass
+
+
+def session(burst):
+    term = Terminal()
+    phases = []
+
+    def phase(name, presses, nbytes):
+        phases.append((name, presses, nbytes))
+
+    term.drain(1.0)
+    phase("login", 3, term.press(b"1", b"bench\n", b"pw\n") + term.drain(1.0))
+    phase("menu, one key at a time", 20, term.press(*[DOWN, UP] * 10))
+    phase(f"menu, {burst} held-down presses", burst, term.burst(DOWN, burst))
+    term.press(*[UP] * 6)
+    phase("history, open, page and back", 8, term.press(*[DOWN] * 4, ENTER, PGDN, PGUP, b"q"))
+    term.press(*[UP] * 6, *[DOWN] * 3)
+    term.press(ENTER)
+    time.sleep(0.5)
+    term.drain(0.5)
+    phase("marketplace, one key at a time", 20, term.press(*[DOWN] * 20))
+    phase(f"marketplace, {burst} held-down presses", burst, term.burst(DOWN, burst))
+    phase("marketplace, page down", 3, term.press(PGDN, PGDN, PGDN))
+    term.press(b"q")
+    term.press(*[DOWN] * 6, ENTER, b"3")
+    term.close()
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            seed(args.tasks)
+            phases = session(args.burst)
+        finally:
+            os.chdir(cwd)
+    print(f"{'phase':<36} {'keys':>5} {'bytes':>8} {'bytes/key':>10}")
+    for name, presses, nbytes in phases:
+        print(f"{name:<36} {presses:>5} {nbytes:>8} {nbytes / presses:>10.0f}")
+    total = sum(nbytes for _, _, nbytes in phases[1:])
+    keys = sum(presses for _, presses, _ in phases[1:])
+    print(f"{'after login':<36} {keys:>5} {total:>8} {total / keys:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Task search latency: indexed search vs a linear scan over open tasks.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_search [--sizes 10000 100000 1000000]
+
+Tasks get descriptions drawn from a small vocabulary, a creator, an era and
+a reward. Each query is run against the TaskStore's search index and
+checked against a plain scan of the open tasks. Index build time and the
+cost of keeping the index current on create/complete are reported too.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from modules.task_search import parse_query, tokenize
+from modules.task_store import TaskStore
+
+WORDS = ("fix", "deliver", "hoverboard", "flux", "capacitor", "scan", "courier", "repair",
+         "neon", "sign", "ancient", "scroll", "translate", "robot", "garden", "water",
+         "market", "paint", "mural", "clock", "tower", "chrono", "relay", "signal")
+ERAS = ("past", "present", "future")
+QUERIES = ("hoverboard", "flux capacitor", "chr", "repair era:future",
+           "creator:user7", "reward:100-250", "neon sign reward:500-", "courier creator:user3 era:past")
+
+
+def make_tasks(size, rng):
+    return [{
+        "id": i,
+        "description": " ".join(rng.choice(WORDS) for _ in range(4)),
+        "creator": f"user{i % 50}",
+        "reward": rng.randint(10, 950),
+        "status": "open" if i % 4 else "completed",
+        "created_at": "2026-01-01T00:00:00",
+        "completed_by": None,
+        "time_era": rng.choice(ERAS)
+    } for i in range(1, size + 1)]
+
+
+def scan(store, query):
+    text, filters = parse_query(query)
+    words = tokenize(text)
+    low = filters.get("min_reward")
+    high = filters.get("max_reward")
+    ids = []
+    for task in store.with_status("open"):
+        tokens = tokenize(task["description"])
+        if words and not (all(w in tokens for w in words[:-1])
+                          and any(t.startswith(words[-1]) for t in tokens)):
+            continue
+        if "creator" in filters and task["creator"] != filters["creator"]:
+            continue
+        if "era" in filters and task.get("time_era") != filters["era"]:
+            continue
+        if low is not None and task["reward"] < low or high is not None and task["reward"] > high:
+            continue
+        ids.append(task["id"])
+    return ids
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1e3)
+    return result, statistics.median(samples)
+
+
+def run(size, repeat):
+    rng = random.Random(size)
+    store = TaskStore(make_tasks(size, rng))
+    start = time.perf_counter()
+    store.search_index
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    rows = []
+    for query in QUERIES:
+        text, filters = parse_query(query)
+        ids, indexed_ms = timed(lambda: store.search(text, **filters), repeat)
+        expected, scan_ms = timed(lambda: scan(store, query), 1)
+        assert ids == expected, f"search mismatch for {query!r}"
+        rows.append((query, len(ids), indexed_ms, scan_ms))
+
+    # Incremental maintenance: create and complete tasks with the index live
+    start = time.perf_counter()
+    for task in make_tasks(1000, rng):
+        task["id"] = store.allocate_id()
+        task["status"] = "open"
+        store.add(task)
+        store.set_status(task["id"], "completed", completed_by="bench")
+    update_us = (time.perf_counter() - start) * 1e6 / 2000
+    return build_ms, rows, update_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        build_ms, rows, update_us = run(size, args.repeat)
+        print(f"{size} tasks: index build {build_ms:.0f} ms, {update_us:.1f} us per create/complete")
+        print(f"  {'query':<36} {'hits':>8} {'indexed ms':>11} {'scan ms':>9}")
+        for query, hits, indexed_ms, scan_ms in rows:
+            print(f"  {query:<36} {hits:>8} {indexed_ms:>11.2f} {scan_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Task completion throughput with batched reward settlement.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_settlement [--tasks 5000] [--users 50] [--threads 1 8] [--modes batched async]
+
+For every commit mode and thread count, a fresh data/ directory is seeded with --users
+accounts and --tasks open tasks. The threads then complete every task
+through AppState.complete_task, each thread for its own users, two ways:
+- direct: each completion credits the completer with its own
+  change_balances call and ledger entry, with no settlement queue;
+- pipeline: each completion goes through SettlementPipeline, which
+  credits it before returning (batched mode: concurrent completions share
+  a batch) or queues it for a background batch (async mode).
+The report shows completions per second, ledger entries written and
+settlement batches. Afterwards every balance is checked against the
+completed tasks, and the reconcile audit must find no problem.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+SEED_STATS = {"toki_balance": 10, "eddie_balance": 500, "tasks_completed": 0}  # DEFAULT_STATS, as reconcile expects
+
+
+def seed(backend, tasks, users):
+    from modules.task_manager import TaskManager
+    for n in range(users):
+        backend.add_user(f"user{n}", "x", dict(SEED_STATS))
+    backend.add_user("publisher", "x", dict(SEED_STATS))  # Not charged for the tasks, so reconcile skips it
+    task_manager = TaskManager(backend)
+    with task_manager.transaction():
+        task_manager.create_tasks([{"description": f"Task {n}", "creator": "publisher", "reward": 10 + n % 940}
+                                   for n in range(tasks)])
+    task_manager.save_tasks()
+    return task_manager
+
+
+def run(way, threads, tasks, users):
+    os.environ["ZAMAN_STORAGE"] = "json"
+    from modules.reconcile import reconcile
+    from modules.state import AppState
+    from modules.storage.json_backend import JSONBackend
+
+    backend = JSONBackend("data")
+    backend.initialize()
+    task_manager = seed(backend, tasks, users)
+    open_ids = [task["id"] for task in task_manager.get_all_tasks()]
+
+    def client(index):
+        states = [AppState(f"user{n}", backend, task_manager) for n in range(index, users, threads)]
+        for step, task_id in enumerate(open_ids[index::threads]):
+            state = states[step % len(states)]
+            if way == "pipeline":
+                state.complete_task(task_id)
+            else:
+                with task_manager.transaction():
+                    reward = task_manager.complete_task(task_id, state.username)
+                    state.change_balances(eddie=reward, tasks_completed=1,
+                                          ledger_entry={**state.ledger_entry("task_reward", reward),
+                                                        "tasks": [task_id]})
+
+    entries_before = backend.ledger.count
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    backend.flush()
+    elapsed = time.perf_counter() - start
+
+    earned = {}
+    for task in task_manager.store.with_status("completed"):
+        earned[task["completed_by"]] = earned.get(task["completed_by"], 0) + task["reward"]
+    wrong = [n for n in range(users) if backend.load_stats(f"user{n}")["eddie_balance"]
+             != SEED_STATS["eddie_balance"] + earned.get(f"user{n}", 0)]
+    report = reconcile("data", workers=1)
+    problems = [problem for problem in report["details"] if problem["username"] != "publisher"]  # Never paid
+    return {
+        "rate": tasks / elapsed,
+        "entries": backend.ledger.count - entries_before,
+        "batches": backend.settlements.batches,
+        "ok": not wrong and not problems,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--modes", nargs="+", choices=("fsync", "batched", "async"), default=["batched", "async"])
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'way':>9} {'threads':>7} {'tasks/s':>9} {'ledger entries':>15} {'batches':>8}  result")
+    for mode in args.modes:
+        os.environ["ZAMAN_COMMIT_MODE"] = mode
+        for threads in args.threads:
+            for way in ("direct", "pipeline"):
+                with tempfile.TemporaryDirectory() as tmp:
+                    cwd = os.getcwd()
+                    os.chdir(tmp)
+                    try:
+                        result = run(way, threads, args.tasks, args.users)
+                    finally:
+                        os.chdir(cwd)
+                print(f"{mode:>8} {way:>9} {threads:>7} {result['rate']:>9.0f} {result['entries']:>15} "
+                      f"{result['batches']:>8}  {'ok' if result['ok'] else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
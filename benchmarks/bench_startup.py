@@ -0,0 +1,127 @@
+"""Start-up time: importing main.py and reaching the first main-menu frame.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--sizes 0 10000 200000] [--runs 5] [--budget-ms 250]
+
+For each marketplace size, a temp data/ directory is seeded with one
+account and that many open tasks. A fresh interpreter is then started
+--runs times inside a 120x40 pseudo-terminal. Each run does what main.py
+does after a successful login: it imports main, builds the session and
+draws the main menu. The run reports:
+- import: interpreter start to `import main` done;
+- menu: interpreter start to the first main-menu frame;
+- browse: time to open Browse Tasks afterwards, the first screen that
+  needs the task store.
+The login KDF is left out because it costs the same at every size. The
+exit status is 1 if the median time to the menu exceeds --budget-ms at
+any size.
+"""
+import argparse
+import fcntl
+import json
+import os
+import pty
+import statistics
+import struct
+import sys
+import tempfile
+import termios
+import time
+from datetime import datetime
+
+ROWS, COLS = 40, 120
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHILD = """
+import sys, time
+started, results_file = float(sys.argv[1]), sys.argv[2]
+import curses, json
+import main
+imported = time.time()
+
+def run(stdscr):
+    state = main.AppState("bench")
+    main.ZamanUI(stdscr).render_main_menu(state)
+    menu = time.time()
+    from modules.browse_tasks import BrowseTasks
+    view = BrowseTasks(stdscr, state.task_manager, state)
+    view.reload()
+    view.draw()
+    curses.doupdate()
+    browse = time.time()
+    with open(results_file, 'w') as f:
+        json.dump({"import": imported - started, "menu": menu - started, "browse": browse - menu}, f)
+
+curses.wrapper(run)
+"""
+
+
+def seed(size):
+    from modules.storage import get_backend
+    get_backend().add_user("bench", "x", {"toki_balance": 10, "eddie_balance": 500, "tasks_completed": 0})
+    with open("data/tasks.json", 'w') as f:
+        json.dump([{
+            "id": i,
+            "description": f"Open task number {i}",
+            "creator": f"user{i % 50}",
+            "reward": 10 + i % 940,
+            "status": "open",
+            "created_at": datetime.now().isoformat(),
+            "completed_by": None
+        } for i in range(1, size + 1)], f)
+
+
+def launch(results_file):
+    """One fresh interpreter in a pseudo-terminal; its timings"""
+    started = time.time()
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.environ["TERM"] = "xterm-256color"
+        os.environ["PYTHONPATH"] = REPO
+        fcntl.ioctl(0, termios.TIOCSWINSZ, struct.pack("HHHH", ROWS, COLS, 0, 0))
+        os.execv(sys.executable, [sys.executable, "-c", CHILD, repr(started), results_file])
+    while True:
+        try:
+            data = os.read(fd, 65536)  # Drain the terminal so the child never blocks
+        except OSError:
+            break
+        if not data:
+            break
+    os.waitpid(pid, 0)
+    with open(results_file) as f:
+        return json.load(f)
+
+
+def run(size, runs):
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            seed(size)
+            timings = [launch(os.path.join(tmp, "results.json")) for _ in range(runs)]
+        finally:
+            os.chdir(cwd)
+    return {name: statistics.median(t[name] for t in timings) * 1e3 for name in ("import", "menu", "browse")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 10_000, 200_000])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=250)
+    args = parser.parse_args()
+
+    over = []
+    print(f"{'open tasks':>10} {'import ms':>10} {'menu ms':>10} {'browse ms':>10}")
+    for size in args.sizes:
+        medians = run(size, args.runs)
+        print(f"{size:>10} {medians['import']:>10.1f} {medians['menu']:>10.1f} {medians['browse']:>10.1f}")
+        if medians["menu"] > args.budget_ms:
+            over.append(size)
+    if over:
+        print(f"Time to the main menu is over {args.budget_ms:.0f} ms at: {', '.join(map(str, over))} tasks")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
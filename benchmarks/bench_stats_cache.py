@@ -0,0 +1,80 @@
+"""Interactive latency with stats written through vs. written behind.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_stats_cache [--ops 2000] [--mode batched]
+
+A temp data/ directory gets one account. A session then repeats what the
+main menu does: buy a toki, reload the stats (the menu does after every
+key that is not an arrow), create a task. It runs twice:
+- write-through: ZAMAN_STATS_FLUSH_INTERVAL=0, every commit rewrites the
+  account record, as before the write-behind cache;
+- write-behind: the default interval; records are written by the
+  background flusher and at logout.
+The report shows p50/p99 latency per operation and how many records
+were written. After logout the record must match the session.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(interval, ops):
+    from modules.state import AppState
+    from modules.storage.json_backend import JSONBackend
+
+    backend = JSONBackend("data")
+    backend.initialize()
+    backend.committer.cache.interval = interval
+    backend.add_user("bench", "x", {"toki_balance": 0, "eddie_balance": 10**9, "tasks_completed": 0})
+    state = AppState("bench", backend)
+    state.task_manager  # Load the (empty) task store outside the timings
+
+    timings = {"buy_toki": [], "load_stats": [], "create_task": []}
+    for n in range(ops):
+        for name, call in (("buy_toki", lambda: state.buy_toki(1)),
+                           ("load_stats", state.load_stats),
+                           ("create_task", lambda: state.create_task(f"Task {n}", 100))):
+            start = time.perf_counter()
+            call()
+            timings[name].append(time.perf_counter() - start)
+    state.logout()
+
+    stored = backend.accounts.read("bench")
+    ok = (stored["toki_balance"], stored["eddie_balance"]) == (state.toki_balance, state.eddie_balance)
+    return timings, backend.committer.cache.writes, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--mode", choices=("fsync", "batched", "async"), default="batched")
+    args = parser.parse_args()
+    os.environ["ZAMAN_COMMIT_MODE"] = args.mode
+    from modules.stats_cache import STATS_FLUSH_INTERVAL
+
+    print(f"{'stats':<14} {'operation':<12} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for label, interval in (("write-through", 0), ("write-behind", STATS_FLUSH_INTERVAL)):
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                timings, writes, ok = run(interval, args.ops)
+            finally:
+                os.chdir(cwd)
+        for name, samples in timings.items():
+            print(f"{label:<14} {name:<12} {percentile(samples, 0.5) * 1000:>8.3f} "
+                  f"{percentile(samples, 0.99) * 1000:>8.3f} {statistics.mean(samples) * 1000:>8.3f}")
+        print(f"{label:<14} {writes} record writes for {3 * args.ops} operations, "
+              f"{'ok' if ok else 'MISMATCH after logout'}")
+
+
+if __name__ == "__main__":
+    main()
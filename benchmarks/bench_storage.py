@@ -0,0 +1,125 @@
+"""Compare the JSON and SQLite storage backends at growing task counts.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_storage [--sizes 10000 100000 1000000] [--ops 200] [--json]
+
+For every backend and size a temp data/ directory is seeded with that many
+tasks (a third of them completed) and 100 users. It then reports the time
+to load the task store and the median/p99 latency of create_task,
+AppState.complete_task (task + reward credit), buy_toki (balance + ledger)
+and a password check.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from auth import verify_user
+from modules.passwords import hash_password
+from modules.state import AppState
+from modules.storage import BACKENDS, get_backend
+from modules.storage.json_backend import JSONBackend
+from modules.task_manager import TaskManager
+
+USERS = 100
+
+
+def seed_task(i):
+    return {
+        "id": i,
+        "description": f"Seed task {i}",
+        "creator": f"user{i % USERS}",
+        "reward": 10 + i % 940,
+        "status": "open" if i % 3 else "completed",
+        "created_at": datetime.now().isoformat(),
+        "completed_by": None if i % 3 else f"user{(i + 1) % USERS}"
+    }
+
+
+def seed(kind, size):
+    password_hash = hash_password("pw")  # One KDF run shared by every seeded account
+    users = [(f"user{n}", password_hash) for n in range(USERS)]
+    stats = [(f"user{n}", {"toki_balance": 10, "eddie_balance": 10**9, "tasks_completed": 0})
+             for n in range(USERS)]
+    if kind == "sqlite":
+        get_backend("sqlite").bulk_load(users=users, stats=stats,
+                                        tasks=(seed_task(i) for i in range(1, size + 1)))
+        return
+    backend = JSONBackend("data")
+    backend.initialize()
+    for username, password_hash in users:
+        backend.add_user(username, password_hash, dict(stats[0][1]))
+    with open("data/tasks.json", 'w') as f:
+        json.dump([seed_task(i) for i in range(1, size + 1)], f)
+
+
+def timed(fn, ops):
+    latencies = []
+    for i in range(ops):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return round(statistics.median(latencies), 1), round(latencies[int(len(latencies) * 0.99) - 1], 1)
+
+
+def run(kind, size, ops):
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            seed(kind, size)
+            backend = get_backend(kind)
+
+            start = time.perf_counter()
+            TaskManager(backend)
+            load_s = time.perf_counter() - start
+
+            state = AppState("user1", backend)
+            open_ids = [t["id"] for t in state.task_manager.get_all_tasks()[:ops]]
+            result = {
+                "backend": kind,
+                "tasks": size,
+                "load_s": round(load_s, 3),
+                "create_task": timed(lambda i: state.task_manager.create_task(
+                    f"Bench {i}", "user1", 100, 10**9), ops),
+                "complete_task": timed(lambda i: state.complete_task(open_ids[i]), ops),
+                "buy_toki": timed(lambda i: state.buy_toki(1), ops),
+                "verify_user": timed(lambda i: verify_user(f"user{i % USERS}", "pw", backend), ops)
+            }
+            state.task_manager.wait_for_compaction()
+            backend.close()
+        finally:
+            os.chdir(cwd)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    ops_columns = ("create_task", "complete_task", "buy_toki", "verify_user")
+    if not args.json:
+        print(f"{'backend':>8} {'tasks':>9} {'load s':>8}" +
+              "".join(f" {name + ' p50/p99 us':>28}" for name in ops_columns))
+    for size in args.sizes:
+        for kind in args.backends:
+            os.environ["ZAMAN_STORAGE"] = kind
+            result = run(kind, size, args.ops)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f"{kind:>8} {size:>9} {result['load_s']:>8}" +
+                      "".join(f" {f'{result[n][0]} / {result[n][1]}':>28}" for n in ops_columns))
+
+
+if __name__ == "__main__":
+    main()
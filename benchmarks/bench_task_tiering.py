@@ -0,0 +1,113 @@
+"""Hot task store size and load/save time before and after archiving.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_task_tiering [--tasks 200000] [--completed 0.9] [--lookups 2000]
+
+A temp data/ directory is seeded with --tasks tasks, a --completed share
+of them completed 60 days ago. The benchmark times loading and saving the
+task store, runs archive-tasks, and times both again. It then measures
+find_task for hot and archived ids, and tasks_completed_by for one user.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+USERS = 1000
+
+
+def seed(tasks, completed, rng):
+    old = (datetime.now() - timedelta(days=60)).isoformat()
+    now = datetime.now().isoformat()
+    os.makedirs("data", exist_ok=True)
+    task_list = []
+    for task_id in range(1, tasks + 1):
+        done = rng.random() < completed
+        task_list.append({
+            "id": task_id,
+            "description": f"Task number {task_id}: deliver a package across the district",
+            "creator": f"user{rng.randrange(USERS)}",
+            "reward": rng.randint(10, 950),
+            "status": "completed" if done else "open",
+            "created_at": old if done else now,
+            "completed_by": f"user{rng.randrange(USERS)}" if done else None
+        })
+    with open("data/tasks.json", 'w') as f:
+        json.dump(task_list, f)
+
+
+def hot_timings(runs=3):
+    """Median load and save time of the hot store, and its snapshot size"""
+    from modules.task_manager import TaskManager
+    task_manager = TaskManager()
+    loads, saves = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        task_manager.load_tasks()
+        loads.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        task_manager.save_tasks()
+        saves.append(time.perf_counter() - start)
+    return len(task_manager.store), statistics.median(loads), statistics.median(saves), \
+        os.path.getsize("data/tasks.json")
+
+
+def lookup_us(function, keys):
+    start = time.perf_counter()
+    for key in keys:
+        function(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=200_000)
+    parser.add_argument("--completed", type=float, default=0.9)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            seed(args.tasks, args.completed, rng)
+            from modules.task_manager import TaskManager
+            print(f"{'':>8} {'hot tasks':>10} {'load ms':>9} {'save ms':>9} {'snapshot MB':>12}")
+            before = hot_timings()
+            print(f"{'before':>8} {before[0]:>10} {before[1] * 1e3:>9.1f} {before[2] * 1e3:>9.1f} "
+                  f"{before[3] / 1e6:>12.1f}")
+
+            task_manager = TaskManager()
+            start = time.perf_counter()
+            moved = task_manager.archive_completed(30)
+            task_manager.save_tasks()
+            archived_in = time.perf_counter() - start
+            after = hot_timings()
+            print(f"{'after':>8} {after[0]:>10} {after[1] * 1e3:>9.1f} {after[2] * 1e3:>9.1f} "
+                  f"{after[3] / 1e6:>12.1f}")
+            archive_bytes = sum(entry.stat().st_size for entry in os.scandir("data/tasks_archive") if entry.is_file())
+            print(f"Archived {moved} tasks in {archived_in:.2f} s; archive segments {archive_bytes / 1e6:.1f} MB")
+
+            task_manager = TaskManager()
+            hot_ids = [task["id"] for task in task_manager.store.to_list()]
+            archived_ids = [task_id for task_id in range(1, args.tasks + 1) if task_manager.store.get(task_id) is None]
+            print(f"find_task hot:      {lookup_us(task_manager.find_task, rng.choices(hot_ids, k=args.lookups)):>9.1f} us")
+            if archived_ids:
+                print(f"find_task archived: "
+                      f"{lookup_us(task_manager.find_task, rng.choices(archived_ids, k=args.lookups)):>9.1f} us")
+            users = [f"user{n}" for n in rng.sample(range(USERS), min(USERS, 50))]
+            print(f"tasks_completed_by: {lookup_us(task_manager.tasks_completed_by, users) / 1e3:>9.1f} ms "
+                  f"(~{moved // USERS} archived tasks per user)")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Per-operation latency of TaskManager writes as the task count grows.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_task_wal [--sizes 1000 10000 100000] [--ops 200]
+
+Each size gets a fresh data/ directory in a temp folder, pre-filled with
+that many tasks. The "wal" column is the current create/complete path;
+"rewrite" is the old behaviour of dumping all of tasks.json per action.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from modules.task_manager import TaskManager
+
+TASKS_FILE = Path("data/tasks.json")
+
+
+def seed_tasks(count):
+    tasks = []
+    for i in range(1, count + 1):
+        tasks.append({
+            "id": i,
+            "description": f"Seed task {i}",
+            "creator": f"user{i % 97}",
+            "reward": 10 + i % 940,
+            "status": "open" if i % 3 else "completed",
+            "created_at": datetime.now().isoformat(),
+            "completed_by": None
+        })
+    TASKS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(TASKS_FILE, 'w') as f:
+        json.dump(tasks, f)
+
+
+def time_ops(manager, ops, rewrite):
+    latencies = []
+    open_ids = [t["id"] for t in manager.get_all_tasks()]
+    for i in range(ops):
+        start = time.perf_counter()
+        if i % 2:
+            manager.complete_task(open_ids[i], "bench")
+        else:
+            manager.create_task(f"Bench task {i}", "bench_creator", 100, 10_000)
+        if rewrite:
+            with open(TASKS_FILE, 'w') as f:
+                json.dump(manager.tasks, f, indent=2)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def run(size, ops, rewrite):
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            seed_tasks(size)
+            manager = TaskManager()
+            latencies = time_ops(manager, ops, rewrite)
+            manager.save_tasks()
+        finally:
+            os.chdir(cwd)
+    latencies.sort()
+    return {
+        "p50_us": round(statistics.median(latencies), 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99) - 1], 1),
+        "mean_us": round(statistics.fmean(latencies), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--skip-rewrite", action="store_true", help="Only time the WAL path")
+    args = parser.parse_args()
+
+    print(f"{'tasks':>8} {'mode':>8} {'p50 us':>10} {'p99 us':>10} {'mean us':>10}")
+    for size in args.sizes:
+        modes = ["wal"] if args.skip_rewrite else ["wal", "rewrite"]
+        for mode in modes:
+            result = run(size, args.ops, mode == "rewrite")
+            print(f"{size:>8} {mode:>8} {result['p50_us']:>10} {result['p99_us']:>10} {result['mean_us']:>10}")
+
+
+if __name__ == "__main__":
+    main()
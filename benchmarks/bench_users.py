@@ -0,0 +1,94 @@
+"""Login and registration cost: one users.json vs the sharded user directory.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_users [--sizes 10000 100000 1000000] [--ops 200]
+
+For each account count a users.json is written and imported into a
+UserDirectory (the import time is reported). Timed operations:
+- "legacy login": read and parse the whole users.json, as verify_user
+  used to.
+- "cold login": a lookup in a fresh UserDirectory, which reads one shard.
+- "warm login": a repeat lookup, which only stats the shard.
+- "legacy register": rewrite the whole users.json.
+- "register": append one line to one shard. Includes the first read of
+  that shard when this process has not looked at it yet.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from modules.locking import atomic_write_json
+from modules.user_directory import UserDirectory
+
+
+def timed(fn, ops):
+    samples = []
+    for i in range(ops):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def run(size, ops):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_file = os.path.join(tmp, "users.json")
+        users = {f"user{n}": f"{n:064x}" for n in range(size)}
+        with open(legacy_file, 'w') as f:
+            json.dump(users, f)
+
+        start = time.perf_counter()
+        UserDirectory(os.path.join(tmp, "users"), legacy_file).initialize()
+        import_s = time.perf_counter() - start
+
+        def legacy_login(i):
+            with open(legacy_file) as f:
+                assert json.load(f).get(f"user{i * 7919 % size}")
+
+        def cold_login(i):
+            assert UserDirectory(os.path.join(tmp, "users")).get(f"user{i * 7919 % size}")
+
+        warm = UserDirectory(os.path.join(tmp, "users"))
+        for i in range(ops):
+            warm.get(f"user{i * 7919 % size}")
+
+        def warm_login(i):
+            assert warm.get(f"user{i * 7919 % size}")
+
+        def legacy_register(i):
+            users[f"legacy{i}"] = "x" * 64
+            atomic_write_json(legacy_file, users)
+
+        def register(i):
+            assert warm.add(f"new{i}", "x" * 64)
+
+        legacy_ops = max(1, min(ops, 20_000_000 // size))  # Whole-file operations get slow
+        return {
+            "import_s": import_s,
+            "legacy login": timed(legacy_login, legacy_ops),
+            "cold login": timed(cold_login, ops),
+            "warm login": timed(warm_login, ops),
+            "legacy register": timed(legacy_register, legacy_ops),
+            "register": timed(register, ops),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=200)
+    args = parser.parse_args()
+
+    columns = ("legacy login", "cold login", "warm login", "legacy register", "register")
+    print(f"{'accounts':>9} {'import s':>9}" + "".join(f" {c + ' us':>18}" for c in columns))
+    for size in args.sizes:
+        result = run(size, args.ops)
+        print(f"{size:>9} {result['import_s']:>9.2f}" + "".join(f" {result[c]:>18.1f}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Load test for the Zaman server with hundreds of concurrent sessions.
+
+Run from the repository root:
+
+    python -m benchmarks.load_server [--sessions 200] [--requests 50] [--storage json|sqlite]
+                                     [--address unix:zaman.sock]
+
+A server process is started on a temp data/ directory. Each session opens
+its own connection, registers a user and then sends a mix of buy_toki,
+cash_out, create_task, complete_task and browse requests, one at a time
+like the curses client. All sessions run concurrently on asyncio. The
+report covers request throughput, p50/p95/p99 latency, the server's mean
+batch size, and a check that the ledger holds one entry per successful
+buy/cash-out.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from modules.storage import BACKENDS
+
+
+def run_server(data_dir, address, storage):
+    os.chdir(data_dir)
+    os.environ["ZAMAN_STORAGE"] = storage
+    from modules.server import serve
+    serve(address)
+
+
+async def connect(address):
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[5:], limit=1 << 20)
+    host, _, port = address.rpartition(":")
+    return await asyncio.open_connection(host or "127.0.0.1", int(port), limit=1 << 20)
+
+
+async def wait_for_server(address, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await connect(address)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def session(n, address, requests, latencies, counts):
+    reader, writer = await connect(address)
+    rng = random.Random(n)
+    next_id = 0
+
+    async def call(op, **arguments):
+        nonlocal next_id
+        next_id += 1
+        start = time.perf_counter()
+        writer.write(json.dumps({"id": next_id, "op": op, **arguments}).encode() + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.setdefault(op, []).append(time.perf_counter() - start)
+        return response
+
+    await call("register", username=f"load{n}", password="pw")
+    for _ in range(requests):
+        op = rng.choices(("buy_toki", "cash_out", "create_task", "complete_task", "tasks"),
+                         (30, 15, 15, 20, 20))[0]
+        if op in ("buy_toki", "cash_out"):
+            response = await call(op, amount=1)
+            if response["ok"] and response["result"]["success"]:
+                counts["ledger"] = counts.get("ledger", 0) + 1
+        elif op == "create_task":
+            await call(op, description=f"Load task from session {n}", eddie_cost=rng.randint(10, 100))
+        elif op == "complete_task":
+            window = await call("tasks", method="open_tasks_window", args=[rng.randrange(50), 5])
+            for task in window.get("result") or []:
+                if task["creator"] != f"load{n}":
+                    await call(op, task_id=task["id"])
+                    break
+        else:
+            await call(op, method="open_tasks_window", args=[rng.randrange(100), 40])
+    stats = await call("stats")
+    writer.close()
+    return stats["result"]
+
+
+async def drive(address, sessions, requests):
+    await wait_for_server(address)
+    latencies, counts = {}, {}
+    start = time.perf_counter()
+    results = await asyncio.gather(*(session(n, address, requests, latencies, counts)
+                                     for n in range(sessions)))
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies, counts, max(results, key=lambda stats: stats["requests"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=50, help="requests per session after registering")
+    parser.add_argument("--storage", choices=BACKENDS, default="json")
+    parser.add_argument("--address", default="unix:zaman.sock",
+                        help="unix:PATH (relative to the temp data dir) or HOST:PORT")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        address = args.address
+        if address.startswith("unix:") and not os.path.isabs(address[5:]):
+            address = "unix:" + os.path.join(tmp, address[5:])
+        server = multiprocessing.get_context("fork").Process(
+            target=run_server, args=(tmp, address, args.storage))
+        server.start()
+        try:
+            elapsed, latencies, counts, stats = asyncio.run(drive(address, args.sessions, args.requests))
+        finally:
+            server.terminate()
+            server.join()
+
+        from modules.storage import get_backend
+        os.chdir(tmp)
+        ledger = get_backend(args.storage).ledger
+        trades = sum(1 for entry in ledger.iter_transactions() if entry["type"] != "task_reward")
+        ledger_ok = trades == counts.get("ledger", 0)
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{args.sessions} sessions, {total} requests in {elapsed:.2f}s: {total / elapsed:.0f} req/s, "
+          f"mean batch {stats['requests'] / max(1, stats['batches']):.1f} requests")
+    print(f"{'op':<14} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for op, values in sorted(latencies.items()):
+        values.sort()
+        p95, p99 = values[int(len(values) * 0.95) - 1], values[int(len(values) * 0.99) - 1]
+        print(f"{op:<14} {len(values):>7} {statistics.median(values) * 1e3:>8.2f} "
+              f"{p95 * 1e3:>8.2f} {p99 * 1e3:>8.2f}")
+    print(f"ledger entries match successful buys/cash-outs: {ledger_ok}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Multi-process stress test for sessions sharing one data/ directory.
+
+Run from the repository root:
+
+    python -m benchmarks.stress_concurrency [--procs 1 2 4 8] [--tasks 400] [--buys 50] [--storage sqlite]
+                                            [--users shared|many]
+
+With --users shared (the default) every worker process opens its own
+AppState for the same user, races the others to complete every open
+task, buys tokis and registers accounts. This checks correctness under
+contention; the user's lock serialises the workers, so throughput does
+not grow with --procs.
+
+With --users many every worker is its own user and completes its own
+--tasks tasks, so each process does the same work and only the shared
+task log and ledger are contended. ops/s then shows how far per-user
+locking lets sessions scale.
+
+Afterwards the run checks that each task was completed exactly once, that
+every balance equals the sum of its credits and debits, that every buy
+and every settled reward reached the ledger and that no registration was
+lost. Exits non-zero on any violation. A tiny compaction threshold keeps
+tasks.json compactions racing with the writers.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+import auth
+import modules.storage.json_backend as json_backend
+from modules.state import AppState
+from modules.storage import BACKENDS, get_backend
+from modules.task_manager import TaskManager
+
+SHARED_USER = "shared"
+START_EDDIES = 10_000_000
+BUY_COST = 190 + 28.5  # One toki plus the 15% fee
+
+
+def worker(index, username, task_ids, buys, registrations, results):
+    random.seed(index)
+    state = AppState(username)
+    won = []
+    order = list(task_ids)
+    random.shuffle(order)
+    for step, task_id in enumerate(order):
+        reward = state.complete_task(task_id)
+        if reward:
+            won.append((task_id, reward))
+        if step % max(1, len(order) // max(1, buys)) == 0 and buys:
+            state.buy_toki(1)
+            buys -= 1
+    for _ in range(buys):
+        state.buy_toki(1)
+    state.logout()  # Commits anything still queued (ZAMAN_COMMIT_MODE=async)
+    for n in range(registrations):
+        auth.register_user(None, f"w{index}_u{n}", "pw")
+    results.put((username, won))
+
+
+def run(procs, tasks, buys, registrations, many=False):
+    auth.initialize_data_dir()
+    usernames = [f"user{i}" for i in range(procs)] if many else [SHARED_USER]
+    for username in usernames:
+        auth.register_user(None, username, "pw")
+        AppState(username).change_balances(eddie=START_EDDIES - 500)
+
+    publisher = TaskManager()
+    task_ids = []
+    for i in range(tasks * procs if many else tasks):
+        ok, _, task = publisher.create_task(f"Stress task {i}", "publisher", 10 + i % 900, 10**9)
+        task_ids.append(task["id"])
+    publisher.wait_for_compaction()
+
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=worker, args=(
+            i, usernames[i] if many else SHARED_USER, task_ids[i::procs] if many else task_ids,
+            buys, registrations, results))
+        for i in range(procs)
+    ]
+    start = time.perf_counter()
+    for p in workers:
+        p.start()
+    outcomes = [results.get() for _ in workers]
+    for p in workers:
+        p.join()
+    elapsed = time.perf_counter() - start
+    won = [item for _, items in outcomes for item in items]
+
+    errors = []
+    won_ids = [task_id for task_id, _ in won]
+    if len(won_ids) != len(set(won_ids)):
+        errors.append(f"{len(won_ids) - len(set(won_ids))} tasks were completed more than once")
+    if set(won_ids) != set(task_ids):
+        errors.append(f"{len(set(task_ids) - set(won_ids))} tasks were never completed")
+
+    final = TaskManager()
+    still_open = [t for t in task_ids if final.get_task(t)["status"] != "completed"]
+    if still_open:
+        errors.append(f"{len(still_open)} tasks are not completed on disk")
+
+    for username in usernames:
+        user_won = [item for name, items in outcomes if name == username for item in items]
+        user_buys = buys * (1 if many else procs)
+        state = AppState(username)
+        expected_eddies = START_EDDIES + sum(r for _, r in user_won) - user_buys * BUY_COST
+        if abs(state.eddie_balance - expected_eddies) > 1e-6:
+            errors.append(f"{username}: eddie balance {state.eddie_balance} != expected {expected_eddies}")
+        if state.toki_balance != 10 + user_buys:
+            errors.append(f"{username}: toki balance {state.toki_balance} != expected {10 + user_buys}")
+        if state.tasks_completed != len(user_won):
+            errors.append(f"{username}: tasks_completed {state.tasks_completed} != {len(user_won)}")
+
+    backend = get_backend()
+    backend.ledger.refresh()
+    added = {}
+    for tx in backend.ledger.iter_transactions():
+        added[tx["type"]] = added.get(tx["type"], 0) + (tx["amount"] if tx["type"] == "task_reward" else 1)
+    if added.get("buy", 0) != procs * buys:
+        errors.append(f"ledger gained {added.get('buy', 0)} buys, expected {procs * buys}")
+    if added.get("task_reward", 0) != sum(r for _, r in won):
+        errors.append(f"ledger settled {added.get('task_reward', 0)} eddies of rewards, "
+                      f"expected {sum(r for _, r in won)}")
+
+    users = dict(backend.iter_users())
+    missing = [f"w{i}_u{n}" for i in range(procs) for n in range(registrations)
+               if f"w{i}_u{n}" not in users]
+    if missing:
+        errors.append(f"{len(missing)} registrations were lost")
+
+    ops = tasks * procs + procs * buys + procs * registrations  # Shared: every worker tries every task
+    return elapsed, ops, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--tasks", type=int, default=400)
+    parser.add_argument("--buys", type=int, default=50)
+    parser.add_argument("--registrations", type=int, default=20)
+    parser.add_argument("--compact-bytes", type=int, default=16 * 1024)
+    parser.add_argument("--storage", choices=BACKENDS, default="json")
+    parser.add_argument("--users", choices=("shared", "many"), default="shared",
+                        help="one user for every process, or one user per process")
+    args = parser.parse_args()
+    os.environ["ZAMAN_STORAGE"] = args.storage
+
+    json_backend.COMPACT_MIN_BYTES = args.compact_bytes
+    failed = False
+    print(f"{'procs':>6} {'ops':>8} {'seconds':>9} {'ops/s':>9}  result")
+    for procs in args.procs:
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                elapsed, ops, errors = run(procs, args.tasks, args.buys, args.registrations, args.users == "many")
+            finally:
+                os.chdir(cwd)
+        result = "ok" if not errors else "; ".join(errors)
+        failed = failed or bool(errors)
+        print(f"{procs:>6} {ops:>8} {elapsed:>9.2f} {ops / elapsed:>9.0f}  {result}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method("fork")
+    main()
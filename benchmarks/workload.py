@@ -0,0 +1,273 @@
+"""Headless workload driver for the Zaman engine, no curses involved.
+
+Run from the repository root:
+
+    python -m benchmarks.workload [--users 50] [--tasks 2000] [--transactions 5000]
+                                  [--mix buy=30,cash_out=15,create=15,complete=20,browse=10,login=5,register=5]
+                                  [--storage json|sqlite] [--seed 1] [--out results.json]
+                                  [--compare baseline.json] [--threshold 0.2]
+
+A temp data/ directory is seeded with N users (registered through the
+storage backend) and M open tasks. Then K operations drawn from the mix
+are run directly against AppState (buy_toki, cash_out, create_task,
+complete_task), TaskManager (browse windows) and auth (register_user,
+verify_user + session start for "login"). The report is JSON with the
+overall throughput and per-operation count, success count, throughput and
+p50/p95/p99 latency.
+
+With --compare the run is checked against an earlier report. Operations
+whose p95 latency or throughput got worse by more than --threshold are
+listed, and the exit status is 1, so the run can gate a commit.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from auth import register_user, verify_user
+from modules.passwords import hash_password
+from modules.state import AppState
+from modules.storage import BACKENDS, get_backend
+
+DEFAULT_MIX = "buy=30,cash_out=15,create=15,complete=20,browse=10,login=5,register=5"
+OPERATIONS = ("buy", "cash_out", "create", "complete", "browse", "login", "register")
+PASSWORD = "workload"
+SESSION_CACHE = 64  # Logged-in AppStates kept around; older ones are dropped like a logout
+SEED_STATS = {"toki_balance": 1_000, "eddie_balance": 10**8, "tasks_completed": 0}
+
+
+def parse_mix(text):
+    """"buy=30,cash_out=10" -> {"buy": 30, "cash_out": 10}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown operation {name!r} (expected one of {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("operation mix has no weight")
+    return mix
+
+
+def generate_workload(users, transactions, mix, seed=1):
+    """Deterministic list of (operation, user index, parameter) triples"""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    return [(op, rng.randrange(users), rng.randrange(1 << 30))
+            for op in rng.choices(names, weights, k=transactions)]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class Driver:
+    """Runs workload operations against one data directory and times them"""
+
+    def __init__(self, backend, users):
+        self.backend = backend
+        self.users = users
+        self.sessions = OrderedDict()  # username -> AppState, least recently used first
+        self.registered = 0
+        self.latencies = {}
+        self.successes = {}
+
+    @staticmethod
+    def username(n):
+        return f"user{n}"
+
+    def seed(self, tasks, rng):
+        password_hash = hash_password(PASSWORD)  # One KDF run shared by every seeded account
+        for n in range(self.users):
+            self.backend.add_user(self.username(n), password_hash, dict(SEED_STATS))
+        task_manager = self.session(self.username(0)).task_manager
+        with task_manager.transaction():
+            for i in range(tasks):
+                task_manager.create_task(f"Seeded workload task {i}", self.username(rng.randrange(self.users)),
+                                         rng.randint(10, 950), 10**9)
+
+    def session(self, username):
+        state = self.sessions.pop(username, None)
+        if state is None:
+            state = AppState(username, self.backend)
+            if len(self.sessions) >= SESSION_CACHE:
+                self.sessions.popitem(last=False)
+        self.sessions[username] = state
+        return state
+
+    # Operations: each returns a truthy value on success
+
+    def op_buy(self, username, param):
+        return self.session(username).buy_toki(1 + param % 3)[0]
+
+    def op_cash_out(self, username, param):
+        return self.session(username).cash_out(1 + param % 3)[0]
+
+    def op_create(self, username, param):
+        return self.session(username).create_task(f"Workload task {param}", 10 + param % 941)[0]
+
+    def op_complete(self, username, param):
+        state = self.session(username)
+        task_manager = state.task_manager
+        task_manager.refresh()
+        count = task_manager.open_task_count()
+        if not count:
+            return False
+        start = param % count
+        for task in task_manager.open_tasks_window(start, 8):
+            if task["creator"] != username:
+                return state.complete_task(task["id"])
+        return False
+
+    def op_browse(self, username, param):
+        task_manager = self.session(username).task_manager
+        task_manager.refresh()
+        count = task_manager.open_task_count()
+        return task_manager.open_tasks_window(param % max(1, count), 40) or not count
+
+    def op_login(self, username, param):
+        if not verify_user(username, PASSWORD, self.backend):
+            return False
+        self.sessions.pop(username, None)
+        return self.session(username)
+
+    def op_register(self, username, param):
+        self.registered += 1
+        return register_user(None, f"new{self.registered}_{param}", PASSWORD, backend=self.backend)
+
+    def run(self, workload):
+        start = time.perf_counter()
+        for op, user, param in workload:
+            handler = getattr(self, f"op_{op}")
+            op_start = time.perf_counter()
+            ok = handler(self.username(user), param)
+            self.latencies.setdefault(op, []).append(time.perf_counter() - op_start)
+            self.successes[op] = self.successes.get(op, 0) + bool(ok)
+        for state in self.sessions.values():
+            state.task_manager.wait_for_compaction()
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        ops = {}
+        for op, values in sorted(self.latencies.items()):
+            values.sort()
+            ops[op] = {
+                "count": len(values),
+                "ok": self.successes.get(op, 0),
+                "throughput": round(len(values) / sum(values), 1) if sum(values) else 0.0,
+                "mean_us": round(sum(values) / len(values) * 1e6, 1),
+                "p50_us": round(percentile(values, 0.50) * 1e6, 1),
+                "p95_us": round(percentile(values, 0.95) * 1e6, 1),
+                "p99_us": round(percentile(values, 0.99) * 1e6, 1),
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            "total": {"ops": total, "seconds": round(elapsed, 3),
+                      "throughput": round(total / elapsed, 1) if elapsed else 0.0},
+            "ops": ops,
+        }
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(storage, users, tasks, transactions, mix, seed=1):
+    """Seed a temp data/ directory, run the workload there and return the report"""
+    workload = generate_workload(users, transactions, mix, seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            backend = get_backend(storage)
+            driver = Driver(backend, users)
+            driver.seed(tasks, random.Random(seed))
+            report = driver.report(driver.run(workload))
+        finally:
+            os.chdir(cwd)
+    report["meta"] = {
+        "commit": current_commit(),
+        "storage": storage,
+        "users": users,
+        "tasks": tasks,
+        "transactions": transactions,
+        "mix": mix,
+        "seed": seed,
+        "python": platform.python_version(),
+    }
+    return report
+
+
+def compare(report, baseline, threshold):
+    """Print per-operation changes against `baseline`; returns the regressed operations"""
+    regressions = []
+    print(f"{'operation':<10} {'p50 us':>20} {'p95 us':>20} {'ops/s':>20}")
+    for op, new in report["ops"].items():
+        old = baseline.get("ops", {}).get(op)
+        if old is None:
+            print(f"{op:<10} (not in baseline)")
+            continue
+        cells = []
+        for key in ("p50_us", "p95_us", "throughput"):
+            change = (new[key] - old[key]) / old[key] if old[key] else 0.0
+            cells.append(f"{old[key]:.0f}->{new[key]:.0f} {change:+.0%}")
+        print(f"{op:<10} " + " ".join(f"{cell:>20}" for cell in cells))
+        worse_p95 = old["p95_us"] and (new["p95_us"] - old["p95_us"]) / old["p95_us"] > threshold
+        worse_rate = old["throughput"] and (old["throughput"] - new["throughput"]) / old["throughput"] > threshold
+        if worse_p95 or worse_rate:
+            regressions.append(op)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight list")
+    parser.add_argument("--storage", choices=BACKENDS, default="json")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative p95/throughput change counted as a regression")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    report = run(args.storage, args.users, args.tasks, args.transactions, mix, args.seed)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"Regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,61 @@
 #!/usr/bin/env python3
+import argparse
 import curses
 from pathlib import Path
 import sys
+from modules import metrics
 from modules.state import AppState
 from modules.ui import ZamanUI
 from modules.task_ui import TaskUI
 from auth import authenticate_user
-from modules.browse_tasks import BrowseTasks
 
 
 
 # Add project directory to Python path
 sys.path.append(str(Path(__file__).parent))
 
-def main(stdscr):
+def main(stdscr, client=None):
     # Initialize curses properly
     curses.cbreak()
     curses.noecho()
     stdscr.keypad(True)  # Enable special keys
     curses.curs_set(0)   # Hide cursor
     
-    # Color setup
-    curses.start_color()
-    curses.init_pair(1, curses.COLOR_CYAN, curses.COLOR_BLACK)
-    curses.init_pair(2, curses.COLOR_GREEN, curses.COLOR_BLACK)
-    curses.init_pair(3, curses.COLOR_RED, curses.COLOR_BLACK)
+    # Screens are reused across logins and share one modules.screen.Screen (colours,
+    # dirty lines); the task store loads on first Create/Browse
+    ui = ZamanUI(stdscr)
+    task_ui = TaskUI(stdscr)
     
     while True:
         # Login screen
-        username = authenticate_user(stdscr)
+        username = authenticate_user(stdscr, client)
         if not username:
             break
             
         # Main application
-        state = AppState(username)
-        ui = ZamanUI(stdscr)
-        task_ui = TaskUI(stdscr)
+        if client:
+            from modules.client import RemoteState
+            state = RemoteState(client, username)
+        else:
+            state = AppState(username)
         
+        refresh = False
         while True:
             try:
+                if refresh:
+                    state.load_stats()  # Settled rewards and other sessions' changes
                 ui.render_main_menu(state)
-                key = stdscr.getch()
+                key, count = ui.screen.read_key()  # A held arrow comes back once, with its count
+                refresh = key not in (curses.KEY_UP, curses.KEY_DOWN)
                 
                 # Handle navigation keys
                 if key == curses.KEY_UP:
-                    state.nav_up()
+                    for _ in range(count):
+                        state.nav_up()
                     continue
                 elif key == curses.KEY_DOWN:
-                    state.nav_down()
+                    for _ in range(count):
+                        state.nav_down()
                     continue
                 
                 # Handle Enter key
@@ -66,23 +74,204 @@ def main(stdscr):
 
                     
                     elif option == "Browse Tasks":
+                        from modules.browse_tasks import BrowseTasks
                         browse_ui = BrowseTasks(stdscr, state.task_manager, state)
                         browse_ui.display()
                         continue
+                    elif option == "Transaction History":
+                        ui.view_history(state)
+                        continue
                     # ... handle other menu options ...
                     
                     elif option == "Logout":
+                        state.logout()
                         break
                 
+                elif key == ord('D'):  # Hidden Diagnostics screen
+                    ui.view_diagnostics()
+                
                 elif key == curses.KEY_RESIZE:
                     ui.handle_resize()
                 
             except Exception as e:
+                metrics.count("errors")
                 with open('error.log', 'a') as f:
                     import traceback
                     f.write(f"Error: {str(e)}\n{traceback.format_exc()}\n")
                 ui.show_message("System error - check error.log", False)
                 break
 
+def run_migrate(args):
+    """One-shot copy of the JSON data/ layout into SQLite"""
+    from modules.storage import migrate_json_to_sqlite
+    try:
+        counts = migrate_json_to_sqlite(args.data_dir, args.db)
+    except RuntimeError as e:
+        sys.exit(f"Migration aborted: {e}")
+    print("Migrated " + ", ".join(f"{n} {what}" for what, n in counts.items()))
+    print("Run with ZAMAN_STORAGE=sqlite to use it.")
+
+def run_ledger_stats(args):
+    """Print ledger aggregates from the columnar archive"""
+    from modules.storage import get_backend
+    ledger = get_backend().ledger
+    if not hasattr(ledger, "summarize"):
+        sys.exit("ledger-stats needs the JSON storage; query the ledger table directly with SQLite")
+    result = ledger.summarize(args.metric, args.by, types=args.type, users=args.user,
+                              since=args.since, until=args.until)
+    if not isinstance(result, dict):
+        print(result)
+        return
+    for key, value in result.items():
+        print(f"{key}\t{value}")
+
+def run_reconcile(args):
+    """Audit every account's stats against the ledger and the tasks"""
+    import json
+    import os
+    from modules.reconcile import reconcile
+    if os.environ.get("ZAMAN_STORAGE", "json") != "json":
+        sys.exit("reconcile reads the JSON data/ layout; SQLite keeps balances and ledger in one transaction")
+    report = reconcile(args.data_dir, args.workers)
+    print(f"Checked {report['users']} users from {report['segments']} ledger segments "
+          f"with {report['workers']} workers in {report['seconds']} s")
+    for problem, n in sorted(report["problems"].items()):
+        print(f"  {problem}: {n}")
+    for detail in report["details"][:args.show]:
+        print(f"  {detail['username']}: {detail['problem']}, expected {detail['expected']}, "
+              f"stored {detail['actual']}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if any(problem != "recovery_pending" for problem in report["problems"]):
+        sys.exit(1)
+
+def run_archive_tasks(args):
+    """Move old completed tasks out of the hot task store"""
+    from modules.task_manager import ARCHIVE_AFTER_DAYS, TaskManager
+    task_manager = TaskManager()
+    moved = task_manager.archive_completed(ARCHIVE_AFTER_DAYS if args.days is None else args.days)
+    task_manager.save_tasks()  # Shrink the snapshot right away instead of at the next compaction
+    print(f"Archived {moved} completed tasks; {len(task_manager.store)} tasks remain hot, "
+          f"{len(task_manager.archive)} archived")
+
+def run_import_tasks(args):
+    """Stream tasks from a JSONL or CSV file into the marketplace"""
+    import json
+    from modules.task_bulk import detect_format, import_tasks
+
+    def progress(report):
+        print(f"  {report.imported} imported, {report.rejected} rejected", file=sys.stderr)
+
+    fmt = detect_format(args.file, args.format)
+    if args.file == "-":
+        report = import_tasks(sys.stdin, fmt, args.batch_size, progress=progress)
+    else:
+        with open(args.file, newline="" if fmt == "csv" else None) as f:
+            report = import_tasks(f, fmt, args.batch_size, progress=progress)
+    print(f"Imported {report['imported']} tasks in {report['seconds']} s "
+          f"({report['tasks_per_second']} tasks/s), rejected {report['rejected']}")
+    for reason, n in report["reasons"].items():
+        print(f"  {reason}: {n}")
+    for error in report["errors"][:args.show]:
+        print(f"  line {error['line']}: {error['reason']}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+def run_export_tasks(args):
+    """Stream tasks to a JSONL or CSV file"""
+    from modules.task_bulk import detect_format, export_tasks
+    fmt = detect_format(args.file, args.format)
+    if args.file == "-":
+        export_tasks(sys.stdout, fmt, args.status, args.archived)
+        return
+    with open(args.file, 'w', newline="" if fmt == "csv" else None) as f:
+        written = export_tasks(f, fmt, args.status, args.archived)
+    print(f"Exported {written} tasks to {args.file}")
+
+def run_serve(args):
+    """Run the Zaman server in the foreground"""
+    from modules.server import BATCH_MAX, serve
+    print(f"Zaman server listening on {args.address} (Ctrl-C to stop)")
+    serve(args.address, args.batch_max or BATCH_MAX)
+
+def run_client(address):
+    """Curses session against a running server"""
+    from modules.client import ZamanClient
+    try:
+        client = ZamanClient(address)
+    except OSError as e:
+        sys.exit(f"Cannot connect to Zaman server at {address}: {e}")
+    try:
+        curses.wrapper(main, client)
+    finally:
+        client.close()
+
+def parse_args(argv):
+    from modules.client import DEFAULT_SOCKET
+    parser = argparse.ArgumentParser(description="Zaman network")
+    parser.add_argument("--connect", metavar="ADDRESS",
+                        help="use a Zaman server (unix:PATH or HOST:PORT) instead of data/ directly")
+    commands = parser.add_subparsers(dest="command")
+
+    migrate = commands.add_parser("migrate", help="copy the JSON data/ files into a SQLite database")
+    migrate.add_argument("--data-dir", default="data")
+    migrate.add_argument("--db", default=None, help="database file (default: <data-dir>/zaman.db)")
+    migrate.set_defaults(func=run_migrate)
+
+    stats = commands.add_parser("ledger-stats", help="sums and counts over the ledger")
+    stats.add_argument("--metric", choices=("count", "amount", "fee"), default="count")
+    stats.add_argument("--by", choices=("day", "type", "user"), default=None)
+    stats.add_argument("--type", action="append", help="only this transaction type (repeatable)")
+    stats.add_argument("--user", action="append", help="only this user (repeatable)")
+    stats.add_argument("--since", help="first day, YYYY-MM-DD")
+    stats.add_argument("--until", help="last day, YYYY-MM-DD")
+    stats.set_defaults(func=run_ledger_stats)
+
+    audit = commands.add_parser("reconcile", help="check stored balances against the ledger and tasks")
+    audit.add_argument("--data-dir", default="data")
+    audit.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU)")
+    audit.add_argument("--show", type=int, default=20, help="problems to print")
+    audit.add_argument("--out", help="write the full JSON report here")
+    audit.set_defaults(func=run_reconcile)
+
+    archive = commands.add_parser("archive-tasks", help="move old completed tasks to the compressed archive")
+    archive.add_argument("--days", type=float, default=None,
+                         help="archive tasks completed more than this many days ago "
+                              "(default: ZAMAN_ARCHIVE_AFTER_DAYS or 30)")
+    archive.set_defaults(func=run_archive_tasks)
+
+    bulk_import = commands.add_parser("import-tasks", help="create tasks in bulk from a JSONL or CSV file")
+    bulk_import.add_argument("file", help="rows with description, creator, reward (and time_era); - for stdin")
+    bulk_import.add_argument("--format", choices=("jsonl", "csv"), help="default: from the file name")
+    bulk_import.add_argument("--batch-size", type=int, default=None,
+                             help="rows per transaction (default: task_bulk.BATCH_ROWS)")
+    bulk_import.add_argument("--show", type=int, default=20, help="rejected rows to print")
+    bulk_import.add_argument("--out", help="write the full JSON report here")
+    bulk_import.set_defaults(func=run_import_tasks)
+
+    bulk_export = commands.add_parser("export-tasks", help="write tasks to a JSONL or CSV file")
+    bulk_export.add_argument("file", nargs="?", default="-", help="output file (default: stdout)")
+    bulk_export.add_argument("--format", choices=("jsonl", "csv"), help="default: from the file name")
+    bulk_export.add_argument("--status", choices=("open", "completed"))
+    bulk_export.add_argument("--archived", action="store_true", help="include archived tasks")
+    bulk_export.set_defaults(func=run_export_tasks)
+
+    server = commands.add_parser("serve", help="serve data/ to thin clients over a socket")
+    server.add_argument("address", nargs="?", default=DEFAULT_SOCKET,
+                        help=f"unix:PATH, a socket path or HOST:PORT (default: {DEFAULT_SOCKET})")
+    server.add_argument("--batch-max", type=int, default=None,
+                        help="most requests applied in one storage transaction (default: server.BATCH_MAX)")
+    server.set_defaults(func=run_serve)
+
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    curses.wrapper(main)
\ No newline at end of file
+    args = parse_args(sys.argv[1:])
+    if args.command:
+        args.func(args)
+    elif args.connect:
+        run_client(args.connect)
+    else:
+        curses.wrapper(main)
\ No newline at end of file
@@ -0,0 +1,349 @@
+"""Per-user balances as fixed-size records in one memory-mapped table.
+
+accounts/table.bin holds a 64-byte header and one 64-byte record per
+account: toki and eddie balances in fixed-point hundredths, tasks
+completed, the "version", "ledger_seq" and "journal_seq" stamps and a
+flags word. Records never straddle a page. The file is mapped with mmap,
+so a balance is read or updated in place, without opening a file or
+parsing JSON, and every process sharing data/ sees the same pages.
+
+A username finds its record through accounts/index/<shard>.jsonl, one
+{"username", "slot"} line per account, sharded and read incrementally
+like the user directory. A slot never changes once given out, so each
+process remembers the slots it has looked up. New slots are handed out
+under table.bin's file lock; the table grows GROW_RECORDS at a time.
+
+Per-user locks are byte-range locks on accounts/locks, one byte per
+stripe of LOCK_STRIPES, plus a thread lock per stripe: fcntl locks do
+not keep out the other threads of the same process. They replace the
+<user>.json.lock sidecar files, one inode per account.
+
+The intent journals of stats_cache live in accounts/journal/ and are
+removed once the table includes them. sync() forces a record to disk
+first: the kernel writes mapped pages back whenever it likes. Handing out
+a slot syncs the header and the index line, so after a power loss a slot
+is neither lost nor given out twice.
+
+On first start the stats/<user>.json files (and their journals) are
+imported into a new table, built next to data/accounts and renamed into
+place, so a crashed import is simply redone. stats/ is left in place but
+no longer written.
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import quote
+
+from .locking import file_lock, fsync_dir, read_json
+from .stats_cache import BALANCE_FIELDS, read_journal
+from .user_directory import SHARD_COUNT
+
+MAGIC = b"ZMACCT01"
+HEADER = struct.Struct("<8sIIQ")  # magic, record size, index shards, slots handed out
+HEADER_SIZE = 64
+RECORD = struct.Struct("<qqqQQQQ8x")  # toki, eddie (hundredths), tasks, version, ledger_seq, journal_seq, flags
+STAMP = struct.Struct("<QQQQ")  # version, ledger_seq, journal_seq, flags: the tail of a record
+STAMP_OFFSET = 24
+SCALE = 100  # Balances carry two decimals
+STORED = 1  # Flag: the record holds stats (a slot can exist without them)
+GROW_RECORDS = 4096  # Records added whenever the table runs out of room
+LOCK_STRIPES = 4096
+
+
+def to_fixed(value):
+    return round(value * SCALE)
+
+
+def from_fixed(value):
+    return value // SCALE if value % SCALE == 0 else value / SCALE
+
+
+def pack_stats(stats):
+    return RECORD.pack(to_fixed(stats["toki_balance"]), to_fixed(stats["eddie_balance"]),
+                       stats["tasks_completed"], stats.get("version", 0), stats.get("ledger_seq", 0),
+                       stats.get("journal_seq", 0), STORED)
+
+
+def unpack_stats(data, offset=0):
+    """Stats dict of the record at `offset`, or None if it holds none"""
+    toki, eddie, tasks_completed, version, ledger_seq, journal_seq, flags = RECORD.unpack_from(data, offset)
+    if not flags & STORED:
+        return None
+    return {"toki_balance": from_fixed(toki), "eddie_balance": from_fixed(eddie),
+            "tasks_completed": tasks_completed, "version": version,
+            "ledger_seq": ledger_seq, "journal_seq": journal_seq}
+
+
+def stripe(username):
+    digest = hashlib.blake2b(username.encode(), digest_size=8, person=b"zaman-lock").digest()
+    return int.from_bytes(digest, "little") % LOCK_STRIPES
+
+
+class AccountTable:
+    def __init__(self, directory, legacy_dir=None):
+        self.directory = Path(directory)
+        self.table_path = self.directory / "table.bin"
+        self.index_dir = self.directory / "index"
+        self.journal_dir = self.directory / "journal"
+        self.legacy_dir = Path(legacy_dir) if legacy_dir else None  # Old stats/<user>.json files
+        self.shards = SHARD_COUNT
+        self.fd = None
+        self.map = None
+        self.retired = []  # Maps replaced by remap(), closed with the table
+        self.lock_fd = None
+        self.slots = {}  # username -> slot, filled as names are looked up
+        self.cache = {}  # shard -> {"inode": ..., "offset": ...} of the index lines read so far
+        self.mutex = threading.Lock()
+        self.stripe_locks = {}  # stripe -> threading.Lock
+
+    # Opening and importing
+
+    def initialize(self):
+        """Open the table, importing the stats files on first run"""
+        with self.mutex:
+            if self.fd is not None:
+                return
+            self.directory.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(self.directory):
+                if not self.table_path.exists():
+                    self.import_legacy()
+            self.fd = os.open(self.table_path, os.O_RDWR)
+            self.lock_fd = os.open(self.directory / "locks", os.O_RDWR | os.O_CREAT, 0o644)
+            self.map = mmap.mmap(self.fd, 0)
+            magic, record_size, self.shards, _ = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC or record_size != RECORD.size:
+                raise RuntimeError(f"{self.table_path} is not an account table")
+
+    def close(self):
+        """Unmap the table and close its files; the next lookup opens it again"""
+        with self.mutex:
+            if self.fd is None:
+                return
+            for mapped in self.retired + [self.map]:
+                mapped.close()
+            os.close(self.fd)
+            os.close(self.lock_fd)
+            self.fd = self.lock_fd = self.map = None
+            self.retired = []
+            self.slots = {}
+            self.cache = {}
+
+    def import_legacy(self):
+        """Build a table from the stats files next to the final directory, then rename it in"""
+        build = self.directory.with_name(f".{self.directory.name}.import")
+        shutil.rmtree(build, ignore_errors=True)
+        (build / "index").mkdir(parents=True)
+        (build / "journal").mkdir()
+        names = []
+        if self.legacy_dir is not None and self.legacy_dir.is_dir():
+            with os.scandir(self.legacy_dir) as entries:
+                names = sorted(entry.name[:-len(".json")] for entry in entries if entry.name.endswith(".json"))
+
+        lines = {}
+        with open(build / "table.bin", 'wb') as f:
+            f.write(HEADER.pack(MAGIC, RECORD.size, self.shards, len(names)).ljust(HEADER_SIZE, b"\0"))
+            for slot, username in enumerate(names):
+                f.write(pack_stats(self.legacy_stats(username)))
+                lines.setdefault(self.shard(username), []).append(self.index_record(username, slot))
+            f.truncate(HEADER_SIZE + (len(names) + GROW_RECORDS) * RECORD.size)
+            os.fsync(f.fileno())
+        for shard, records in lines.items():
+            with open(build / "index" / f"{shard:03x}.jsonl", 'w') as f:
+                f.write("".join(records))
+                os.fsync(f.fileno())
+        for directory in (build / "index", build / "journal", build):
+            fsync_dir(directory)
+        os.rename(build, self.directory)
+        fsync_dir(self.directory.parent)
+
+    def legacy_stats(self, username):
+        """A stats file plus the journal records it did not include yet"""
+        from .storage.base import DEFAULT_STATS  # Not at the top: storage imports this module
+        stored = read_json(self.legacy_dir / f"{username}.json")
+        stats = {**DEFAULT_STATS, **(stored if isinstance(stored, dict) else {})}
+        records, _ = read_journal(self.legacy_dir / f"{username}.journal")
+        for record in records:
+            if record["seq"] > stats.get("journal_seq", 0):
+                for field, delta in zip(BALANCE_FIELDS, record["deltas"]):
+                    stats[field] += delta
+                stats["journal_seq"] = record["seq"]
+                stats["version"] = stats.get("version", 0) + 1
+        return stats
+
+    # The index
+
+    def shard(self, username):
+        digest = hashlib.blake2b(username.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.shards
+
+    def shard_path(self, shard):
+        return self.index_dir / f"{shard:03x}.jsonl"
+
+    @staticmethod
+    def index_record(username, slot):
+        return json.dumps({"username": username, "slot": slot}) + "\n"
+
+    def load_shard(self, shard):
+        """Read index lines appended to one shard since last time into self.slots"""
+        path = self.shard_path(shard)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        entry = self.cache.get(shard)
+        if entry is None or entry["inode"] != stat.st_ino or stat.st_size < entry["offset"]:
+            entry = self.cache[shard] = {"inode": stat.st_ino, "offset": 0}
+        if stat.st_size > entry["offset"]:
+            with open(path, 'rb') as f:
+                f.seek(entry["offset"])
+                data = f.read()
+            data = data[:data.rfind(b"\n") + 1]  # A slot still being recorded
+            for line in data.splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.slots.setdefault(record["username"], record["slot"])
+            entry["offset"] += len(data)
+
+    def slot(self, username, create=False):
+        """Record number of `username`; None if it has none and not `create`"""
+        slot = self.slots.get(username)
+        if slot is not None:
+            return slot
+        if self.fd is None:
+            self.initialize()
+        shard = self.shard(username)
+        with self.mutex:
+            self.load_shard(shard)
+            slot = self.slots.get(username)
+            if slot is not None or not create:
+                return slot
+            path = self.shard_path(shard)
+            with file_lock(self.table_path):
+                self.load_shard(shard)  # Another process may have just given it one
+                slot = self.slots.get(username)
+                if slot is not None:
+                    return slot
+                slot = self.allocate()
+                with open(path, 'ab+') as f:
+                    data = self.index_record(username, slot).encode()
+                    size = f.seek(0, os.SEEK_END)
+                    if size:
+                        f.seek(size - 1)
+                        if f.read(1) != b"\n":
+                            data = b"\n" + data  # Seal a torn line left by a crash
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if not size:
+                    fsync_dir(self.index_dir)
+                self.slots[username] = slot
+            return slot
+
+    def allocate(self):
+        """Next free slot, growing the file if needed; table.bin's file lock is held"""
+        count = HEADER.unpack_from(self.map, 0)[3]
+        end = HEADER_SIZE + (count + 1) * RECORD.size
+        if end > os.fstat(self.fd).st_size:
+            os.ftruncate(self.fd, end + GROW_RECORDS * RECORD.size)
+            os.fsync(self.fd)  # The new size too, not only the pages
+        self.remap(end)
+        self.map[end - RECORD.size:end] = bytes(RECORD.size)  # Zeroed, in case a crash left a stale one
+        struct.pack_into("<Q", self.map, 16, count + 1)
+        self.map.flush(0, min(mmap.PAGESIZE, len(self.map)))  # The count, before the index line names the slot
+        return count
+
+    def remap(self, end):
+        """Map at least `end` bytes (another process may have grown the file)"""
+        if len(self.map) < end:
+            # Lockless readers may still be using the old map; close() unmaps it
+            self.retired.append(self.map)
+            self.map = mmap.mmap(self.fd, 0)
+        return self.map
+
+    def mapping(self, slot):
+        """(map, offset) of a record"""
+        offset = HEADER_SIZE + slot * RECORD.size
+        mapped = self.map
+        if len(mapped) < offset + RECORD.size:
+            with self.mutex:
+                mapped = self.remap(offset + RECORD.size)
+        return mapped, offset
+
+    # Records
+
+    def stamp(self, username):
+        """(version, ledger_seq, journal_seq, flags) of the record, or None; no lock needed"""
+        slot = self.slot(username)
+        if slot is None:
+            return None
+        mapped, offset = self.mapping(slot)
+        return STAMP.unpack_from(mapped, offset + STAMP_OFFSET)
+
+    def read(self, username):
+        """Stored stats of `username`, or None"""
+        slot = self.slot(username)
+        if slot is None:
+            return None
+        mapped, offset = self.mapping(slot)
+        return unpack_stats(mapped, offset)
+
+    def write(self, username, stats):
+        """Overwrite the record in place (under the user's lock)"""
+        mapped, offset = self.mapping(self.slot(username, create=True))
+        mapped[offset:offset + RECORD.size] = pack_stats(stats)
+
+    def sync(self, username):
+        """Write the page holding the record of `username` to disk"""
+        mapped, offset = self.mapping(self.slot(username))
+        page = offset - offset % mmap.PAGESIZE
+        mapped.flush(page, min(mmap.PAGESIZE, len(mapped) - page))
+
+    def __iter__(self):
+        """(username, stats) of every account with stats, shard by shard"""
+        if self.fd is None:
+            self.initialize()
+        for shard in range(self.shards):
+            with self.mutex:
+                self.load_shard(shard)
+        for username, slot in list(self.slots.items()):
+            stats = unpack_stats(*self.mapping(slot))
+            if stats is not None:
+                yield username, stats
+
+    def journal_path(self, username):
+        return self.journal_dir / f"{quote(str(username), safe='')}.journal"
+
+    # Locking
+
+    @contextmanager
+    def locked(self, usernames):
+        """Hold the locks of every user in `usernames`, in stripe order"""
+        if self.fd is None:
+            self.initialize()
+        stripes = sorted({stripe(username) for username in usernames})
+        held = []
+        try:
+            for n in stripes:
+                with self.mutex:
+                    lock = self.stripe_locks.setdefault(n, threading.Lock())
+                lock.acquire()
+                try:
+                    fcntl.lockf(self.lock_fd, fcntl.LOCK_EX, 1, n)
+                except BaseException:
+                    lock.release()
+                    raise
+                held.append((n, lock))
+            yield
+        finally:
+            for n, lock in reversed(held):
+                fcntl.lockf(self.lock_fd, fcntl.LOCK_UN, 1, n)
+                lock.release()
@@ -1,122 +1,312 @@
 import curses
+from bisect import bisect_left
 from curses import textpad
 
+from .screen import color, screen_for
+
+CHUNK_ROWS = 256  # Open tasks fetched and rendered into the pad at a time
+POLL_MS = 1000  # How long to wait for a key before checking for other sessions' changes
+SORT_MODES = [  # (label, field, descending); field None keeps id order
+    ("ID", None, False),
+    ("Highest reward", "reward", True),
+    ("Lowest reward", "reward", False),
+    ("Newest", "created_at", True),
+    ("Oldest", "created_at", False),
+]
+
 class BrowseTasks:
+    """Task marketplace screen.
+
+    Only a chunk of CHUNK_ROWS open tasks is fetched from the task manager
+    and drawn into a curses pad; scrolling inside the chunk just moves the
+    pad's viewport, and a new chunk is fetched when the view leaves it.
+    Memory and per-key work stay bounded however many tasks are open.
+
+    '/' filters the list through the task manager's search index; the
+    matching ids are then windowed the same way. 'S' cycles SORT_MODES,
+    which read the task manager's ordered indexes instead of sorting.
+
+    While waiting for a key the screen polls the task manager's change
+    feed every POLL_MS and folds in tasks other sessions created or
+    completed (apply_changes), redrawing the pad only when they are in it.
+    """
+
     def __init__(self, stdscr, task_manager, state):
         self.stdscr = stdscr
+        self.screen = screen_for(stdscr)
         self.task_manager = task_manager
         self.state = state  # Store the full AppState object
-        self.scroll_pos = 0
-        self.init_colors()
+        self.scroll_pos = 0  # Position of the top visible task among open tasks
+        self.total = 0
+        self.pad = None
+        self.chunk_start = None  # Position of the first task drawn into the pad
+        self.chunk_len = 0
+        self.chunk_ids = []  # Ids drawn into the pad, in display order
+        self.cursor = None  # Position in the task manager's change feed
+        self.query = ""  # Active search, "" for all open tasks
+        self.results = None  # Ids matching the search, in display order
+        self.sort_mode = 0  # Index into SORT_MODES
 
-    def init_colors(self):
-        curses.start_color()
-        curses.init_pair(1, curses.COLOR_CYAN, curses.COLOR_BLACK)
-        curses.init_pair(2, curses.COLOR_GREEN, curses.COLOR_BLACK)
-        curses.init_pair(3, curses.COLOR_YELLOW, curses.COLOR_BLACK)
-        curses.init_pair(4, curses.COLOR_WHITE, curses.COLOR_BLACK)
+    def task_limit(self):
+        max_y, _ = self.stdscr.getmaxyx()
+        return max(1, max_y - 5)  # Space for header/footer
 
-    def safe_addstr(self, y, x, text, attr=curses.A_NORMAL):
-        """Safe string writing with boundary checking"""
-        max_y, max_x = self.stdscr.getmaxyx()
-        if y < 0 or x < 0 or y >= max_y or x >= max_x:
-            return
-        text = text[:max_x - x - 1]
+    def max_scroll(self):
+        return max(0, self.total - self.task_limit())
+
+    def reload(self):
+        """Re-count open (or matching) tasks and drop the rendered chunk"""
+        _, field, descending = SORT_MODES[self.sort_mode]
+        if self.query:
+            self.results = self.task_manager.search_open_tasks(self.query)
+            if field is not None:
+                self.results = self.task_manager.sort_task_ids(self.results, field, descending)
+            self.total = len(self.results)
+        else:
+            self.results = None
+            self.total = self.task_manager.open_task_count()
+        self.scroll_pos = min(self.scroll_pos, self.max_scroll())
+        self.chunk_start = None
+
+    def tasks_window(self, start, limit):
+        _, field, descending = SORT_MODES[self.sort_mode]
+        if self.results is not None:
+            while True:
+                window = self.results[start:start + limit]
+                tasks = [self.task_manager.get_task(task_id) for task_id in window]
+                # Completed or archived by another session since the change feed was last polled
+                stale = {task_id for task_id, task in zip(window, tasks)
+                         if task is None or task.get("status") != "open"}
+                if not stale:
+                    return tasks
+                self.results = [task_id for task_id in self.results if task_id not in stale]
+                self.total = len(self.results)
+                self.scroll_pos = min(self.scroll_pos, self.max_scroll())
+        if field is None:
+            return self.task_manager.open_tasks_window(start, limit)
+        return self.task_manager.open_tasks_sorted(field, start, limit, descending)
+
+    def task_position(self, task_id):
+        """Where `task_id` is in the list; in id order, where it would be. None if absent"""
+        _, field, descending = SORT_MODES[self.sort_mode]
+        if field is None:
+            if self.results is None:
+                return self.task_manager.open_task_position(task_id)
+            return bisect_left(self.results, task_id)
+        if self.results is None:
+            return self.task_manager.open_sorted_position(field, task_id, descending)
         try:
-            self.stdscr.addstr(y, x, text, attr)
-        except curses.error:
-            pass
+            return self.results.index(task_id)
+        except ValueError:
+            return None
 
-    def display(self):
-        tasks = self.task_manager.get_all_tasks()
+    def fill_pad(self, start):
+        """Fetch CHUNK_ROWS open tasks from `start` and draw them into the pad"""
+        _, max_x = self.stdscr.getmaxyx()
+        tasks = self.tasks_window(start, CHUNK_ROWS)
+        if self.pad is None or self.pad.getmaxyx()[1] != max_x:
+            self.pad = curses.newpad(CHUNK_ROWS + 1, max_x)
+        self.pad.erase()
+        for row, task in enumerate(tasks):
+            left = f"{task['id']}. {task['description']}"[:max(0, max_x // 2 - 1)]
+            right = f"Reward: {task['reward']} eddies | {task['creator']}"[:max(0, max_x - max_x // 2 - 1)]
+            try:
+                self.pad.addstr(row, 0, left, color("text"))
+                self.pad.addstr(row, max_x // 2, right, color("text"))
+            except curses.error:
+                pass
+        self.chunk_start = start
+        self.chunk_len = len(tasks)
+        self.chunk_ids = [task['id'] for task in tasks]
+
+    def apply_changes(self, changes):
+        """Fold other sessions' open-task changes into the view; True if it must be redrawn"""
+        if changes is None:  # Too far behind the feed
+            self.reload()
+            return True
+        if not changes:
+            return False
+        anchor = None  # Keep the top visible task on top
+        if self.chunk_start is not None and 0 <= self.scroll_pos - self.chunk_start < self.chunk_len:
+            anchor = self.chunk_ids[self.scroll_pos - self.chunk_start]
+        if self.results is not None and any(opened for _, opened in changes):
+            self.reload()  # New tasks may match the search
+        elif self.results is not None:
+            gone = {task_id for task_id, _ in changes}
+            self.results = [task_id for task_id in self.results if task_id not in gone]
+            self.total = len(self.results)
+        else:
+            self.total = self.task_manager.open_task_count()
+
+        if self.chunk_start is not None:
+            # The pad stays valid if nothing entered or left it; its rows may just have moved
+            first = self.task_position(self.chunk_ids[0]) if self.chunk_ids else None
+            gone = {task_id for task_id, opened in changes if not opened}
+            if first is None or gone.intersection(self.chunk_ids):
+                self.chunk_start = None
+            else:
+                for task_id, opened in changes:
+                    position = self.task_position(task_id) if opened else None
+                    if position is not None and first <= position < first + self.chunk_len:
+                        self.chunk_start = None
+                        break
+                else:
+                    self.chunk_start = first
+        if anchor is not None:
+            position = self.task_position(anchor)
+            if position is not None:
+                self.scroll_pos = position
+        self.scroll_pos = min(self.scroll_pos, self.max_scroll())
+        return True
+
+    def poll(self):
+        self.cursor, changes = self.task_manager.poll_changes(self.cursor)
+        return self.apply_changes(changes)
+
+    def draw(self):
+        """Update the screen for the current scroll position"""
         max_y, max_x = self.stdscr.getmaxyx()
-        task_limit = max_y - 5  # Space for header/footer
+        task_limit = self.task_limit()
 
-        while True:
-            self.stdscr.clear()
-            
+        visible_end = min(self.total, self.scroll_pos + task_limit)
+        if (self.chunk_start is None or self.scroll_pos < self.chunk_start
+                or visible_end > self.chunk_start + self.chunk_len):
+            # Keep some rows above the view too, so scrolling back up stays in the chunk
+            self.fill_pad(max(0, self.scroll_pos - CHUNK_ROWS // 4))
+
+        with self.screen.frame("browse_frame"):
             # Header
-            self.safe_addstr(0, 0, "TASK MARKETPLACE (↑/↓ Scroll, Enter: Select, Q: Quit)", 
-                           curses.color_pair(1) | curses.A_BOLD)
-            self.safe_addstr(1, 0, f"Your Balance: {self.state.eddie_balance} eddies", 
-                           curses.color_pair(1))
-
-            # Display tasks
-            for i in range(task_limit):
-                task_idx = i + self.scroll_pos
-                if task_idx >= len(tasks):
-                    break
-
-                task = tasks[task_idx]
-                y_pos = 3 + i
-                self.safe_addstr(y_pos, 0, 
-                               f"{task['id']}. {task['description']}",
-                               curses.color_pair(4))
-                self.safe_addstr(y_pos, max_x//2,
-                               f"Reward: {task['reward']} eddies | {task['creator']}",
-                               curses.color_pair(4))
+            self.screen.put(0, 0, "TASK MARKETPLACE (↑/↓ Scroll, Enter: Select, Q: Quit)",
+                            color("info") | curses.A_BOLD)
+            balance = f"Your Balance: {self.state.eddie_balance} eddies"
+            if self.sort_mode:
+                balance += f" | Sort: {SORT_MODES[self.sort_mode][0]}"
+            if self.query:
+                balance += f" | Search: {self.query}"
+            self.screen.put(1, 0, balance, color("info"))
 
             # Footer
-            self.safe_addstr(max_y-2, 0, 
-                           f"Showing {min(len(tasks), self.scroll_pos+1)}-{min(len(tasks), self.scroll_pos+task_limit)} of {len(tasks)}",
-                           curses.color_pair(3))
-            self.safe_addstr(max_y-1, 0, "↑/↓: Scroll | Enter: Select | Q: Quit", 
-                           curses.color_pair(3))
-
-            key = self.stdscr.getch()
-
-            if key == curses.KEY_UP and self.scroll_pos > 0:
-                self.scroll_pos -= 1
-            elif key == curses.KEY_DOWN and self.scroll_pos < max(0, len(tasks)-task_limit):
-                self.scroll_pos += 1
-            elif key == ord('q'):
+            self.screen.put(max_y-2, 0,
+                            f"Showing {min(self.total, self.scroll_pos+1)}-{visible_end} of {self.total}",
+                            color("prompt"))
+            self.screen.put(max_y-1, 0, "↑/↓ PgUp/PgDn Home/End: Scroll | S: Sort | /: Search | G: Go to ID | Enter: Select | Q: Quit",
+                            color("prompt"))
+
+            # Task rows: show the part of the pad under the viewport; rows below it stay blank
+            shown = visible_end - self.scroll_pos
+            if shown > 0:
+                self.screen.overlay(self.pad, self.scroll_pos - self.chunk_start, 0,
+                                    3, 0, 3 + shown - 1, max_x - 1)
+
+    def handle_key(self, key, count=1):
+        """Apply a key pressed `count` times; returns False when the screen should close"""
+        page = self.task_limit()
+        if key == curses.KEY_UP:
+            self.scroll_pos = max(0, self.scroll_pos - count)
+        elif key == curses.KEY_DOWN:
+            self.scroll_pos = min(self.max_scroll(), self.scroll_pos + count)
+        elif key == curses.KEY_PPAGE:
+            self.scroll_pos = max(0, self.scroll_pos - page * count)
+        elif key == curses.KEY_NPAGE:
+            self.scroll_pos = min(self.max_scroll(), self.scroll_pos + page * count)
+        elif key == curses.KEY_HOME:
+            self.scroll_pos = 0
+        elif key == curses.KEY_END:
+            self.scroll_pos = self.max_scroll()
+        elif key in (ord('g'), ord('G')):
+            self._handle_jump()
+        elif key == ord('/'):
+            self._handle_search()
+        elif key in (ord('s'), ord('S')):
+            self.sort_mode = (self.sort_mode + 1) % len(SORT_MODES)
+            self.scroll_pos = 0
+            self.reload()
+        elif key == ord('q'):
+            return False
+        elif key == 10:  # Enter key
+            self._handle_task_selection()
+        elif key == curses.KEY_RESIZE:
+            self.screen.resize()
+            self.pad = None
+            self.reload()
+        return True
+
+    def display(self):
+        self.cursor, _ = self.task_manager.poll_changes(None)
+        self.reload()
+        redraw = True
+        while True:
+            if redraw:
+                self.draw()
+            key, count = self.screen.read_key(POLL_MS)
+            if key == -1:
+                redraw = self.poll()
+                continue
+            if not self.handle_key(key, count):
                 break
-            elif key == 10:  # Enter key
-                self._handle_task_selection(tasks)
-            elif key == curses.KEY_RESIZE:
-                max_y, max_x = self.stdscr.getmaxyx()
-                curses.resizeterm(max_y, max_x)
-
-    
-    def _handle_task_selection(self, tasks):
+            redraw = True
+
+    def prompt(self, text, max_len):
         max_y, max_x = self.stdscr.getmaxyx()
-        
-        # Clear the input line
-        self.safe_addstr(max_y-1, 0, " " * max_x, curses.color_pair(3))
-        self.safe_addstr(max_y-1, 0, "Enter task ID to complete: ", curses.color_pair(3))
-        
+        self.screen.set_line(max_y-1, text, color("prompt"))
         curses.echo()
-        task_id_str = self.stdscr.getstr(max_y-1, 24, 3).decode().strip()
+        value = self.stdscr.getstr(max_y-1, len(text), max_len).decode().strip()
         curses.noecho()
+        return value
+
+    def _handle_jump(self):
+        """Scroll so that the given task id (or the next open one) is on top"""
+        task_id_str = self.prompt("Go to task ID: ", 10)
+        try:
+            position = self.task_position(int(task_id_str))
+        except ValueError:
+            return
+        if position is None:
+            return
+        self.scroll_pos = min(position, self.max_scroll())
+
+    def _handle_search(self):
+        """Filter by words and creator:/era:/reward:low-high facets; empty clears"""
+        self.query = self.prompt("Search (words creator:x era:x reward:10-500): ", 60)
+        self.scroll_pos = 0
+        self.reload()
+
+    def _handle_task_selection(self):
+        max_y, max_x = self.stdscr.getmaxyx()
+
+        task_id_str = self.prompt("Enter task ID to complete: ", 10)
 
         if not task_id_str:
             return
 
         try:
             task_id = int(task_id_str)
-            selected_task = next((t for t in tasks if t['id'] == task_id), None)
-            
-            if not selected_task:
-                self.safe_addstr(max_y-2, 0, "Task not found!", curses.color_pair(5))
+            selected_task = self.task_manager.get_task(task_id)
+
+            if not selected_task or selected_task['status'] != 'open':
+                self.screen.put(max_y-2, 0, "Task not found!", color("error"))
                 self.stdscr.getch()
                 return
-                
+
             if selected_task['creator'] == self.state.username:
                 # User is trying to complete their own task
-                self.safe_addstr(max_y-2, 0, "Cannot complete your own task!", curses.color_pair(5))
-                self.safe_addstr(max_y-3, 0, "Find tasks created by others", curses.color_pair(3))
+                self.screen.put(max_y-2, 0, "Cannot complete your own task!", color("error"))
+                self.screen.put(max_y-3, 0, "Find tasks created by others", color("prompt"))
                 self.stdscr.getch()
                 return
-                
-            reward = self.task_manager.complete_task(task_id, self.state.username)
-            
-            if reward:
-                self.state.eddie_balance += reward
-                self.state.save_stats()
+
+            reward = self.state.complete_task(task_id)
+
+            if not reward:
+                self.screen.put(max_y-2, 0, "Task was already taken!", color("error"))
+                self.stdscr.getch()
+            else:
                 msg = f"Completed! Earned {reward} eddies (Press any key)"
-                self.safe_addstr(max_y-2, 0, msg, curses.color_pair(2))
+                self.screen.put(max_y-2, 0, msg, color("success"))
                 self.stdscr.getch()
-                
+
         except ValueError:
-            self.safe_addstr(max_y-2, 0, "Invalid task ID!", curses.color_pair(5))
-            self.stdscr.getch()
\ No newline at end of file
+            self.screen.put(max_y-2, 0, "Invalid task ID!", color("error"))
+            self.stdscr.getch()
+        finally:
+            self.reload()
@@ -0,0 +1,230 @@
+"""Thin client for modules.server.
+
+RemoteState, RemoteTaskManager and RemoteLedger have the same interface
+as AppState, TaskManager and Ledger as far as the curses screens use it,
+so ZamanUI and BrowseTasks run unchanged against a server.
+"""
+import json
+import socket
+
+from .state import AppState
+
+DEFAULT_SOCKET = "data/zaman.sock"
+
+
+class RemoteError(Exception):
+    """The server refused a request"""
+
+
+READ_ONLY_OPS = ("ping", "balances", "history", "ledger", "tasks")  # Safe to resend after a reconnect
+
+
+def parse_address(address):
+    """"unix:/path", "host:port" or ":port" -> ("unix", path) or ("tcp", host, port)"""
+    if address.startswith("unix:"):
+        return ("unix", address[5:])
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        return ("unix", address)  # A bare path
+    return ("tcp", host or "127.0.0.1", int(port))
+
+
+class ZamanClient:
+    """Blocking JSON-lines connection to a Zaman server.
+
+    If the connection drops, the next call reconnects and resumes the
+    session with its token, so the server has no password to check
+    again. Only a read-only request that was cut off is sent again.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.token = None
+        self.sock = self.file = None
+        self.next_id = 0
+        self.connect()
+
+    def connect(self):
+        kind, *where = parse_address(self.address)
+        if kind == "unix":
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(where[0])
+        else:
+            self.sock = socket.create_connection(tuple(where))
+        self.file = self.sock.makefile('rwb')
+
+    def reconnect(self):
+        self.close()
+        self.connect()
+        if self.token:
+            self.token = self.send("resume", token=self.token)["token"]
+
+    def send(self, op, **arguments):
+        self.next_id += 1
+        self.file.write(json.dumps({"id": self.next_id, "op": op, **arguments}).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Zaman server closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise RemoteError(response["error"])
+        return response["result"]
+
+    def call(self, op, **arguments):
+        try:
+            return self.send(op, **arguments)
+        except (ConnectionError, OSError):
+            self.reconnect()
+            if op not in READ_ONLY_OPS:
+                raise  # It may or may not have been applied; let the user look and retry
+            return self.send(op, **arguments)
+
+    def login(self, username, password):
+        """Log this connection in; False on bad credentials"""
+        try:
+            self.token = self.call("login", username=username, password=password)["token"]
+            return True
+        except RemoteError:
+            return False
+
+    def register(self, username, password):
+        try:
+            self.token = self.call("register", username=username, password=password)["token"]
+            return True
+        except RemoteError:
+            return False
+
+    def logout(self):
+        self.token = None
+        self.call("logout")
+
+    def close(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass  # Unsent bytes on a dead connection
+            self.sock.close()
+            self.file = None
+
+
+class RemoteTaskManager:
+    def __init__(self, client):
+        self.client = client
+
+    def refresh(self):
+        pass  # The server refreshes before every batch
+
+    def query(self, method, *args):
+        return self.client.call("tasks", method=method, args=list(args))
+
+    def poll_changes(self, cursor):
+        return self.query("poll_changes", cursor)
+
+    def open_task_count(self):
+        return self.query("open_task_count")
+
+    def open_tasks_window(self, start, limit):
+        return self.query("open_tasks_window", start, limit)
+
+    def open_task_position(self, task_id):
+        return self.query("open_task_position", task_id)
+
+    def open_tasks_sorted(self, field, start, limit, descending=False, low=None, high=None):
+        return self.query("open_tasks_sorted", field, start, limit, descending, low, high)
+
+    def open_sorted_count(self, field, low=None, high=None):
+        return self.query("open_sorted_count", field, low, high)
+
+    def open_sorted_position(self, field, task_id, descending=False, low=None, high=None):
+        return self.query("open_sorted_position", field, task_id, descending, low, high)
+
+    def top_open_tasks(self, field, k, low=None, high=None):
+        return self.query("top_open_tasks", field, k, low, high)
+
+    def search_open_tasks(self, query):
+        return self.query("search_open_tasks", query)
+
+    def sort_task_ids(self, task_ids, field, descending=False):
+        return self.query("sort_task_ids", list(task_ids), field, descending)
+
+    def get_task(self, task_id):
+        return self.query("get_task", task_id)
+
+
+class RemoteLedger:
+    """Ledger summary as of the last refresh()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.total_fees = 0
+        self.count = 0
+        self._recent = []
+
+    def refresh(self, limit=10):
+        summary = self.client.call("ledger", limit=limit)
+        self.total_fees = summary["total_fees"]
+        self.count = summary["count"]
+        self._recent = summary["recent"]
+
+    def recent(self, limit=10):
+        return self._recent[-limit:]
+
+
+class RemoteState(AppState):
+    """AppState whose balances and operations live on the server"""
+
+    def __init__(self, client, username):
+        self.client = client
+        self.username = username
+        self.ledger = RemoteLedger(client)
+        self._task_manager = RemoteTaskManager(client)
+        self.toki_balance = 0
+        self.eddie_balance = 0
+        self.tasks_completed = 0
+        self.stats_version = 0
+        self.selected_option = 0
+        self.menu_options = list(AppState.MENU_OPTIONS)
+        self.load_stats()
+
+    def apply_stats(self, stats):
+        self.toki_balance = stats["toki_balance"]
+        self.eddie_balance = stats["eddie_balance"]
+        self.tasks_completed = stats["tasks_completed"]
+
+    def load_stats(self):
+        self.apply_stats(self.client.call("balances"))
+
+    def save_stats(self):
+        self.load_stats()
+
+    def history_page(self, before=None, limit=10):
+        page = self.client.call("history", before=before, limit=limit)
+        return page["transactions"], page["cursor"]
+
+    def cash_out(self, amount):
+        result = self.client.call("cash_out", amount=amount)
+        self.apply_stats(result["balances"])
+        return result["success"], result["message"]
+
+    def buy_toki(self, amount):
+        result = self.client.call("buy_toki", amount=amount)
+        self.apply_stats(result["balances"])
+        return result["success"], result["message"]
+
+    def create_task(self, description, eddie_cost):
+        result = self.client.call("create_task", description=description, eddie_cost=eddie_cost)
+        self.apply_stats(result["balances"])
+        return result["success"], result["message"], result["task"]
+
+    def get_available_tasks(self):
+        return self.task_manager.open_tasks_window(0, self.task_manager.open_task_count())
+
+    def complete_task(self, task_id):
+        result = self.client.call("complete_task", task_id=task_id)
+        self.apply_stats(result["balances"])
+        return result["reward"]
+
+    def logout(self):
+        self.client.logout()
@@ -0,0 +1,326 @@
+import json
+import os
+import shutil
+import struct
+from pathlib import Path
+from urllib.parse import quote
+
+from . import metrics
+from .ledger_archive import LedgerArchive
+from .locking import file_lock, atomic_write_json
+
+LEDGER_DIR = Path("data") / "ledger"
+LEGACY_LEDGER_FILE = Path("data") / "zaman_ledger.json"
+SEGMENT_MAX_BYTES = 1024 * 1024  # Roll over to a new segment after ~1MB
+INDEX_RECORD = struct.Struct("<IQ")  # (segment number, byte offset) of one of a user's transactions
+
+
+class Ledger:
+    """Append-only journal of Zaman transactions split into rolling segments.
+
+    Each transaction is one JSON line in data/ledger/segment-NNNNNN.jsonl.
+    checkpoint.json holds the running total_fees plus the position it was
+    computed at, so appending never has to look at older records. Appends
+    from concurrent sessions are serialised by the checkpoint's file lock.
+
+    index/<user>.idx lists where each of a user's transactions lives, as
+    fixed-size records, so a user's history can be paged backwards without
+    reading anyone else's entries.
+    """
+
+    def __init__(self, ledger_dir=LEDGER_DIR, legacy_file=LEGACY_LEDGER_FILE,
+                 segment_max_bytes=SEGMENT_MAX_BYTES):
+        self.ledger_dir = Path(ledger_dir)
+        self.legacy_file = Path(legacy_file)
+        self.segment_max_bytes = segment_max_bytes
+        self.checkpoint_file = self.ledger_dir / "checkpoint.json"
+        self.index_dir = self.ledger_dir / "index"
+
+        self.total_fees = 0
+        self.segment = 1
+        self.offset = 0  # Bytes of the current segment covered by total_fees
+        self.count = 0
+        self._archive = None
+        self.initialize()
+
+    def initialize(self):
+        """Create the journal (importing the old single-file ledger) and recover"""
+        self.ledger_dir.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.checkpoint_file):
+            if not self.segment_numbers():
+                self.import_legacy()
+            self.load_checkpoint()
+            if not self.index_dir.exists():
+                self.build_index()
+            self.recover()
+
+    def segment_path(self, number):
+        return self.ledger_dir / f"segment-{number:06d}.jsonl"
+
+    def segment_numbers(self):
+        """Numbers of all existing segments, oldest first"""
+        numbers = []
+        for path in self.ledger_dir.glob("segment-*.jsonl"):
+            try:
+                numbers.append(int(path.stem.split("-")[1]))
+            except (IndexError, ValueError):
+                continue
+        return sorted(numbers)
+
+    def import_legacy(self):
+        """Seed the journal from data/zaman_ledger.json if it is present"""
+        try:
+            with open(self.legacy_file, 'r') as f:
+                legacy = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            legacy = {}
+
+        transactions = legacy.get("transactions", [])
+        with open(self.segment_path(1), 'a') as f:
+            for tx in transactions:
+                f.write(json.dumps(tx) + "\n")
+
+        self.total_fees = legacy.get("total_fees", 0)
+        self.segment = 1
+        self.offset = self.segment_path(1).stat().st_size
+        self.count = len(transactions)
+        self.save_checkpoint()
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            checkpoint = self.rebuild_checkpoint()
+        self.total_fees = checkpoint.get("total_fees", 0)
+        self.segment = checkpoint.get("segment", 1)
+        self.offset = checkpoint.get("offset", 0)
+        self.count = checkpoint.get("count", 0)
+
+    def save_checkpoint(self):
+        """Atomically replace the checkpoint (it is a handful of bytes)"""
+        checkpoint = {
+            "total_fees": self.total_fees,
+            "segment": self.segment,
+            "offset": self.offset,
+            "count": self.count
+        }
+        atomic_write_json(self.checkpoint_file, checkpoint)
+
+    def rebuild_checkpoint(self):
+        """Recompute the checkpoint from every segment (only if it was lost)"""
+        total_fees, count = 0, 0
+        numbers = self.segment_numbers() or [1]
+        for tx in self.iter_transactions():
+            total_fees = round(total_fees + tx.get("fee", 0), 2)
+            count += 1
+        last = self.segment_path(numbers[-1])
+        offset = last.stat().st_size if last.exists() else 0
+        return {"total_fees": total_fees, "segment": numbers[-1], "offset": offset, "count": count}
+
+    def recover(self):
+        """Fold in records written after the last checkpoint and drop a torn tail"""
+        recovered = False
+        number = self.segment
+        while self.segment_path(number).exists():
+            if number > self.segment:
+                self.segment, self.offset = number, 0
+            with open(self.segment_path(number), 'rb+') as f:
+                f.seek(self.offset)
+                tail = f.read()
+                complete = tail[:tail.rfind(b"\n") + 1]
+                if len(complete) < len(tail):
+                    f.truncate(self.offset + len(complete))
+            position = self.offset
+            for line in complete.splitlines(keepends=True):
+                try:
+                    tx = json.loads(line)
+                except json.JSONDecodeError:
+                    position += len(line)
+                    continue
+                self.total_fees = round(self.total_fees + tx.get("fee", 0), 2)
+                self.count += 1
+                self.index_entry(tx.get("username"), number, position, only_if_newer=True)
+                position += len(line)
+            self.offset += len(complete)
+            recovered = recovered or bool(tail)
+            number += 1
+        if recovered:
+            self.save_checkpoint()
+
+    def index_path(self, username):
+        return self.index_dir / f"{quote(str(username), safe='')}.idx"
+
+    def index_entry(self, username, segment, offset, only_if_newer=False):
+        """Add one (segment, offset) pointer to `username`'s history index"""
+        with open(self.index_path(username), 'ab+') as f:
+            if only_if_newer and f.tell() >= INDEX_RECORD.size:
+                # Recovery may revisit a record whose pointer was already written
+                f.seek(-INDEX_RECORD.size, os.SEEK_END)
+                if INDEX_RECORD.unpack(f.read(INDEX_RECORD.size)) >= (segment, offset):
+                    return
+            f.write(INDEX_RECORD.pack(segment, offset))
+
+    def build_index(self):
+        """Create index/ from every segment (first run on an existing ledger)"""
+        pointers = {}
+        for number in self.segment_numbers():
+            position = 0
+            with open(self.segment_path(number), 'rb') as f:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        try:
+                            username = json.loads(line).get("username")
+                            pointers.setdefault(username, bytearray()).extend(
+                                INDEX_RECORD.pack(number, position))
+                        except json.JSONDecodeError:
+                            pass
+                    position += len(line)
+
+        tmp_dir = self.ledger_dir / "index.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+        for username, data in pointers.items():
+            with open(tmp_dir / self.index_path(username).name, 'wb') as f:
+                f.write(data)
+        os.replace(tmp_dir, self.index_dir)
+
+    def refresh(self):
+        """Pick up appends made by other sessions"""
+        self.load_checkpoint()
+
+    def append(self, entry, sync=False):
+        """Append one transaction; cost does not depend on ledger size"""
+        self.append_many([entry], sync)
+
+    @metrics.timed("ledger_append")
+    def append_many(self, entries, sync=False):
+        """Append transactions with one write (and one fsync if `sync`).
+
+        Each entry is stamped with "seq", its 1-based position in the
+        ledger, before it is written.
+        """
+        if not entries:
+            return
+        with file_lock(self.checkpoint_file):
+            self.load_checkpoint()  # Another session may have appended since
+            self.recover()
+            if self.offset >= self.segment_max_bytes:
+                self.segment += 1
+                self.offset = 0
+
+            lines = []
+            for n, entry in enumerate(entries, self.count + 1):
+                entry["seq"] = n
+                lines.append((json.dumps(entry) + "\n").encode())
+            with open(self.segment_path(self.segment), 'ab') as f:
+                f.write(b"".join(lines))
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            # Index only once the records are on disk, so no pointer dangles
+            for entry, line in zip(entries, lines):
+                self.index_entry(entry.get("username"), self.segment, self.offset)
+                self.total_fees = round(self.total_fees + entry.get("fee", 0), 2)
+                self.offset += len(line)
+                self.count += 1
+            self.save_checkpoint()
+
+    def entries_after(self, username, seq):
+        """`username`'s transactions with a "seq" above `seq`, oldest first"""
+        newer = []
+        cursor = None
+        while True:
+            page, cursor = self.history(username, cursor, 16)
+            for tx in page:
+                if tx.get("seq", 0) <= seq:
+                    return newer[::-1]
+                newer.append(tx)
+            if cursor is None:
+                return newer[::-1]
+
+    def read_segment(self, number):
+        """Parsed transactions of one segment, skipping damaged lines"""
+        transactions = []
+        try:
+            with open(self.segment_path(number), 'r') as f:
+                for line in f:
+                    try:
+                        transactions.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return transactions
+
+    def iter_transactions(self):
+        """Yield every transaction, oldest first, one segment at a time"""
+        for number in self.segment_numbers():
+            yield from self.read_segment(number)
+
+    def recent(self, limit=10):
+        """Last `limit` transactions, newest first, reading only the tail segments"""
+        result = []
+        for number in reversed(self.segment_numbers()):
+            result.extend(reversed(self.read_segment(number)))
+            if len(result) >= limit:
+                break
+        return result[:limit]
+
+    def history(self, username, before=None, limit=10):
+        """One page of `username`'s transactions, newest first.
+
+        Returns (transactions, cursor); pass the cursor back as `before` for
+        the next older page. The cursor is None once the oldest entry has
+        been returned. Only the index and the page's own records are read.
+        """
+        try:
+            with open(self.index_path(username), 'rb') as f:
+                total = os.fstat(f.fileno()).st_size // INDEX_RECORD.size
+                end = total if before is None else min(before, total)
+                start = max(0, end - limit)
+                f.seek(start * INDEX_RECORD.size)
+                data = f.read((end - start) * INDEX_RECORD.size)
+        except FileNotFoundError:
+            return [], None
+
+        pointers = [INDEX_RECORD.unpack_from(data, i) for i in range(0, len(data), INDEX_RECORD.size)]
+        transactions = []
+        handles = {}
+        try:
+            for segment, offset in reversed(pointers):
+                if segment not in handles:
+                    handles[segment] = open(self.segment_path(segment), 'rb')
+                handles[segment].seek(offset)
+                transactions.append(json.loads(handles[segment].readline()))
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return transactions, (start or None)
+
+    @property
+    def archive(self):
+        """Columnar copy of the sealed segments (see ledger_archive)"""
+        if self._archive is None:
+            self._archive = LedgerArchive(self.ledger_dir / "archive")
+        return self._archive
+
+    def summarize(self, metric="count", by=None, **filters):
+        """Sum/count over the whole ledger, optionally grouped by day, type or user.
+
+        Sealed segments are archived first and scanned in columnar form;
+        only the live segment is parsed as JSON.
+        """
+        archive = self.archive
+        archive.compact(self)
+        tail = (tx for number in self.segment_numbers() if number > archive.segment
+                for tx in self.read_segment(number))
+        return archive.query(metric, by, tail=tail, **filters)
+
+    def load(self):
+        """Whole ledger in the old zaman_ledger.json shape"""
+        return {
+            "total_fees": self.total_fees,
+            "transactions": list(self.iter_transactions())
+        }
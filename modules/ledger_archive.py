@@ -0,0 +1,283 @@
+"""Columnar binary archive of the ledger's sealed segments, for analytics.
+
+Every segment the ledger has rolled past is appended to fixed-width
+column files in data/ledger/archive/, one value per transaction:
+
+    ts.i64      timestamp, microseconds since 1970-01-01 (as recorded)
+    day.i32     ts // one day, kept so day filters and group-bys need no division
+    amount.i64  amount in hundredths (fixed point, SCALE)
+    fee.i64     fee in hundredths
+    type.u16    id into dictionary.json's "types"
+    user.u32    id into dictionary.json's "users"
+
+The column files are written first, then dictionary.json, then
+manifest.json. The manifest holds the row count and one block per
+archived segment (row range and min/max day). Bytes past the manifest's
+row count are left over from an interrupted compaction and are cut
+before the next one.
+
+Queries mmap the columns and work on memoryview casts. Sums, counts and
+low-cardinality group-bys run as C-level passes (sum, Counter,
+itertools.compress) with no per-row Python objects built by Zaman code.
+Blocks whose day range lies wholly inside or outside a filter are taken
+or skipped whole. The JSON segments stay where they are: history paging
+and balance recovery read them, and the archive is a derived copy.
+"""
+import itertools
+import mmap
+import operator
+import os
+import sys
+from array import array
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from .locking import file_lock, atomic_write_json, read_json
+
+SCALE = 100  # Amounts and fees are stored in hundredths
+COLUMNS = {"ts": "q", "day": "i", "amount": "q", "fee": "q", "type": "H", "user": "I"}
+FILE_NAMES = {"ts": "ts.i64", "day": "day.i32", "amount": "amount.i64", "fee": "fee.i64",
+              "type": "type.u16", "user": "user.u32"}
+METRICS = ("count", "amount", "fee")
+GROUPS = (None, "day", "type", "user")
+EPOCH = datetime(1970, 1, 1)
+MICROS_PER_DAY = 86_400_000_000
+COMPRESS_MAX_KEYS = 32  # Group-bys with more keys use one Python pass instead of one C pass per key
+
+
+def timestamp_micros(text):
+    """Microseconds since the epoch of an ISO timestamp, 0 if it is unreadable"""
+    try:
+        moment = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return 0
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def day_number(value):
+    """Days since the epoch of a date, datetime or "YYYY-MM-DD" string"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH.date()).days
+
+
+def day_label(number):
+    return (EPOCH.date() + timedelta(days=number)).isoformat()
+
+
+class LedgerArchive:
+    def __init__(self, archive_dir):
+        if sys.byteorder != "little":
+            raise RuntimeError("The ledger archive is little-endian only")
+        self.archive_dir = archive_dir
+        self.manifest_file = archive_dir / "manifest.json"
+        self.dictionary_file = archive_dir / "dictionary.json"
+
+        self.rows = 0
+        self.segment = 0  # Last ledger segment archived
+        self.blocks = []  # [first row, end row, min day, max day] per archived segment
+        self.types, self.users = [], []
+        self.maps = {}  # column -> mmap while open
+        self.columns = {}  # column -> memoryview of `rows` values
+        self.load()
+
+    def column_path(self, name):
+        return self.archive_dir / FILE_NAMES[name]
+
+    def load(self):
+        """(Re)read the manifest and dictionary and map the columns"""
+        self.close()
+        manifest = read_json(self.manifest_file) or {}
+        dictionary = read_json(self.dictionary_file) or {}
+        self.rows = manifest.get("rows", 0)
+        self.segment = manifest.get("segment", 0)
+        self.blocks = manifest.get("blocks", [])
+        self.types = dictionary.get("types", [])
+        self.users = dictionary.get("users", [])
+        if not self.rows:
+            return
+        for name, code in COLUMNS.items():
+            with open(self.column_path(name), 'rb') as f:
+                self.maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.columns[name] = memoryview(self.maps[name]).cast(code)[:self.rows]
+
+    def close(self):
+        for view in self.columns.values():
+            view.release()
+        self.columns = {}
+        for mapped in self.maps.values():
+            mapped.close()
+        self.maps = {}
+
+    def compact(self, ledger):
+        """Append every sealed segment not archived yet; returns rows added"""
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.manifest_file):
+            self.load()
+            ledger.refresh()
+            sealed = [n for n in ledger.segment_numbers() if self.segment < n < ledger.segment]
+            if not sealed:
+                return 0
+
+            type_ids = {name: n for n, name in enumerate(self.types)}
+            user_ids = {name: n for n, name in enumerate(self.users)}
+            values = {name: array(code) for name, code in COLUMNS.items()}
+            blocks = []
+            for number in sealed:
+                first = self.rows + len(values["ts"])
+                for tx in ledger.read_segment(number):
+                    ts = timestamp_micros(tx.get("timestamp"))
+                    values["ts"].append(ts)
+                    values["day"].append(ts // MICROS_PER_DAY)
+                    values["amount"].append(round(tx.get("amount", 0) * SCALE))
+                    values["fee"].append(round(tx.get("fee", 0) * SCALE))
+                    values["type"].append(type_ids.setdefault(tx.get("type", ""), len(type_ids)))
+                    values["user"].append(user_ids.setdefault(tx.get("username", ""), len(user_ids)))
+                end = self.rows + len(values["ts"])
+                days = values["day"][first - self.rows:]
+                blocks.append([first, end, min(days, default=0), max(days, default=0)])
+
+            self.close()
+            for name, code in COLUMNS.items():
+                with open(self.column_path(name), 'ab') as f:
+                    f.truncate(self.rows * values[name].itemsize)  # Drop an interrupted compaction
+                    f.seek(0, os.SEEK_END)
+                    f.write(values[name].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            atomic_write_json(self.dictionary_file, {"types": list(type_ids), "users": list(user_ids)})
+            added = len(values["ts"])
+            atomic_write_json(self.manifest_file, {"rows": self.rows + added, "segment": sealed[-1],
+                                                   "blocks": self.blocks + blocks})
+            self.load()
+            return added
+
+    # Queries
+
+    def query(self, metric="count", by=None, types=None, users=None, since=None, until=None, tail=()):
+        """Aggregate archived transactions.
+
+        `metric` is "count", "amount" or "fee"; `by` is None, "day", "type"
+        or "user". `types`/`users` restrict to those names; `since`/`until`
+        to an inclusive range of days (dates or "YYYY-MM-DD"). `tail` are
+        transaction dicts not archived yet (the ledger's live segments),
+        folded in row by row. Returns a number, or {key: number} with days
+        as "YYYY-MM-DD".
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r} (expected one of {', '.join(METRICS)})")
+        if by not in GROUPS:
+            raise ValueError(f"Unknown grouping {by!r} (expected day, type or user)")
+        first_day = day_number(since) if since is not None else None
+        last_day = day_number(until) if until is not None else None
+        type_ids = self.ids(self.types, types)
+        user_ids = self.ids(self.users, users)
+
+        totals = Counter()
+        for start, end, low, high in self.ranges(first_day, last_day):
+            whole = (first_day is None or low >= first_day) and (last_day is None or high <= last_day)
+            selected = self.selection(start, end, None if whole else (first_day, last_day), type_ids, user_ids)
+            if by == "day" and low == high:
+                self.aggregate(totals, metric, None, start, end, selected, key=low)  # Block of one day
+            else:
+                self.aggregate(totals, metric, by, start, end, selected)
+
+        names = {"type": self.types, "user": self.users}.get(by)
+        labelled = Counter()
+        for key, value in totals.items():
+            labelled[None if by is None else day_label(key) if by == "day" else names[key]] += value
+        wanted_types = None if types is None else self.names(types)
+        wanted_users = None if users is None else self.names(users)
+        for tx in tail:
+            day = timestamp_micros(tx.get("timestamp")) // MICROS_PER_DAY
+            if (wanted_types is not None and tx.get("type", "") not in wanted_types) or \
+                    (wanted_users is not None and tx.get("username", "") not in wanted_users) or \
+                    (first_day is not None and day < first_day) or (last_day is not None and day > last_day):
+                continue
+            key = {None: None, "day": day_label(day), "type": tx.get("type", ""),
+                   "user": tx.get("username", "")}[by]
+            labelled[key] += 1 if metric == "count" else round(tx.get(metric, 0) * SCALE)
+
+        if by is None:
+            return self.scaled(metric, labelled[None])
+        return {key: self.scaled(metric, value) for key, value in sorted(labelled.items())}
+
+    @staticmethod
+    def names(wanted):
+        return {wanted} if isinstance(wanted, str) else set(wanted)
+
+    def ids(self, names, wanted):
+        if wanted is None:
+            return None
+        index = {name: n for n, name in enumerate(names)}
+        return {index[name] for name in self.names(wanted) if name in index}
+
+    @staticmethod
+    def scaled(metric, value):
+        return value if metric == "count" else value / SCALE
+
+    def ranges(self, first_day, last_day):
+        """Blocks that can hold rows in the day range"""
+        for start, end, low, high in self.blocks:
+            if (first_day is not None and high < first_day) or (last_day is not None and low > last_day):
+                continue
+            yield start, end, low, high
+
+    def selection(self, start, end, day_range, type_ids, user_ids):
+        """Row flags for [start, end), one byte each, or None if every row counts"""
+        masks = []
+        if day_range is not None:
+            first_day, last_day = day_range
+            days = self.columns["day"][start:end]
+            if first_day is not None:
+                masks.append(map(operator.ge, days, itertools.repeat(first_day)))
+            if last_day is not None:
+                masks.append(map(operator.le, days, itertools.repeat(last_day)))
+        for name, ids in (("type", type_ids), ("user", user_ids)):
+            if ids is None:
+                continue
+            column = self.columns[name][start:end]
+            if len(ids) == 1:
+                masks.append(map(operator.eq, column, itertools.repeat(next(iter(ids)))))
+            else:
+                masks.append(map(ids.__contains__, column))
+        if not masks:
+            return None
+        selected = masks[0]
+        for mask in masks[1:]:
+            selected = map(operator.and_, selected, mask)
+        return bytes(selected)  # Built in C; compress() and sum() take it as it is
+
+    def aggregate(self, totals, metric, by, start, end, selected, key=None):
+        """Add the metric over rows [start, end) (where `selected`) into `totals`.
+
+        Without `by` everything goes to totals[key].
+        """
+        values = None if metric == "count" else self.columns[metric][start:end]
+        if by is None:
+            if selected is None:
+                totals[key] += (end - start) if values is None else sum(values)
+            else:
+                totals[key] += sum(selected) if values is None else sum(itertools.compress(values, selected))
+            return
+
+        keys = self.columns[by][start:end]
+        if selected is not None:
+            # Packed like the columns they come from: no Python object kept per row
+            keys = array(COLUMNS[by], itertools.compress(keys, selected))
+            if values is not None:
+                values = array(COLUMNS[metric], itertools.compress(values, selected))
+        if values is None:
+            totals.update(keys)
+            return
+        distinct = set(keys)
+        if len(distinct) <= COMPRESS_MAX_KEYS:
+            for key in distinct:
+                totals[key] += sum(itertools.compress(values, map(operator.eq, keys, itertools.repeat(key))))
+        else:
+            for key, value in zip(keys, values):
+                totals[key] += value
@@ -0,0 +1,83 @@
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+class FileLock:
+    """Advisory flock() held on a `<path>.lock` sidecar file.
+
+    The sidecar is never replaced, so the lock survives the atomic
+    temp-file-plus-rename writes done on the real file.
+    """
+
+    def __init__(self, path):
+        self.lock_path = f"{path}.lock"
+        self.fd = None
+
+    def acquire(self, shared=False, blocking=True):
+        if self.fd is not None:
+            return True
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is None:
+            return
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Hold the advisory lock for `path` for the duration of the block"""
+    lock = FileLock(path)
+    lock.acquire(shared=shared)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file in the same directory and rename it into place"""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def fsync_dir(path):
+    """Make the creations, renames and removals of entries in directory `path` durable"""
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_json(path, default=None):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
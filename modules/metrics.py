@@ -0,0 +1,135 @@
+"""Opt-in timing of persistence calls and screen renders.
+
+Set ZAMAN_METRICS=1 to turn it on. Functions decorated with @timed(name)
+then record their latency into a histogram with power-of-two
+microsecond buckets (count, total, max, p50/p95/p99 upper bounds).
+count() bumps plain counters. Every ZAMAN_METRICS_INTERVAL seconds (10
+by default), and at exit, a snapshot is written to ZAMAN_METRICS_FILE
+(data/metrics.json by default). The hidden Diagnostics screen ("D" in
+the main menu) shows the same numbers live.
+
+When the variable is unset, @timed returns the function untouched, so
+there is no overhead at all.
+"""
+import atexit
+import os
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+
+from .locking import atomic_write_json
+
+ENABLED = os.environ.get("ZAMAN_METRICS", "") not in ("", "0")
+METRICS_FILE = Path(os.environ.get("ZAMAN_METRICS_FILE", Path("data") / "metrics.json"))
+DUMP_INTERVAL = float(os.environ.get("ZAMAN_METRICS_INTERVAL", 10))
+BUCKETS = 32  # Bucket n holds latencies below 2**n microseconds; the last one everything slower
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0  # Nanoseconds
+        self.max = 0
+
+    def add(self, nanoseconds):
+        self.buckets[min(BUCKETS - 1, (nanoseconds // 1000).bit_length())] += 1
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+
+    def percentile(self, fraction):
+        """Upper bound in microseconds of the bucket holding that fraction"""
+        wanted = self.count * fraction
+        seen = 0
+        for n, hits in enumerate(self.buckets):
+            seen += hits
+            if hits and seen >= wanted:
+                return 1 << n
+        return 0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count / 1000, 1) if self.count else 0.0,
+            "max_us": round(self.max / 1000, 1),
+            "p50_us": self.percentile(0.50),
+            "p95_us": self.percentile(0.95),
+            "p99_us": self.percentile(0.99),
+        }
+
+
+class Registry:
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.dumper = None
+
+    def record(self, name, nanoseconds):
+        with self.lock:
+            histogram = self.timers.get(name)
+            if histogram is None:
+                histogram = self.timers[name] = Histogram()
+                self.start_dumper()
+            histogram.add(nanoseconds)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "uptime_s": round(time.time() - self.started, 1),
+                "timers": {name: histogram.summary() for name, histogram in sorted(self.timers.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def dump(self, path=None):
+        path = Path(path or METRICS_FILE)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(path, self.snapshot())
+
+    def start_dumper(self):
+        if self.dumper is None:
+            self.dumper = threading.Thread(target=self.run_dumper, daemon=True)
+            self.dumper.start()
+            atexit.register(self.dump)
+
+    def run_dumper(self):
+        while True:
+            time.sleep(DUMP_INTERVAL)
+            try:
+                self.dump()
+            except OSError:
+                pass  # Keep timing even if the file cannot be written right now
+
+
+registry = Registry()
+
+
+def timed(name):
+    """Decorator recording the call's latency under `name` (only when ENABLED)"""
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                registry.record(name, time.perf_counter_ns() - start)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    if ENABLED:
+        registry.count(name, n)
@@ -0,0 +1,118 @@
+"""Password hashing with a memory-hard KDF, run in a worker pool.
+
+Hashes are self-describing strings:
+    scrypt$<log2 n>$<r>$<p>$<salt>$<key>
+    pbkdf2$<iterations>$<salt>$<key>
+(salt and key base64). A bare 64-hex-digit string is the old salted
+SHA-256 from before the KDF. It still verifies, so existing accounts can
+log in.
+
+ZAMAN_KDF picks the KDF and cost for new hashes, e.g. "scrypt:14" (the
+default, 16 MiB per hash) or "pbkdf2:600000". ZAMAN_KDF_WORKERS sizes the
+pool; hashlib drops the GIL while it works, so threads run in parallel.
+"""
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_KDF = "scrypt:14"
+DEFAULT_COST = {"scrypt": 14, "pbkdf2": 600_000}  # log2 n / iterations
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+LEGACY_SALT = "zaman_salt_"
+
+_pool = None
+
+
+def kdf_setting():
+    """(kind, cost) from ZAMAN_KDF"""
+    kind, _, cost = os.environ.get("ZAMAN_KDF", DEFAULT_KDF).partition(":")
+    if kind not in ("scrypt", "pbkdf2"):
+        raise ValueError(f"Unknown KDF {kind!r} (expected scrypt or pbkdf2)")
+    return kind, int(cost) if cost else DEFAULT_COST[kind]
+
+
+def kdf_pool():
+    global _pool
+    if _pool is None:
+        workers = int(os.environ.get("ZAMAN_KDF_WORKERS", 0)) or os.cpu_count() or 1
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kdf")
+    return _pool
+
+
+def _forget_pool():
+    global _pool
+    _pool = None  # A forked child inherits the pool but none of its threads
+
+
+os.register_at_fork(after_in_child=_forget_pool)
+
+
+def set_pool_size(workers):
+    """Replace the KDF pool with one of `workers` threads"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+    _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kdf")
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _scrypt(password, salt, log_n, r, p):
+    n = 1 << log_n
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * r * n, dklen=KEY_BYTES)
+
+
+def hash_password(password, kdf=None, cost=None):
+    """New salted hash of `password` (blocking; see hash_password_async)"""
+    if kdf is None:
+        kdf, default_cost = kdf_setting()
+        cost = cost or default_cost
+    salt = os.urandom(SALT_BYTES)
+    if kdf == "scrypt":
+        key = _scrypt(password, salt, cost, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${cost}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+    key = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, cost, KEY_BYTES)
+    return f"pbkdf2${cost}${_b64(salt)}${_b64(key)}"
+
+
+def legacy_hash(password):
+    return hashlib.sha256((LEGACY_SALT + password).encode()).hexdigest()
+
+
+def verify_password(password, stored):
+    """Check `password` against a stored hash of any supported format"""
+    if not stored:
+        return False
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            log_n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            expected = base64.b64decode(parts[5])
+            key = _scrypt(password, base64.b64decode(parts[4]), log_n, r, p)
+        elif parts[0] == "pbkdf2" and len(parts) == 4:
+            expected = base64.b64decode(parts[3])
+            key = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(parts[2]),
+                                      int(parts[1]), len(expected))
+        else:
+            return hmac.compare_digest(legacy_hash(password), stored)
+    except (ValueError, MemoryError):
+        return False
+    return hmac.compare_digest(key, expected)
+
+
+def hash_password_async(password, kdf=None, cost=None):
+    """Future of hash_password() on the KDF pool"""
+    return kdf_pool().submit(hash_password, password, kdf, cost)
+
+
+def verify_password_async(password, stored):
+    """Future of verify_password() on the KDF pool"""
+    return kdf_pool().submit(verify_password, password, stored)
@@ -0,0 +1,202 @@
+"""Audit of stored balances against the ledger and the task records.
+
+Every account is expected to hold DEFAULT_STATS, plus the effect of each
+of its ledger entries, plus its task activity:
+- "deltas" recorded on the entry (every entry since group commit), or
+  for older entries the buy/cash_out formulas of AppState. task_reward
+  entries (see settlement) are skipped: they pay out completions that
+  the task records already account for, so a lost settlement shows up;
+- every task a user created cost them its reward;
+- every task they completed paid them its reward and one tasks_completed.
+
+The audit runs on a process pool in two phases, sharded by the user
+directory's username hash:
+1. map: each ledger segment, and the task log with the task archive, is
+   read by one job. The job returns per-shard
+   {user: [toki, eddie, tasks_completed, last seq]} sums.
+2. reduce: each job takes a group of shards. It merges their sums, reads
+   those users' records from the account table and reports every user
+   whose stats do not match.
+
+Problems reported per user:
+- drift: stats disagree with the replay;
+- missing_stats: activity or an account but no stats record;
+- no_account: stats or activity for a name that never registered;
+- recovery_pending: stats behind the ledger or their intent journal
+  (written behind, see stats_cache), replayed on next load.
+"""
+import os
+import time
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .account_table import AccountTable
+from .ledger import Ledger
+from .storage.base import DEFAULT_STATS
+from .stats_cache import read_journal
+from .storage.json_backend import JSONTaskLog
+from .task_archive import TaskArchive
+from .user_directory import UserDirectory
+
+TOKI_PRICE = 190  # Eddies per toki, as in AppState.buy_toki/cash_out
+TOLERANCE = 0.005  # Eddie amounts carry two decimals
+GROUPS_PER_WORKER = 4  # Reduce jobs per worker, so one slow shard group does not idle the rest
+
+
+def ledger_effect(tx):
+    """(toki, eddie, tasks_completed) that a ledger entry applied to its user"""
+    if tx.get("type") == "task_reward":
+        return 0, 0, 0  # Settles completions that map_tasks already credits from the task records
+    deltas = tx.get("deltas")
+    if deltas is not None:
+        return deltas.get("toki", 0), deltas.get("eddie", 0), deltas.get("tasks_completed", 0)
+    amount, fee = tx.get("amount", 0), tx.get("fee", 0)
+    if tx.get("type") == "buy":
+        return amount, -(amount * TOKI_PRICE + fee), 0
+    if tx.get("type") == "cash_out":
+        return -amount, (amount - fee) * TOKI_PRICE, 0
+    return 0, 0, 0  # Other entry types, e.g. informational ones, move no balance
+
+
+def add_effect(partial, directory, username, toki, eddie, tasks_completed, seq=0):
+    shard = partial.setdefault(directory.shard(username), {})
+    sums = shard.get(username)
+    if sums is None:
+        sums = shard[username] = [0, 0, 0, 0]
+    sums[0] += toki
+    sums[1] += eddie
+    sums[2] += tasks_completed
+    if seq > sums[3]:
+        sums[3] = seq
+
+
+def map_segment(data_dir, number):
+    """Per-shard sums of one ledger segment"""
+    data_dir = Path(data_dir)
+    directory = UserDirectory(data_dir / "users")
+    directory.initialize()
+    ledger = Ledger.__new__(Ledger)  # Only read_segment is needed; skip initialize()'s lock and recovery
+    ledger.ledger_dir = data_dir / "ledger"
+    partial = {}
+    for tx in ledger.read_segment(number):
+        username = tx.get("username")
+        if username is not None:
+            add_effect(partial, directory, username, *ledger_effect(tx), tx.get("seq", 0))
+    return partial
+
+
+def map_tasks(data_dir):
+    """Per-shard sums of every task's creation cost and completion reward"""
+    data_dir = Path(data_dir)
+    directory = UserDirectory(data_dir / "users")
+    directory.initialize()
+    log = JSONTaskLog(data_dir, background_compaction=False)
+    log.load()
+    partial = {}
+    for task in chain(log.store, TaskArchive(data_dir / "tasks_archive")):
+        reward = task.get("reward", 0)
+        add_effect(partial, directory, task["creator"], 0, -reward, 0)
+        if task.get("status") == "completed" and task.get("completed_by"):
+            add_effect(partial, directory, task["completed_by"], 0, reward, 1)
+    return partial
+
+
+def reduce_shards(data_dir, shards, partials, stats_names):
+    """Problems found among the users of `shards`"""
+    data_dir = Path(data_dir)
+    directory = UserDirectory(data_dir / "users")
+    directory.initialize()
+    table = AccountTable(data_dir / "accounts")
+    table.initialize()
+    problems = []
+    checked = 0
+    for shard in shards:
+        sums = {}
+        for partial in partials:
+            for username, (toki, eddie, tasks_completed, seq) in partial.get(shard, {}).items():
+                total = sums.setdefault(username, [0, 0, 0, 0])
+                total[0] += toki
+                total[1] += eddie
+                total[2] += tasks_completed
+                total[3] = max(total[3], seq)
+        accounts = directory.load_shard(shard)
+        for username in sorted(set(accounts) | set(sums) | set(stats_names.get(shard, ()))):
+            checked += 1
+            problem = check_user(table, username, username in accounts, sums.get(username, [0, 0, 0, 0]))
+            if problem:
+                problems.append(problem)
+    return checked, problems
+
+
+def check_user(table, username, registered, sums):
+    toki, eddie, tasks_completed, last_seq = sums
+    expected = {
+        "toki_balance": DEFAULT_STATS["toki_balance"] + toki,
+        "eddie_balance": round(DEFAULT_STATS["eddie_balance"] + eddie, 2),
+        "tasks_completed": DEFAULT_STATS["tasks_completed"] + tasks_completed,
+    }
+    stats = table.read(username)
+    report = {"username": username, "expected": expected}
+    if stats is None:
+        return {**report, "problem": "missing_stats" if registered else "no_account", "actual": stats}
+    actual = {field: stats.get(field) for field in expected}
+    report["actual"] = actual
+    if not registered:
+        return {**report, "problem": "no_account"}
+    if stats.get("ledger_seq", 0) < last_seq:
+        return {**report, "problem": "recovery_pending"}
+    records, _ = read_journal(table.journal_path(username))
+    if any(record["seq"] > stats.get("journal_seq", 0) for record in records):
+        return {**report, "problem": "recovery_pending"}
+    for field, value in expected.items():
+        if abs(actual[field] - value) > TOLERANCE:
+            return {**report, "problem": "drift"}
+    return None
+
+
+def reconcile(data_dir="data", workers=None):
+    """Audit every account; returns a report dict"""
+    start = time.perf_counter()
+    data_dir = Path(data_dir)
+    ledger = Ledger(data_dir / "ledger", data_dir / "zaman_ledger.json")  # Imports/recovers as on login
+    directory = UserDirectory(data_dir / "users", data_dir / "users.json")
+    directory.initialize()
+
+    table = AccountTable(data_dir / "accounts", data_dir / "stats")  # Imports the stats files on first run
+    stats_names = {}
+    for username, _ in table:
+        stats_names.setdefault(directory.shard(username), []).append(username)
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(map_segment, data_dir, number) for number in ledger.segment_numbers()]
+        jobs.append(pool.submit(map_tasks, data_dir))
+        partials = [job.result() for job in jobs]
+        mapped = time.perf_counter()
+
+        group_count = min(directory.shards, workers * GROUPS_PER_WORKER)
+        groups = [list(range(n, directory.shards, group_count)) for n in range(group_count)]
+        jobs = [pool.submit(reduce_shards, data_dir, group,
+                            [{shard: p[shard] for shard in group if shard in p} for p in partials],
+                            {shard: stats_names[shard] for shard in group if shard in stats_names})
+                for group in groups]
+        checked, problems = 0, []
+        for job in jobs:
+            group_checked, group_problems = job.result()
+            checked += group_checked
+            problems.extend(group_problems)
+
+    problems.sort(key=lambda problem: problem["username"])
+    counts = {}
+    for problem in problems:
+        counts[problem["problem"]] = counts.get(problem["problem"], 0) + 1
+    return {
+        "users": checked,
+        "segments": len(partials) - 1,
+        "workers": workers,
+        "map_seconds": round(mapped - start, 3),
+        "seconds": round(time.perf_counter() - start, 3),
+        "problems": counts,
+        "details": problems,
+    }
@@ -0,0 +1,196 @@
+"""Shared curses rendering for every screen.
+
+Screens used to stdscr.clear() and redraw everything on each key press;
+clear() makes curses repaint the whole terminal, so every arrow key sent
+a full screen of escape codes (over SSH, a full screen per key). Now all
+screens draw through one Screen per window (screen_for):
+
+- Drawing happens inside `with screen.frame(name):`. put() only records
+  the text of each line; at the end of the frame the lines are compared
+  with what the previous frame drew, and only changed lines are
+  rewritten (move, clrtoeol, addstr). Then noutrefresh/doupdate send
+  curses' own minimal diff to the terminal.
+- Writes outside a frame (prompts, getstr echo, messages) go straight to
+  the window; their lines are marked unknown so the next frame rewrites
+  them. forget() does the same for anything drawn by other means
+  (textpad boxes); pads shown with overlay() are handled by the frame.
+- read_key() folds a burst of the same repeatable key (a held arrow)
+  into one (key, count), so the burst costs one frame instead of one
+  per press.
+- Each frame's duration is kept in last_frame_ms and recorded as a
+  metrics timer under the frame's name.
+
+The colour pairs of all screens live here too (init_colors, color).
+"""
+import curses
+import time
+from contextlib import contextmanager
+
+from . import metrics
+
+PALETTE = {  # name -> (pair number, foreground); all on black
+    "title": (1, curses.COLOR_MAGENTA),
+    "info": (2, curses.COLOR_CYAN),
+    "highlight": (3, curses.COLOR_BLUE),
+    "success": (4, curses.COLOR_GREEN),
+    "error": (5, curses.COLOR_RED),
+    "prompt": (6, curses.COLOR_YELLOW),
+    "text": (7, curses.COLOR_WHITE),
+}
+REPEATABLE_KEYS = (curses.KEY_UP, curses.KEY_DOWN, curses.KEY_PPAGE, curses.KEY_NPAGE)
+UNKNOWN = None  # Shadow of a line whose terminal content is not known
+
+_colors_ready = False
+_screens = {}
+
+
+def init_colors():
+    """Set up the colour pairs once, for all screens"""
+    global _colors_ready
+    if _colors_ready:
+        return
+    curses.start_color()
+    for number, foreground in PALETTE.values():
+        curses.init_pair(number, foreground, curses.COLOR_BLACK)
+    _colors_ready = True
+
+
+def color(name):
+    return curses.color_pair(PALETTE[name][0])
+
+
+def screen_for(stdscr):
+    """The Screen shared by every UI drawing on `stdscr`"""
+    screen = _screens.get(stdscr)
+    if screen is None:
+        screen = _screens[stdscr] = Screen(stdscr)
+    return screen
+
+
+class Screen:
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.height, self.width = stdscr.getmaxyx()
+        self.shown = {}  # y -> [(x, text, attr)] the terminal shows; missing lines are blank
+        self.lines = None  # y -> [(x, text, attr)] of the frame being drawn
+        self.overlays = []  # (pad, noutrefresh arguments) of the frame being drawn
+        self.frames = 0
+        self.lines_written = 0
+        self.last_frame_ms = 0.0
+        init_colors()
+
+    def clip(self, y, x, text):
+        """`text` cut to fit at (y, x); None if it starts off screen"""
+        if y < 0 or x < 0 or y >= self.height or x >= self.width:
+            return None
+        return text[:self.width - x - 1]
+
+    def put(self, y, x, text, attr=curses.A_NORMAL):
+        """Draw `text` at (y, x), clipped to the screen"""
+        text = self.clip(y, x, text)
+        if text is None:
+            return
+        if self.lines is not None:
+            self.lines.setdefault(y, []).append((x, text, attr))
+            return
+        try:
+            self.stdscr.addstr(y, x, text, attr)
+        except curses.error:
+            pass
+        self.shown[y] = UNKNOWN
+
+    def set_line(self, y, text, attr=curses.A_NORMAL):
+        """Replace one whole line"""
+        if self.lines is not None:
+            self.lines.pop(y, None)
+            self.put(y, 0, text, attr)
+            return
+        if 0 <= y < self.height:
+            self.stdscr.move(y, 0)
+            self.stdscr.clrtoeol()
+            self.put(y, 0, text, attr)
+
+    def forget(self, lines):
+        """Lines drawn behind the Screen's back; the next frame rewrites them"""
+        for y in lines:
+            self.shown[y] = UNKNOWN
+
+    def invalidate(self):
+        self.forget(range(self.height))
+
+    def resize(self):
+        """After KEY_RESIZE: adopt the new size and repaint everything"""
+        self.height, self.width = self.stdscr.getmaxyx()
+        curses.resizeterm(self.height, self.width)
+        self.stdscr.clear()
+        self.shown = {}
+
+    def overlay(self, pad, pminrow, pmincol, sminrow, smincol, smaxrow, smaxcol):
+        """Show part of `pad` over screen lines sminrow..smaxrow when the frame ends"""
+        self.overlays.append((pad, (pminrow, pmincol, sminrow, smincol, smaxrow, smaxcol)))
+
+    @contextmanager
+    def frame(self, name="frame"):
+        """Draw one frame: put() and overlay() calls in the block, then a single doupdate"""
+        start = time.perf_counter_ns()
+        if self.stdscr.getmaxyx() != (self.height, self.width):
+            self.height, self.width = self.stdscr.getmaxyx()
+            self.invalidate()
+        self.lines = {}
+        self.overlays = []
+        try:
+            yield self
+            lines, overlays = self.lines, self.overlays
+        finally:
+            self.lines, self.overlays = None, []
+        written = 0
+        for y in sorted(set(lines) | set(self.shown)):
+            segments = lines.get(y, [])
+            if self.shown.get(y, []) == segments:
+                continue
+            try:
+                self.stdscr.move(y, 0)
+                self.stdscr.clrtoeol()
+                for x, text, attr in segments:
+                    self.stdscr.addstr(y, x, text, attr)
+            except curses.error:
+                pass
+            written += 1
+        self.shown = lines
+        self.stdscr.noutrefresh()
+        for pad, area in overlays:
+            pad.noutrefresh(*area)
+            self.forget(range(area[2], area[4] + 1))  # The window under the pad is stale there
+        curses.doupdate()
+        elapsed = time.perf_counter_ns() - start
+        self.frames += 1
+        self.lines_written += written
+        self.last_frame_ms = elapsed / 1e6
+        if metrics.ENABLED:
+            metrics.registry.record(name, elapsed)
+            metrics.count("frame_lines_written", written)
+
+    def read_key(self, timeout=-1):
+        """(key, count): a held repeatable key comes back once with how often it was pressed.
+
+        `timeout` is in milliseconds as for window.timeout(); key is -1 if
+        nothing was pressed in time.
+        """
+        self.stdscr.timeout(timeout)
+        try:
+            key = self.stdscr.getch()
+            count = 1
+            if key in REPEATABLE_KEYS:
+                self.stdscr.timeout(0)
+                while True:
+                    following = self.stdscr.getch()
+                    if following != key:
+                        break
+                    count += 1
+                if following != -1:
+                    curses.ungetch(following)
+        finally:
+            self.stdscr.timeout(-1)  # Prompts and messages wait for the user
+        if count > 1:
+            metrics.count("keys_coalesced", count - 1)
+        return key, count
@@ -0,0 +1,292 @@
+"""Zaman server: one process owns the engine, curses sessions connect to it.
+
+The protocol is JSON lines over a Unix or TCP socket. Each request is an
+object {"id": n, "op": name, ...arguments}. The reply echoes the id and
+carries either {"ok": true, "result": ...} or {"ok": false, "error": msg}.
+A connection logs in once and then acts as that user. Login replies
+carry a session token; a client that reconnects sends it with "resume"
+instead of the password.
+
+Requests from all connections go through one queue. A single worker
+thread takes whatever has queued up, up to BATCH_MAX requests, and runs
+them inside one task-log transaction. That costs one lock and one refresh
+per batch with JSON storage, and one COMMIT with SQLite. With SQLite each
+request runs in its own SAVEPOINT, so a request that fails halfway rolls
+back its own writes and the rest of the batch still commits. The event loop
+keeps accepting and reading connections meanwhile. Password KDF work for
+login/register runs on the KDF pool before a request is queued, so a
+burst of logins never stalls the batches.
+"""
+import asyncio
+import json
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from auth import register_user, session_tokens, verify_user_async
+from .client import DEFAULT_SOCKET, parse_address
+from .passwords import hash_password_async
+from .session_tokens import verify_token
+from .state import AppState
+from .storage import get_backend
+from .task_manager import TaskManager
+
+BATCH_MAX = 256  # Requests applied per storage transaction at most
+MAX_LINE = 1 << 20
+BACKLOG = 1024  # Pending connections; a burst of logins must not be refused
+TASK_QUERIES = (  # TaskManager methods clients may call through the "tasks" op
+    "open_task_count", "open_tasks_window", "open_task_position", "open_tasks_sorted",
+    "open_sorted_count", "open_sorted_position", "top_open_tasks", "search_open_tasks",
+    "sort_task_ids", "get_task", "poll_changes",
+)
+
+
+class RequestError(Exception):
+    """A request the server refuses; its message goes back to the client"""
+
+
+class Session:
+    """Per-connection login state"""
+
+    def __init__(self):
+        self.state = None
+        self.verified = None  # Username whose password the KDF pool just checked
+        self.password_hash = None  # Hash computed for a pending registration
+
+
+class ZamanServer:
+    def __init__(self, backend=None, batch_max=BATCH_MAX):
+        self.backend = backend or get_backend()
+        self.task_manager = TaskManager(self.backend)  # Shared by every session
+        self.batch_max = batch_max
+        self.executor = ThreadPoolExecutor(max_workers=1)  # Storage work stays serial
+        self.queue = None
+        self.server = None
+        self.sessions = 0
+        self.batches = 0
+        self.requests = 0
+
+    # Operations: op_<name>(session, **arguments) -> JSON-able result
+
+    def op_ping(self, session):
+        return "pong"
+
+    def op_stats(self, session):
+        return {"sessions": self.sessions, "batches": self.batches, "requests": self.requests}
+
+    def op_login(self, session, username, password):
+        verified, session.verified = session.verified, None
+        if verified != username:
+            raise RequestError("Invalid credentials!")
+        return self.start_session(session, username)
+
+    def op_register(self, session, username, password):
+        password_hash, session.password_hash = session.password_hash, None
+        if not register_user(None, username, password, password_hash, backend=self.backend):
+            raise RequestError("Username exists or registration failed!")
+        return self.start_session(session, username)
+
+    def op_resume(self, session, token):
+        username = verify_token(token, data_dir=self.backend.root)
+        if username is None:
+            raise RequestError("Session expired - log in again")
+        return {**self.start_session(session, username), "token": token}
+
+    def start_session(self, session, username):
+        session.state = AppState(username, self.backend, task_manager=self.task_manager)
+        return {**self.balances(session), "token": session_tokens.get(username)}
+
+    def op_logout(self, session):
+        session.state = None
+        return True
+
+    def op_balances(self, session):
+        self.user(session).load_stats()
+        return self.balances(session)
+
+    def op_buy_toki(self, session, amount):
+        success, message = self.user(session).buy_toki(amount)
+        return {"success": success, "message": message, "balances": self.balances(session)}
+
+    def op_cash_out(self, session, amount):
+        success, message = self.user(session).cash_out(amount)
+        return {"success": success, "message": message, "balances": self.balances(session)}
+
+    def op_create_task(self, session, description, eddie_cost):
+        success, message, task = self.user(session).create_task(description, eddie_cost)
+        return {"success": success, "message": message, "task": task, "balances": self.balances(session)}
+
+    def op_complete_task(self, session, task_id):
+        reward = self.user(session).complete_task(task_id)
+        return {"reward": reward, "balances": self.balances(session)}
+
+    def op_history(self, session, before=None, limit=10):
+        transactions, cursor = self.user(session).history_page(before, limit)
+        return {"transactions": transactions, "cursor": cursor}
+
+    def op_ledger(self, session, limit=10):
+        ledger = self.user(session).ledger
+        ledger.refresh()
+        return {"total_fees": ledger.total_fees, "count": ledger.count, "recent": ledger.recent(limit)}
+
+    def op_tasks(self, session, method, args=()):
+        self.user(session)
+        if method not in TASK_QUERIES:
+            raise RequestError(f"Unknown task query {method!r}")
+        return getattr(self.task_manager, method)(*args)
+
+    def user(self, session):
+        if session.state is None:
+            raise RequestError("Not logged in")
+        return session.state
+
+    def balances(self, session):
+        state = session.state
+        return {"username": state.username, "toki_balance": state.toki_balance,
+                "eddie_balance": state.eddie_balance, "tasks_completed": state.tasks_completed}
+
+    # Request processing
+
+    def execute(self, session, request):
+        try:
+            handler = getattr(self, f"op_{request.get('op')}", None)
+            if handler is None:
+                raise RequestError(f"Unknown op {request.get('op')!r}")
+            arguments = {k: v for k, v in request.items() if k not in ("id", "op")}
+            with self.task_manager.savepoint():  # A failing request takes only its own writes back
+                result = handler(session, **arguments)
+            return {"id": request.get("id"), "ok": True, "result": result}
+        except RequestError as e:
+            return {"id": request.get("id"), "ok": False, "error": str(e)}
+        except TypeError as e:
+            return {"id": request.get("id"), "ok": False, "error": f"Bad arguments: {e}"}
+        except Exception as e:
+            with open('error.log', 'a') as f:
+                import traceback
+                f.write(f"Server error: {str(e)}\n{traceback.format_exc()}\n")
+            if session.state is not None:
+                session.state.load_stats()  # Its balances may include rolled-back changes
+            return {"id": request.get("id"), "ok": False, "error": "System error - check error.log"}
+
+    def run_batch(self, batch):
+        """Apply queued requests in one storage transaction (worker thread).
+
+        Balance changes are made durable together when the batch ends,
+        before any response goes out.
+        """
+        with self.backend.group_commit(), self.task_manager.transaction():
+            responses = [self.execute(session, request) for session, request, _ in batch]
+            self.backend.settlements.flush()  # Rewards earned in this batch commit with it
+        self.batches += 1
+        self.requests += len(batch)
+        return responses
+
+    async def process_batches(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                return  # Queued by close(), behind every request still to answer
+            batch = [item]
+            while len(batch) < self.batch_max and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                responses = await loop.run_in_executor(self.executor, self.run_batch, batch)
+            except Exception as e:
+                responses = [{"id": request.get("id"), "ok": False, "error": f"Storage error: {e}"}
+                             for _, request, _ in batch]
+            for (_, _, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+
+    async def run_kdf(self, session, request):
+        """Password work for login/register, on the KDF pool instead of the batch worker"""
+        try:
+            if request.get("op") == "login":
+                ok = await asyncio.wrap_future(verify_user_async(request["username"], request["password"],
+                                                                  backend=self.backend))
+                session.verified = request["username"] if ok else None
+            elif request.get("op") == "register":
+                session.password_hash = await asyncio.wrap_future(hash_password_async(request["password"]))
+        except (KeyError, TypeError, AttributeError):
+            pass  # Malformed; the op itself reports it
+
+    async def handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        session = Session()
+        self.sessions += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be an object")
+                except ValueError as e:
+                    response = {"id": None, "ok": False, "error": f"Bad request: {e}"}
+                else:
+                    await self.run_kdf(session, request)
+                    future = loop.create_future()
+                    await self.queue.put((session, request, future))
+                    response = await future
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # ValueError: a line longer than MAX_LINE
+        except asyncio.CancelledError:
+            pass  # Server shutting down
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def start(self, address):
+        self.queue = asyncio.Queue()
+        kind, *where = parse_address(address)
+        if kind == "unix":
+            path = where[0]
+            if os.path.exists(path):
+                os.remove(path)  # Left behind by a server that did not shut down cleanly
+            self.server = await asyncio.start_unix_server(self.handle_client, path, limit=MAX_LINE,
+                                                          backlog=BACKLOG)
+        else:
+            host, port = where
+            self.server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE,
+                                                     backlog=BACKLOG)
+        self.worker = asyncio.create_task(self.process_batches())
+
+    async def serve(self, address):
+        """Serve until SIGINT/SIGTERM, then flush and clean up"""
+        await self.start(address)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        await self.close(address)
+
+    async def close(self, address=None):
+        self.server.close()
+        await self.server.wait_closed()
+        await self.queue.put(None)
+        await self.worker  # Answers the batch in flight and everything queued before close
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.task_manager.wait_for_compaction)
+        # Queued rewards (async commit mode) and written-behind stats, before the process exits
+        await loop.run_in_executor(self.executor, self.backend.flush)
+        self.executor.shutdown()
+        if address and parse_address(address)[0] == "unix":
+            try:
+                os.remove(parse_address(address)[1])
+            except FileNotFoundError:
+                pass
+
+
+def serve(address=DEFAULT_SOCKET, batch_max=BATCH_MAX):
+    asyncio.run(ZamanServer(batch_max=batch_max).serve(address))
@@ -0,0 +1,84 @@
+"""Signed, expiring local session tokens.
+
+A token is base64(payload).hex(HMAC-SHA256(key, payload)), where the
+payload is {"u": username, "exp": unix time, "pv": password verifier}.
+The key is random and never leaves <data dir>/session.key (mode 0600). The
+password verifier is a keyed HMAC of the password, so checking a retyped
+password against a token costs microseconds, not a KDF run. Without the
+key, it is no help for guessing the password.
+
+Presenting a token alone (resume) proves the holder logged in recently;
+that is what reconnecting clients use.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from pathlib import Path
+
+SESSION_TTL = 12 * 3600  # Seconds a token stays valid
+KEY_FILE_NAME = "session.key"
+
+_keys = {}
+
+
+def session_key(data_dir="data"):
+    """This installation's signing key, created on first use"""
+    path = Path(data_dir) / KEY_FILE_NAME
+    key = _keys.get(path)
+    if key is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(os.urandom(32))
+        except FileExistsError:
+            pass  # Another session created it first
+        with open(path, 'rb') as f:
+            key = f.read()
+        if len(key) != 32:
+            raise RuntimeError(f"{path} is damaged; delete it to sign out every session")
+        _keys[path] = key
+    return key
+
+
+def _password_verifier(key, username, password):
+    return hmac.new(key, f"pw:{username}:{password}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def _sign(key, payload):
+    return hmac.new(key, payload, hashlib.sha256).hexdigest()
+
+
+def issue_token(username, password, ttl=SESSION_TTL, data_dir="data"):
+    key = session_key(data_dir)
+    payload = json.dumps({"u": username, "exp": int(time.time() + ttl),
+                          "pv": _password_verifier(key, username, password)}).encode()
+    return base64.urlsafe_b64encode(payload).decode() + "." + _sign(key, payload)
+
+
+def verify_token(token, password=None, username=None, data_dir="data"):
+    """Username the token was issued to, or None if it is forged or expired.
+
+    With `password`/`username` the token must also have been issued for
+    exactly those credentials.
+    """
+    key = session_key(data_dir)
+    try:
+        encoded, signature = token.rsplit(".", 1)
+        payload = base64.urlsafe_b64decode(encoded.encode())
+        if not hmac.compare_digest(_sign(key, payload), signature):
+            return None
+        claims = json.loads(payload)
+    except (ValueError, AttributeError):
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    if username is not None and claims.get("u") != username:
+        return None
+    if password is not None and not hmac.compare_digest(
+            claims.get("pv", ""), _password_verifier(key, claims.get("u", ""), password)):
+        return None
+    return claims.get("u")
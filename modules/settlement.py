@@ -0,0 +1,131 @@
+"""Batched settlement of task rewards.
+
+Completing a task no longer credits the completer's stats on the spot.
+AppState.complete_task queues a settlement record (user, task id,
+reward) here and shows the new balance right away. The pipeline applies
+the queued records in batches:
+1. records are grouped per user;
+2. each user gets one "task_reward" ledger entry for the batch, listing
+   the task ids, with the summed eddie and tasks_completed deltas;
+3. all of it goes through backend.change_balances inside one
+   backend.group_commit(): one ledger write (and fsync) for the batch and
+   one stats write per user. A user whose change fails is retried with
+   the next batch; the others are settled.
+
+Unless ZAMAN_COMMIT_MODE=async, every record is settled before
+complete_task returns: the task log already says the task is completed,
+and nothing else on disk would say its reward is owed. Completions made
+at the same moment by other threads still share the batch, and the group
+committer gives them one ledger write and one fsync.
+
+In async mode, which accepts losing the last moments of activity, a
+batch is settled when SETTLE_BATCH records are queued, every
+SETTLE_INTERVAL seconds from a background thread, on backend.flush()
+(logout, the end of a server batch) and at exit. A crash can lose what
+was queued in the last interval; the reconcile audit then reports those
+completers as drift, because it credits rewards from the task records,
+not from these entries.
+"""
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from . import metrics
+from .group_commit import commit_mode
+
+SETTLE_BATCH = 1024  # Queued records that trigger a settlement right away
+SETTLE_INTERVAL = 0.05  # Seconds between background settlements
+
+
+class SettlementPipeline:
+    def __init__(self, backend, interval=SETTLE_INTERVAL, batch=SETTLE_BATCH):
+        self.backend = backend
+        self.interval = interval
+        self.batch = batch
+        self.immediate = commit_mode() != "async"
+        self.queue = []  # (username, task id, reward)
+        self.settling = []  # {username: [(task id, reward)]} of batches, until handed to change_balances
+        self.lock = threading.Lock()
+        self.settler = None
+        self.settled = 0
+        self.batches = 0
+
+    def submit(self, username, task_id, reward):
+        """Queue the reward for completing `task_id`; settled before returning unless in async mode"""
+        metrics.count("settlements")
+        with self.lock:
+            self.queue.append((username, task_id, reward))
+            full = len(self.queue) >= self.batch
+            if self.settler is None and not self.immediate:
+                self.settler = threading.Thread(target=self.run_settler, daemon=True)
+                self.settler.start()
+                atexit.register(self.flush)
+        if full or self.immediate:
+            self.flush()
+
+    def pending(self, username):
+        """(eddies, tasks completed) queued for `username` and not in the stored balances yet.
+
+        A user's records leave `settling` as soon as change_balances took
+        them, so they are not counted again on top of the group
+        committer's own view of the balance.
+        """
+        with self.lock:
+            rewards = [reward for name, _, reward in self.queue if name == username]
+            for batch in self.settling:
+                rewards.extend(reward for _, reward in batch.get(username, ()))
+        return sum(rewards), len(rewards)
+
+    @metrics.timed("settle_batch")
+    def flush(self):
+        """Settle everything queued so far"""
+        with self.lock:
+            records, self.queue = self.queue, []
+            if not records:
+                return
+            batch = {}  # username -> [(task id, reward)]
+            for username, task_id, reward in records:
+                batch.setdefault(username, []).append((task_id, reward))
+            self.settling.append(batch)
+        timestamp = datetime.now().isoformat()
+        error = None
+        try:
+            with self.backend.group_commit():
+                for username in sorted(batch):
+                    rewards = batch[username]
+                    eddies = sum(reward for _, reward in rewards)
+                    entry = {"username": username, "type": "task_reward", "amount": eddies, "fee": 0,
+                             "timestamp": timestamp, "tasks": [task_id for task_id, _ in rewards]}
+                    try:
+                        # With SQLite the group is one transaction: undo only this user's change
+                        with self.backend.savepoint():
+                            self.backend.change_balances(username, eddie=eddies, tasks_completed=len(rewards),
+                                                         ledger_entry=entry)
+                    except Exception as e:
+                        error = error or e
+                        continue  # The others still commit
+                    with self.lock:
+                        del batch[username]  # Part of the committer's view of the balance now
+            if error is not None:
+                raise error
+        except BaseException:
+            with self.lock:
+                # Try the users not handed over yet again with the next batch
+                self.queue[:0] = [(username, task_id, reward)
+                                  for username, rewards in batch.items() for task_id, reward in rewards]
+            raise
+        finally:
+            with self.lock:
+                self.settling.remove(batch)
+        self.settled += len(records)
+        self.batches += 1
+
+    def run_settler(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                with open('error.log', 'a') as f:
+                    f.write(f"Settlement failed, will retry: {e}\n")
@@ -1,78 +1,99 @@
-import json
-from pathlib import Path
 from datetime import datetime
 
-import json
-from pathlib import Path
-from datetime import datetime
-
-from .task_manager import TaskManager
-
-import json
-from pathlib import Path
-from datetime import datetime
-from .task_manager import TaskManager  # Fixed relative import
+from . import metrics
+from .task_manager import shared_task_manager
+from .storage import get_backend
 
 class AppState:
-    def __init__(self, username):
+    MENU_OPTIONS = [
+        "Cash Out Tokis",
+        "Buy Tokis",
+        "Create Task",
+        "Browse Tasks",
+        "Transaction History",
+        "Logout"
+    ]
+
+    def __init__(self, username, backend=None, task_manager=None):
         self.username = username
-        self.stats_file = Path("data") / "stats" / f"{username}.json"
-        self.ledger_file = Path("data") / "zaman_ledger.json"
-        self.task_manager = TaskManager()
+        self.backend = backend or get_backend()
+        self.ledger = self.backend.ledger
+        self._task_manager = task_manager  # Loaded on first use: buying tokis needs no task store
         
         # Initialize balances
         self.toki_balance = 0
         self.eddie_balance = 0
         self.tasks_completed = 0
-        self.transaction_history = []
+        self.stats_version = 0
         
         self.selected_option = 0
-        self.menu_options = [
-            "Cash Out Tokis",
-            "Buy Tokis",
-            "Create Task",
-            "Browse Tasks",
-            "Logout"
-        ]
+        self.menu_options = list(self.MENU_OPTIONS)
         
         self.load_stats()  # Load existing data
 
+    @property
+    def task_manager(self):
+        if self._task_manager is None:
+            self._task_manager = shared_task_manager(self.backend)
+        return self._task_manager
+
+    @metrics.timed("load_stats")
     def load_stats(self):
-        try:
-            with open(self.stats_file, 'r') as f:
-                stats = json.load(f)
-                self.toki_balance = stats.get("toki_balance", 10)  # Default 10 if not exists
-                self.eddie_balance = stats.get("eddie_balance", 500)  # Default 500
-                self.tasks_completed = stats.get("tasks_completed", 0)
-                self.transaction_history = stats.get("transaction_history", [])
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.save_stats()  # Create new file with defaults
+        stats = self.backend.load_stats(self.username)
+        if stats is None:
+            self.save_stats()  # Create new stats with defaults
+            return
+        self.apply_stats(stats)
 
+    def apply_stats(self, stats):
+        self.toki_balance = stats.get("toki_balance", 10)  # Default 10 if not exists
+        self.eddie_balance = stats.get("eddie_balance", 500)  # Default 500
+        self.tasks_completed = stats.get("tasks_completed", 0)
+        self.stats_version = stats.get("version", 0)
+        eddies, tasks = self.backend.settlements.pending(self.username)
+        self.eddie_balance += eddies  # Rewards earned but not settled yet
+        self.tasks_completed += tasks
+
+    @metrics.timed("save_stats")
     def save_stats(self):
-        stats = {
-            "toki_balance": self.toki_balance,
-            "eddie_balance": self.eddie_balance,
-            "tasks_completed": self.tasks_completed,
-            "transaction_history": self.transaction_history[-10:]
+        """Create (or repair) the stored stats with default balances"""
+        self.apply_stats(self.backend.create_stats(self.username))
+
+    @metrics.timed("change_balances")
+    def change_balances(self, toki=0, eddie=0, tasks_completed=0, ledger_entry=None):
+        """Apply deltas to the stored balances.
+
+        The update is made against storage, not this session's copy, so
+        concurrent sessions of the same user never overwrite each other.
+        `ledger_entry` is recorded together with the change. Returns False
+        (and reloads) if a balance would go negative.
+        """
+        if eddie < 0 and self.backend.settlements.pending(self.username)[1]:
+            self.backend.settlements.flush()  # The user may be spending a reward that is still queued
+        stats = self.backend.change_balances(self.username, toki, eddie, tasks_completed, ledger_entry)
+        if stats is None:
+            metrics.count("balance_changes_refused")
+            self.load_stats()
+            return False
+        self.apply_stats(stats)
+        return True
+
+    def logout(self):
+        """Make this session's balance changes (and queued rewards) durable before it ends"""
+        self.backend.flush()
+
+    def ledger_entry(self, transaction_type, amount, fee=0):
+        return {
+            "username": self.username,
+            "type": transaction_type,
+            "amount": amount,
+            "fee": fee,
+            "timestamp": datetime.now().isoformat()
         }
-        self.stats_file.parent.mkdir(exist_ok=True)
-        with open(self.stats_file, 'w') as f:
-            json.dump(stats, f)
-            
-    def record_transaction(self, transaction_type, amount, fee=0):
-        """Record transaction in Zaman's ledger"""
-        with open(self.ledger_file, 'r+') as f:
-            ledger = json.load(f)
-            ledger["total_fees"] += fee
-            ledger["transactions"].append({
-                "username": self.username,
-                "type": transaction_type,
-                "amount": amount,
-                "fee": fee,
-                "timestamp": datetime.now().isoformat()
-            })
-            f.seek(0)
-            json.dump(ledger, f)
+
+    def history_page(self, before=None, limit=10):
+        """(transactions newest first, cursor of the next older page or None)"""
+        return self.ledger.history(self.username, before, limit)
 
     def cash_out(self, amount):
         """Convert tokis to eddies with 15% fee"""
@@ -85,11 +106,9 @@ class AppState:
         fee = round(amount * 0.15, 2)
         eddies_earned = (amount - fee) * 190
         
-        self.toki_balance -= amount
-        self.eddie_balance += eddies_earned
-        
-        self.record_transaction("cash_out", amount, fee)
-        self.save_stats()
+        if not self.change_balances(toki=-amount, eddie=eddies_earned,
+                                    ledger_entry=self.ledger_entry("cash_out", amount, fee)):
+            return False, "Insufficient tokis"
         
         return True, (
             f"Converted {amount} toki → {eddies_earned} eddies\n"
@@ -108,11 +127,9 @@ class AppState:
         if self.eddie_balance < total_cost:
             return False, "Insufficient eddies"
         
-        self.eddie_balance -= total_cost
-        self.toki_balance += amount
-        
-        self.record_transaction("buy", amount, fee)
-        self.save_stats()
+        if not self.change_balances(toki=amount, eddie=-total_cost,
+                                    ledger_entry=self.ledger_entry("buy", amount, fee)):
+            return False, "Insufficient eddies"
         
         return True, (
             f"Bought {amount} toki for {base_cost} eddies\n"
@@ -128,24 +145,45 @@ class AppState:
     def nav_down(self):
         self.selected_option = min(len(self.menu_options) - 1, self.selected_option + 1)
         
-    def create_task(self, description):
-        """Create a new task"""
-        return self.task_manager.create_task(description, self.username)
+    def create_task(self, description, eddie_cost):
+        """Create a task paid for from this user's eddies.
+
+        Returns (success, message, task). The debit and the task are one
+        storage transaction (atomic with SQLite); if the task is rejected
+        the cost is refunded.
+        """
+        if not isinstance(eddie_cost, int) or eddie_cost <= 0:
+            return False, "Eddie cost must be a positive number", None
+        valid, message = self.validate_task_input(eddie_cost, self.eddie_balance)
+        if not valid:
+            return False, message, None
+
+        with self.task_manager.transaction():
+            if not self.change_balances(eddie=-eddie_cost):  # Another session spent them meanwhile
+                return False, f"Not enough eddies (Need {eddie_cost}, have {self.eddie_balance})", None
+
+            success, message, task = self.task_manager.create_task(
+                description=description,
+                creator=self.username,
+                eddie_cost=eddie_cost
+            )
+            if not success:
+                self.change_balances(eddie=eddie_cost)
+        return success, message, task
     
     def get_available_tasks(self):
         """Get list of available tasks"""
         return self.task_manager.get_all_tasks()
     
     def complete_task(self, task_id):
-        """Mark task as completed and return reward"""
-        task = next((t for t in self.task_manager.tasks 
-                if t['id'] == task_id and t['status'] == 'open'), None)
-        if task:
-            task['status'] = 'completed'
-            task['completed_by'] = self.username
-            self.task_manager.save_tasks()
-            return task['reward']
-        return None
+        """Mark task as completed and settle its reward (queued in async mode); None if someone else got it"""
+        reward = self.task_manager.complete_task(task_id, self.username)
+        if reward:
+            # Outside the task log's lock, so concurrent completions can share a settlement
+            self.backend.settlements.submit(self.username, task_id, reward)
+            self.eddie_balance += reward  # Already credited in storage, or queued for the next batch (async)
+            self.tasks_completed += 1
+        return reward
     
         # Add these methods to your AppState class
     def get_task_rewards_range(self):
@@ -154,8 +192,19 @@ class AppState:
             'max_eddies': 950   # 5 toki worth
         }
 
-    def validate_task_input(self, eddies):
+    @staticmethod
+    def validate_task_reward(eddies):
         """Validate only eddie amount"""
         if not 10 <= eddies <= 950:
             return False, "Eddies must be between 10-950"
+        return True, ""
+
+    @staticmethod
+    def validate_task_input(reward, balance):
+        """(ok, message) for a task paying `reward` eddies, created by someone holding `balance`"""
+        valid, message = AppState.validate_task_reward(reward)
+        if not valid:
+            return False, message
+        if balance < reward:
+            return False, f"Not enough eddies (Need {reward}, have {balance})"
         return True, ""
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""Write-behind cache of per-user stats (JSON storage).
+
+Committing a balance change used to rewrite the user's stats record on
+the spot. GroupCommitter now keeps each user's current stats here
+instead, marks them dirty, and they are written behind into the account
+table (see account_table):
+- every STATS_FLUSH_INTERVAL seconds from a background thread;
+- on backend.flush() (logout, the end of an import) and at exit.
+ZAMAN_STATS_FLUSH_INTERVAL=0 writes them with every commit, as before.
+
+A crash before the write loses nothing, because every change is on disk
+before its caller gets an answer:
+- changes with a ledger entry carry their deltas in the ledger, which is
+  replayed after the record's "ledger_seq" (as since group commit);
+- the others (task creation charges, refunds) are appended to
+  accounts/journal/<user>.journal, a small intent journal replayed after
+  the record's "journal_seq". It is removed once the record that
+  includes it has been synced to disk.
+
+Other sessions of the same user append to the same ledger and journal,
+always under the user's lock. A cache entry remembers the record's
+stamps and the identities of the journal and the user's ledger index
+from when it was last in sync. If any of them moved, the entry is
+rebuilt (record plus replay) before it is used or written, so a stale
+copy never overwrites a newer record.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+from . import metrics
+from .locking import fsync_dir
+
+STATS_FLUSH_INTERVAL = float(os.environ.get("ZAMAN_STATS_FLUSH_INTERVAL", 1.0))  # Seconds; 0 writes through
+BALANCE_FIELDS = ("toki_balance", "eddie_balance", "tasks_completed")
+
+
+def file_identity(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def read_journal(path):
+    """(records, bytes of complete lines) of an intent journal; a torn last line is ignored"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0
+    data = data[:data.rfind(b"\n") + 1]
+    records = []
+    for line in data.splitlines():
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return records, len(data)
+
+
+class CachedStats:
+    def __init__(self, stats, stamp, stored):
+        self.stats = stats
+        self.stamp = stamp  # (record stamps, journal, ledger index) when in sync with disk
+        self.stored = stored  # The table holds a record (or will once written)
+        self.dirty = False
+
+
+class StatsCache:
+    def __init__(self, table, default_stats, ledger, interval=None):
+        self.table = table  # AccountTable
+        self.default_stats = default_stats
+        self.ledger = ledger  # Callable returning the Ledger (it is created lazily)
+        self.interval = STATS_FLUSH_INTERVAL if interval is None else interval
+        self.entries = {}  # username -> CachedStats
+        self.lock = threading.Lock()
+        self.flusher = None
+        self.writes = 0
+        atexit.register(self.flush)  # Registered first, so it runs after the committer's and settlements' exit flushes
+
+    def journal_path(self, username):
+        return self.table.journal_path(username)
+
+    def stamp(self, username):
+        return (self.table.stamp(username), file_identity(self.journal_path(username)),
+                file_identity(self.ledger().index_path(username)))
+
+    # Reading
+
+    def get(self, username):
+        """Current stats of `username` (a copy), or None if there are none"""
+        with self.lock:
+            entry = self.entries.get(username)
+        if entry is not None and entry.stamp == self.stamp(username):
+            metrics.count("stats_cache_hits")
+            return dict(entry.stats) if entry.stored else None
+        with self.table.locked([username]):
+            entry = self.current(username)
+        return dict(entry.stats) if entry.stored else None
+
+    def current(self, username):
+        """The in-sync cache entry of `username`; the caller holds the user's lock"""
+        with self.lock:
+            entry = self.entries.get(username)
+        if entry is None or entry.stamp != self.stamp(username):
+            entry = self.rebuild(username)
+        return entry
+
+    def rebuild(self, username):
+        """Stored record plus everything the ledger and the journal hold beyond it"""
+        metrics.count("stats_cache_rebuilds")
+        stored = self.table.read(username)
+        stats = {**self.default_stats, **(stored or {})}
+        replayed = 0
+        for tx in self.ledger().entries_after(username, stats.get("ledger_seq", 0)):
+            deltas = tx.get("deltas")
+            if deltas:
+                self.apply(stats, (deltas.get("toki", 0), deltas.get("eddie", 0),
+                                   deltas.get("tasks_completed", 0)))
+                replayed += 1
+            stats["ledger_seq"] = tx["seq"]
+        journal = self.journal_path(username)
+        records, length = read_journal(journal)
+        identity = file_identity(journal)
+        if identity is not None and identity[2] > length:
+            os.truncate(journal, length)  # Torn line from a crashed session; our appends start clean
+        for record in records:
+            if record["seq"] > stats.get("journal_seq", 0):
+                self.apply(stats, record["deltas"])
+                stats["journal_seq"] = record["seq"]
+                replayed += 1
+        stats["version"] = stats.get("version", 0) + replayed  # One per change, in every session
+        entry = CachedStats(stats, self.stamp(username), stored is not None or replayed > 0)
+        entry.dirty = replayed > 0 or stats.get("ledger_seq", 0) != (stored or {}).get("ledger_seq", 0)
+        with self.lock:
+            self.entries[username] = entry
+        if entry.dirty:
+            self.start_flusher()
+        return entry
+
+    @staticmethod
+    def apply(stats, deltas):
+        for field, delta in zip(BALANCE_FIELDS, deltas):
+            stats[field] += delta
+
+    # Writing (the caller holds the user's lock)
+
+    def journal(self, username, stats, changes, sync):
+        """Record balance changes that have no ledger entry; `stats` gets the new journal_seq"""
+        seq = stats.get("journal_seq", 0)
+        lines = []
+        for deltas in changes:
+            seq += 1
+            lines.append(json.dumps({"seq": seq, "deltas": list(deltas)}) + "\n")
+        path = self.journal_path(username)
+        with open(path, 'a') as f:
+            created = f.tell() == 0
+            f.write("".join(lines))
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        if sync and created:
+            fsync_dir(path.parent)  # A new journal's directory entry must survive a crash too
+        stats["journal_seq"] = seq
+
+    def store(self, username, stats):
+        """Adopt `stats` after a commit; it is written behind"""
+        entry = CachedStats(stats, self.stamp(username), True)
+        entry.dirty = True
+        with self.lock:
+            self.entries[username] = entry
+        if self.interval <= 0:
+            self.write(username, entry)
+        else:
+            self.start_flusher()
+
+    def create(self, username, stats):
+        """Store `stats` for a user who has none and write them at once; the stored stats"""
+        with self.table.locked([username]):
+            entry = self.current(username)
+            if not entry.stored:
+                entry = CachedStats({**stats, "version": 1}, entry.stamp, True)
+                self.write(username, entry)
+                with self.lock:
+                    self.entries[username] = entry
+            return dict(entry.stats)
+
+    def write(self, username, entry):
+        if entry.stamp != self.stamp(username):
+            entry = self.rebuild(username)  # Another session wrote since; never overwrite it with our copy
+        self.table.write(username, entry.stats)
+        if entry.stamp[1] is not None:
+            self.table.sync(username)  # On disk before the journal it replaces goes
+            os.remove(self.journal_path(username))  # All of it is in the record now
+        entry.stamp = self.stamp(username)
+        entry.stored = True
+        entry.dirty = False
+        self.writes += 1
+
+    # Flushing
+
+    def dirty(self):
+        with self.lock:
+            return sorted(username for username, entry in self.entries.items() if entry.dirty)
+
+    def flush(self):
+        """Write every dirty user's record"""
+        dirty = self.dirty()
+        if dirty:
+            self.write_dirty(dirty)
+
+    @metrics.timed("stats_flush")
+    def write_dirty(self, usernames):
+        for username in usernames:
+            with self.table.locked([username]):
+                with self.lock:
+                    entry = self.entries.get(username)
+                if entry is not None and entry.dirty:
+                    self.write(username, entry)
+
+    def start_flusher(self):
+        with self.lock:
+            if self.flusher is not None or self.interval <= 0:
+                return
+            self.flusher = threading.Thread(target=self.run_flusher, daemon=True)
+            self.flusher.start()
+
+    def run_flusher(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                with open('error.log', 'a') as f:
+                    f.write(f"Stats write-behind failed, will retry: {e}\n")
@@ -0,0 +1,72 @@
+"""Pluggable persistence for Zaman.
+
+Pick a backend with the ZAMAN_STORAGE environment variable ("json", the
+default, or "sqlite"). Everything that reads or writes data/ goes through
+get_backend().
+"""
+import os
+from pathlib import Path
+
+from .base import StorageBackend, DEFAULT_STATS
+from .json_backend import JSONBackend, JSONTaskLog
+from .sqlite_backend import SQLiteBackend
+
+DATA_DIR = Path("data")
+DB_FILE_NAME = "zaman.db"
+BACKENDS = ("json", "sqlite")
+
+_backends = {}
+
+
+def get_backend(kind=None, data_dir=DATA_DIR):
+    """Shared, initialized backend for this process and data directory"""
+    kind = kind or os.environ.get("ZAMAN_STORAGE", "json")
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {kind!r} (expected one of {', '.join(BACKENDS)})")
+
+    # Keyed by pid too: a forked child must not reuse its parent's SQLite connection
+    key = (kind, Path(data_dir).resolve(), os.getpid())
+    backend = _backends.get(key)
+    if backend is None:
+        if kind == "sqlite":
+            backend = SQLiteBackend(Path(data_dir) / DB_FILE_NAME)
+        else:
+            backend = JSONBackend(data_dir)
+        backend.initialize()
+        _backends[key] = backend
+    return backend
+
+
+def migrate_json_to_sqlite(data_dir=DATA_DIR, db_file=None):
+    """Copy users, stats, the ledger and tasks from the JSON layout into SQLite.
+
+    Returns a dict of row counts. Refuses to run against a database that
+    already holds data, so it is safe to re-run by accident.
+    """
+    source = JSONBackend(data_dir)
+    target = SQLiteBackend(db_file or Path(data_dir) / DB_FILE_NAME)
+    target.initialize()
+    try:
+        if target.conn.execute("SELECT count(*) FROM users").fetchone()[0] or \
+                target.conn.execute("SELECT count(*) FROM tasks").fetchone()[0]:
+            raise RuntimeError(f"{target.db_file} already contains data")
+
+        tasks = source.task_log()
+        tasks.initialize()
+        users = list(source.iter_users())
+        stats = list(source.iter_stats())
+        target.bulk_load(
+            users=users,
+            stats=stats,
+            transactions=source.ledger.iter_transactions(),
+            tasks=tasks.store
+        )
+        target.ledger.refresh()
+        return {
+            "users": len(users),
+            "stats": len(stats),
+            "transactions": target.ledger.count,
+            "tasks": len(tasks.store)
+        }
+    finally:
+        target.close()
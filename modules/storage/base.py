@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+
+from ..settlement import SettlementPipeline
+
+DEFAULT_STATS = {
+    "toki_balance": 10,
+    "eddie_balance": 500,
+    "tasks_completed": 0
+}
+
+
+class StorageBackend:
+    """Everything Zaman persists: accounts, per-user stats, the ledger and tasks.
+
+    Backends are obtained through modules.storage.get_backend() and are
+    shared by every AppState/TaskManager of a process.
+    """
+
+    name = None
+    root = None  # Data directory; also holds files kept outside the store, like session.key
+    _settlements = None
+
+    def initialize(self):
+        """Create whatever files/tables are missing"""
+        raise NotImplementedError
+
+    # Accounts
+    def get_password_hash(self, username):
+        """Stored password hash, or None for an unknown user"""
+        raise NotImplementedError
+
+    def add_user(self, username, password_hash, stats):
+        """Create an account with its initial stats; False if it exists"""
+        raise NotImplementedError
+
+    def iter_users(self):
+        """Yield (username, password_hash) pairs"""
+        raise NotImplementedError
+
+    # Stats
+    def load_stats(self, username):
+        """Stats dict (with a "version" stamp), or None if there is none"""
+        raise NotImplementedError
+
+    def create_stats(self, username):
+        """Fill in default stats for `username` and return them"""
+        raise NotImplementedError
+
+    def change_balances(self, username, toki=0, eddie=0, tasks_completed=0, ledger_entry=None):
+        """Apply balance deltas, plus an optional ledger entry, as one change.
+
+        Returns the new stats, or None (and changes nothing) if a balance
+        would go negative.
+        """
+        raise NotImplementedError
+
+    def iter_stats(self):
+        """Yield (username, stats) pairs"""
+        raise NotImplementedError
+
+    @contextmanager
+    def savepoint(self):
+        """Block inside a transaction whose writes alone are undone if it raises.
+
+        Only backends with real transactions can undo anything; elsewhere
+        this is a plain block.
+        """
+        yield
+
+    @contextmanager
+    def group_commit(self):
+        """Block whose balance changes may be made durable together at its end"""
+        yield
+
+    def flush(self):
+        """Make every balance change accepted so far durable"""
+        self.settlements.flush()
+
+    @property
+    def settlements(self):
+        """Task rewards waiting to be credited (see SettlementPipeline)"""
+        if self._settlements is None:
+            self._settlements = SettlementPipeline(self)
+        return self._settlements
+
+    # Ledger and tasks
+    @property
+    def ledger(self):
+        """Object with append/refresh/recent/history/iter_transactions, total_fees and count"""
+        raise NotImplementedError
+
+    def task_log(self):
+        """A new task log (see JSONTaskLog) holding its own TaskStore"""
+        raise NotImplementedError
+
+    def task_archive(self):
+        """The cold tier of completed tasks (see TaskArchive)"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
@@ -0,0 +1,316 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from .. import metrics
+from ..account_table import AccountTable
+from ..group_commit import GroupCommitter
+from ..ledger import Ledger
+from ..locking import FileLock, file_lock, atomic_write_json
+from ..task_archive import TaskArchive
+from ..task_store import TaskStore
+from ..user_directory import UserDirectory
+from .base import StorageBackend, DEFAULT_STATS
+
+COMPACT_MIN_BYTES = 256 * 1024  # Never compact a task log smaller than this
+COMPACT_RATIO = 0.5  # ...or smaller than half of the snapshot
+
+
+class JSONBackend(StorageBackend):
+    """The data/ file layout: users/ shards, the accounts/ table, ledger/ and tasks.json.
+
+    Accounts from the original users.json are imported into users/ on the
+    first start, and balances from the stats/<user>.json files into
+    accounts/; both are left in place but no longer written.
+    """
+
+    name = "json"
+
+    def __init__(self, data_dir):
+        self.data_dir = self.root = Path(data_dir)
+        self.users_file = self.data_dir / "users.json"  # Legacy, imported once
+        self.users = UserDirectory(self.data_dir / "users", self.users_file)
+        self.accounts = AccountTable(self.data_dir / "accounts", self.data_dir / "stats")  # stats/: legacy
+        self._ledger = None
+        self.committer = GroupCommitter(self.accounts, DEFAULT_STATS, lambda: self.ledger)
+
+    def initialize(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.users.initialize()
+        self.accounts.initialize()
+
+    def get_password_hash(self, username):
+        return self.users.get(username)
+
+    def add_user(self, username, password_hash, stats):
+        if not self.users.add(username, password_hash):
+            return False
+
+        self.committer.cache.create(username, stats)
+        return True
+
+    def iter_users(self):
+        yield from self.users
+
+    def load_stats(self, username):
+        return self.committer.load(username)
+
+    def create_stats(self, username):
+        return self.committer.cache.create(username, DEFAULT_STATS)
+
+    def change_balances(self, username, toki=0, eddie=0, tasks_completed=0, ledger_entry=None):
+        return self.committer.submit(username, toki, eddie, tasks_completed, ledger_entry)
+
+    def group_commit(self):
+        return self.committer.deferred_batch()
+
+    def flush(self):
+        self.settlements.flush()
+        self.committer.flush()
+        self.committer.cache.flush()  # Account records are written behind (see stats_cache)
+
+    def close(self):
+        self.flush()
+        self.accounts.close()
+
+    def iter_stats(self):
+        for username, _ in self.accounts:
+            stats = self.load_stats(username)  # With changes not written to the record yet
+            if stats is not None:
+                yield username, stats
+
+    @property
+    def ledger(self):
+        if self._ledger is None:
+            self._ledger = Ledger(self.data_dir / "ledger", self.data_dir / "zaman_ledger.json")
+        return self._ledger
+
+    def task_log(self):
+        return JSONTaskLog(self.data_dir)
+
+    def task_archive(self):
+        return TaskArchive(self.data_dir / "tasks_archive")
+
+
+class JSONTaskLog:
+    """Tasks persisted as a snapshot (tasks.json) plus a write-ahead log.
+
+    Every mutation is appended to tasks.wal as one JSON line. When the log
+    grows past COMPACT_RATIO of the snapshot it is rotated and a background
+    thread rewrites tasks.json, so the per-operation cost stays flat. Log
+    records are idempotent, so replaying one that is already in the
+    snapshot is harmless.
+
+    Several sessions may share data/: mutations hold tasks.wal's file lock
+    and first replay whatever other sessions appended, so ids stay unique
+    and a task can only be completed once. Only one session compacts at a
+    time (tasks.json's lock).
+    """
+
+    def __init__(self, data_dir, background_compaction=True):
+        self.tasks_file = Path(data_dir) / "tasks.json"
+        self.log_file = Path(data_dir) / "tasks.wal"
+        self.old_log_file = Path(data_dir) / "tasks.wal.old"  # Log being folded into the snapshot
+        self.background_compaction = background_compaction
+
+        self.store = TaskStore()
+        self.log_offset = 0  # Bytes of tasks.wal already applied to the store
+        self.log_inode = None
+        self.snapshot_stat = None  # Identity of the tasks.json we loaded
+        self.snapshot_bytes = 0
+        self._lock = threading.RLock()
+        self._log_file_lock = FileLock(self.log_file)
+        self._log_lock_depth = 0
+        self._compactor = None
+
+    @metrics.timed("load_tasks")
+    def initialize(self):
+        """Ensure the snapshot exists, then load it"""
+        self.tasks_file.parent.mkdir(parents=True, exist_ok=True)
+        if not self.tasks_file.exists():
+            with file_lock(self.tasks_file):
+                if not self.tasks_file.exists():
+                    atomic_write_json(self.tasks_file, [])
+        self.load()
+
+    @contextmanager
+    def log_lock(self):
+        """tasks.wal's file lock, re-entrant within this log"""
+        with self._lock:
+            if self._log_lock_depth == 0:
+                self._log_file_lock.acquire()
+            self._log_lock_depth += 1
+            try:
+                yield
+            finally:
+                self._log_lock_depth -= 1
+                if self._log_lock_depth == 0:
+                    self._log_file_lock.release()
+
+    def load(self):
+        """Load the snapshot, then replay the rotated and the live log"""
+        with self.log_lock():
+            try:
+                with open(self.tasks_file, 'r') as f:
+                    self.store = TaskStore(json.load(f))
+                stat = os.stat(self.tasks_file)
+                self.snapshot_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                self.snapshot_bytes = stat.st_size
+            except (json.JSONDecodeError, FileNotFoundError):
+                self.store = TaskStore()
+                self.snapshot_stat = None
+
+            self.replay(self.old_log_file)
+            self.log_file.touch()
+            self.log_inode = os.stat(self.log_file).st_ino
+            self.log_offset = self.replay(self.log_file)
+
+    def replay(self, path, offset=0):
+        """Apply complete records in `path` from `offset`, returns the new offset"""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return offset
+        data = data[:data.rfind(b"\n") + 1]  # Leave a torn or in-flight last line alone
+        for line in data.splitlines():
+            try:
+                self.store.apply(json.loads(line))
+            except (json.JSONDecodeError, KeyError):
+                continue
+        return offset + len(data)
+
+    @metrics.timed("refresh_tasks")
+    def refresh(self):
+        """Apply log records appended by other sessions since we last looked"""
+        with self.log_lock():
+            try:
+                stat = os.stat(self.tasks_file)
+                snapshot_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                snapshot_stat = None
+            if snapshot_stat != self.snapshot_stat:
+                # Another session finished a compaction; its snapshot has everything we missed
+                self.load()
+                return
+
+            try:
+                log_inode = os.stat(self.log_file).st_ino
+            except FileNotFoundError:
+                log_inode = None
+            if log_inode == self.log_inode:
+                self.log_offset = self.replay(self.log_file, self.log_offset)
+                return
+
+            # A compaction is in progress: finish our old log, then start on the new one
+            try:
+                old_inode = os.stat(self.old_log_file).st_ino
+            except FileNotFoundError:
+                old_inode = None
+            if old_inode != self.log_inode or log_inode is None:
+                self.load()
+                return
+            self.replay(self.old_log_file, self.log_offset)
+            self.log_inode = log_inode
+            self.log_offset = self.replay(self.log_file)
+
+    def poll(self):
+        """refresh(), but only take the lock when the files show a change"""
+        try:
+            stat = os.stat(self.tasks_file)
+            log_stat = os.stat(self.log_file)
+        except FileNotFoundError:
+            self.refresh()
+            return
+        if ((stat.st_ino, stat.st_mtime_ns, stat.st_size) != self.snapshot_stat
+                or log_stat.st_ino != self.log_inode or log_stat.st_size != self.log_offset):
+            self.refresh()
+
+    @contextmanager
+    def transaction(self):
+        """Hold the log lock with the store caught up to every session's writes"""
+        with self.log_lock():
+            self.refresh()
+            if os.stat(self.log_file).st_size > self.log_offset:
+                # Torn record from a crashed session; cut it so our line starts clean
+                os.truncate(self.log_file, self.log_offset)
+            yield
+        self.maybe_compact()
+
+    @contextmanager
+    def savepoint(self):
+        """Appended records cannot be taken back; a plain block"""
+        yield
+
+    @metrics.timed("save_tasks")
+    def append(self, *records):
+        """Append mutations to the write-ahead log (inside transaction())"""
+        data = "".join(json.dumps(record) + "\n" for record in records).encode()
+        with open(self.log_file, 'ab') as f:
+            f.write(data)
+        self.log_offset += len(data)
+
+    def maybe_compact(self):
+        if self._log_lock_depth:
+            return  # Still inside an outer transaction
+        if self.log_offset > max(COMPACT_MIN_BYTES, self.snapshot_bytes * COMPACT_RATIO):
+            self.compact()
+
+    def compact(self, wait=False):
+        """Fold the log into a fresh tasks.json snapshot"""
+        compaction_lock = FileLock(self.tasks_file)
+        if not compaction_lock.acquire(blocking=wait):
+            return  # Another thread or session is already compacting
+        try:
+            with self.log_lock():
+                self.refresh()
+                if self.old_log_file.exists():
+                    # A previous compaction never finished; keep both logs' records
+                    with open(self.old_log_file, 'ab') as old, open(self.log_file, 'rb') as new:
+                        old.write(new.read())
+                    os.remove(self.log_file)
+                else:
+                    os.replace(self.log_file, self.old_log_file)
+                self.log_file.touch()
+                self.log_inode = os.stat(self.log_file).st_ino
+                self.log_offset = 0
+                snapshot = [dict(task) for task in self.store]
+        except BaseException:
+            compaction_lock.release()
+            raise
+
+        if self.background_compaction and not wait:
+            self._compactor = threading.Thread(
+                target=self.write_snapshot, args=(snapshot, compaction_lock), daemon=True)
+            self._compactor.start()
+        else:
+            self.write_snapshot(snapshot, compaction_lock)
+
+    @metrics.timed("compact_tasks")
+    def write_snapshot(self, snapshot, compaction_lock):
+        """Atomically replace tasks.json, then drop the log it absorbed"""
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.tasks_file.parent, prefix=".tasks.json.", suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f)
+            with self._lock:
+                # Swap the file and remember its identity together, so our own
+                # refresh() does not mistake this snapshot for another session's
+                os.replace(tmp_path, self.tasks_file)
+                stat = os.stat(self.tasks_file)
+                self.snapshot_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                self.snapshot_bytes = stat.st_size
+            try:
+                os.remove(self.old_log_file)
+            except FileNotFoundError:
+                pass
+        finally:
+            compaction_lock.release()
+
+    def wait_for_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
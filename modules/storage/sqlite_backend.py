@@ -0,0 +1,375 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from .. import metrics
+from ..group_commit import commit_mode
+from ..task_archive import TaskArchive
+from ..task_store import TaskStore
+from .base import StorageBackend, DEFAULT_STATS
+
+TASK_LOG_KEEP = 10000  # task_log rows kept for sessions catching up; older ones are trimmed
+TASK_COLUMNS = ("id", "description", "creator", "reward", "status", "created_at", "completed_by", "time_era")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    username TEXT PRIMARY KEY,
+    toki_balance NUMERIC NOT NULL,
+    eddie_balance NUMERIC NOT NULL,
+    tasks_completed INTEGER NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ledger (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    type TEXT NOT NULL,
+    amount NUMERIC NOT NULL,
+    fee NUMERIC NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ledger_by_user ON ledger (username, id);
+CREATE TABLE IF NOT EXISTS ledger_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_fees NUMERIC NOT NULL,
+    count INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO ledger_totals (id, total_fees, count) VALUES (1, 0, 0);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    creator TEXT NOT NULL,
+    reward INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    completed_by TEXT,
+    time_era TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status, id);
+CREATE INDEX IF NOT EXISTS tasks_by_creator ON tasks (creator, id);
+CREATE INDEX IF NOT EXISTS tasks_by_completer ON tasks (completed_by);
+CREATE TABLE IF NOT EXISTS task_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    record TEXT NOT NULL
+);
+"""
+
+
+class SQLiteBackend(StorageBackend):
+    """Single-file SQLite database (data/zaman.db) in WAL mode.
+
+    Writes go through transaction(), which nests: balance changes, ledger
+    entries and task mutations made inside one outer transaction commit
+    or roll back together.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_file):
+        self.db_file = Path(db_file)
+        self.root = self.db_file.parent
+        self.conn = None
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._ledger = SQLiteLedger(self)
+
+    def initialize(self):
+        if self.conn is not None:
+            return
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL may lose the last commits on power loss, never consistency
+        self.conn.execute("PRAGMA synchronous=NORMAL" if commit_mode() == "async" else "PRAGMA synchronous=FULL")
+        self.conn.executescript(SCHEMA)
+        self._ledger.refresh()
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, re-entrant within this process"""
+        with self._lock:
+            if self._depth == 0:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self.conn
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.conn.execute("COMMIT")
+
+    @contextmanager
+    def savepoint(self):
+        """SAVEPOINT ... RELEASE; on an error only this block's writes roll back"""
+        with self.transaction() as conn:
+            conn.execute("SAVEPOINT block")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK TO block")
+                conn.execute("RELEASE block")
+                self._ledger.refresh()  # Totals may include rolled-back entries
+                raise
+            conn.execute("RELEASE block")
+
+    @contextmanager
+    def snapshot(self):
+        """Consistent read-only view across several queries"""
+        with self._lock:
+            if self._depth:
+                yield self.conn
+                return
+            self.conn.execute("BEGIN")
+            try:
+                yield self.conn
+            finally:
+                self.conn.execute("COMMIT")
+
+    def get_password_hash(self, username):
+        row = self.conn.execute("SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, username, password_hash, stats):
+        with self.transaction() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO users (username, password_hash) VALUES (?, ?)",
+                                  (username, password_hash))
+            if cursor.rowcount == 0:
+                return False
+            self._write_stats(conn, username, {**DEFAULT_STATS, **stats}, version=1)
+        return True
+
+    def iter_users(self):
+        for row in self.conn.execute("SELECT username, password_hash FROM users ORDER BY username"):
+            yield row[0], row[1]
+
+    def _write_stats(self, conn, username, stats, version):
+        conn.execute(
+            "INSERT OR REPLACE INTO stats (username, toki_balance, eddie_balance, tasks_completed, version) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (username, stats["toki_balance"], stats["eddie_balance"], stats["tasks_completed"], version))
+
+    def load_stats(self, username):
+        row = self.conn.execute(
+            "SELECT toki_balance, eddie_balance, tasks_completed, version FROM stats WHERE username = ?",
+            (username,)).fetchone()
+        return dict(row) if row else None
+
+    def create_stats(self, username):
+        with self.transaction() as conn:
+            stats = self.load_stats(username)
+            if stats is None:
+                stats = {**DEFAULT_STATS, "version": 1}
+                self._write_stats(conn, username, stats, version=1)
+        return stats
+
+    def change_balances(self, username, toki=0, eddie=0, tasks_completed=0, ledger_entry=None):
+        with self.transaction() as conn:
+            stats = {**DEFAULT_STATS, **(self.load_stats(username) or {})}
+            if stats["toki_balance"] + toki < 0 or stats["eddie_balance"] + eddie < 0:
+                return None
+            stats["toki_balance"] += toki
+            stats["eddie_balance"] += eddie
+            stats["tasks_completed"] += tasks_completed
+            stats["version"] = stats.get("version", 0) + 1
+            self._write_stats(conn, username, stats, stats["version"])
+            if ledger_entry is not None:
+                self._ledger.append(ledger_entry)
+        return stats
+
+    def group_commit(self):
+        return self.transaction()
+
+    def iter_stats(self):
+        for row in self.conn.execute(
+                "SELECT username, toki_balance, eddie_balance, tasks_completed, version FROM stats "
+                "ORDER BY username"):
+            stats = dict(row)
+            yield stats.pop("username"), stats
+
+    @property
+    def ledger(self):
+        return self._ledger
+
+    def task_log(self):
+        return SQLiteTaskLog(self)
+
+    def task_archive(self):
+        return TaskArchive(self.db_file.parent / "tasks_archive")
+
+    def bulk_load(self, users=(), stats=(), transactions=(), tasks=()):
+        """Fill an empty database in one transaction (used by the migration)"""
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO users (username, password_hash) VALUES (?, ?)", users)
+            for username, user_stats in stats:
+                self._write_stats(conn, username, {**DEFAULT_STATS, **user_stats},
+                                  user_stats.get("version", 1))
+            for tx in transactions:
+                self._ledger.append(tx)
+            conn.executemany(
+                f"INSERT OR REPLACE INTO tasks ({', '.join(TASK_COLUMNS)}, extra) "
+                f"VALUES ({', '.join('?' * (len(TASK_COLUMNS) + 1))})",
+                (task_row(task) for task in tasks))
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def task_row(task):
+    extra = {k: v for k, v in task.items() if k not in TASK_COLUMNS}
+    return tuple(task.get(column) for column in TASK_COLUMNS) + (json.dumps(extra) if extra else None,)
+
+
+def row_task(row):
+    task = {column: row[column] for column in TASK_COLUMNS if column != "time_era"}
+    if row["time_era"] is not None:
+        task["time_era"] = row["time_era"]
+    if row["extra"]:
+        task.update(json.loads(row["extra"]))
+    return task
+
+
+class SQLiteLedger:
+    """Ledger table with a one-row running total, same interface as Ledger"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.total_fees = 0
+        self.count = 0
+
+    @metrics.timed("ledger_append")
+    def append(self, entry):
+        with self.backend.transaction() as conn:
+            conn.execute(
+                "INSERT INTO ledger (username, type, amount, fee, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (entry["username"], entry["type"], entry["amount"], entry.get("fee", 0), entry["timestamp"]))
+            conn.execute("UPDATE ledger_totals SET total_fees = round(total_fees + ?, 2), count = count + 1",
+                         (entry.get("fee", 0),))
+        self.refresh()
+
+    def refresh(self):
+        row = self.backend.conn.execute("SELECT total_fees, count FROM ledger_totals").fetchone()
+        self.total_fees, self.count = row[0], row[1]
+
+    def _rows(self, query, params=()):
+        return [{k: row[k] for k in ("username", "type", "amount", "fee", "timestamp")}
+                for row in self.backend.conn.execute(query, params)]
+
+    def recent(self, limit=10):
+        return self._rows("SELECT * FROM ledger ORDER BY id DESC LIMIT ?", (limit,))
+
+    def history(self, username, before=None, limit=10):
+        """One page of `username`'s transactions, newest first, plus the cursor for the next"""
+        rows = self.backend.conn.execute(
+            "SELECT * FROM ledger WHERE username = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (username, before if before is not None else 2**63 - 1, limit + 1)).fetchall()
+        page = rows[:limit]
+        transactions = [{k: row[k] for k in ("username", "type", "amount", "fee", "timestamp")}
+                        for row in page]
+        return transactions, (page[-1]["id"] if len(rows) > limit else None)
+
+    def iter_transactions(self):
+        last_id = 0
+        while True:
+            rows = self.backend.conn.execute(
+                "SELECT * FROM ledger WHERE id > ? ORDER BY id LIMIT 10000", (last_id,)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield {k: row[k] for k in ("username", "type", "amount", "fee", "timestamp")}
+            last_id = rows[-1]["id"]
+
+
+class SQLiteTaskLog:
+    """tasks table plus a task_log change table, same interface as JSONTaskLog"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.store = TaskStore()
+        self.last_seq = 0
+
+    @metrics.timed("load_tasks")
+    def initialize(self):
+        self.load()
+
+    def load(self):
+        with self.backend.snapshot() as conn:
+            self.store = TaskStore(row_task(row) for row in conn.execute("SELECT * FROM tasks ORDER BY id"))
+            self.last_seq = conn.execute("SELECT coalesce(max(seq), 0) FROM task_log").fetchone()[0]
+
+    @metrics.timed("refresh_tasks")
+    def refresh(self):
+        """Apply mutations committed by other sessions since we last looked"""
+        rows = self.backend.conn.execute(
+            "SELECT seq, record FROM task_log WHERE seq > ? ORDER BY seq", (self.last_seq,)).fetchall()
+        if rows and rows[0]["seq"] > self.last_seq + 1:
+            self.load()  # We fell behind the trimmed part of the log
+            return
+        for row in rows:
+            self.store.apply(json.loads(row["record"]))
+            self.last_seq = row["seq"]
+
+    def poll(self):
+        self.refresh()  # One indexed SELECT already
+
+    @contextmanager
+    def transaction(self):
+        try:
+            with self.backend.transaction():
+                self.refresh()
+                yield
+        except BaseException:
+            self.load()  # The store may hold changes that were rolled back
+            raise
+
+    @contextmanager
+    def savepoint(self):
+        try:
+            with self.backend.savepoint():
+                yield
+        except BaseException:
+            self.load()
+            raise
+
+    @metrics.timed("save_tasks")
+    def append(self, *records):
+        """Persist mutations (inside transaction())"""
+        conn = self.backend.conn
+        for record in records:
+            if record["op"] == "create":
+                conn.execute(
+                    f"INSERT OR REPLACE INTO tasks ({', '.join(TASK_COLUMNS)}, extra) "
+                    f"VALUES ({', '.join('?' * (len(TASK_COLUMNS) + 1))})",
+                    task_row(record["task"]))
+            elif record["op"] == "complete":
+                conn.execute("UPDATE tasks SET status = 'completed', completed_by = ?, "
+                             "extra = json_set(coalesce(extra, '{}'), '$.completed_at', ?) WHERE id = ?",
+                             (record["completed_by"], record.get("completed_at"), record["id"]))
+            elif record["op"] == "archive":
+                conn.executemany("DELETE FROM tasks WHERE id = ?", ((task_id,) for task_id in record["ids"]))
+            cursor = conn.execute("INSERT INTO task_log (record) VALUES (?)", (json.dumps(record),))
+            self.last_seq = cursor.lastrowid
+            if self.last_seq % TASK_LOG_KEEP == 0:
+                self.compact()
+
+    @metrics.timed("compact_tasks")
+    def compact(self, wait=False):
+        """Trim change records every session has had plenty of time to see"""
+        with self.backend.transaction() as conn:
+            conn.execute("DELETE FROM task_log WHERE seq <= ?", (self.last_seq - TASK_LOG_KEEP,))
+
+    def wait_for_compaction(self):
+        pass
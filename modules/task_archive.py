@@ -0,0 +1,169 @@
+"""Cold tier for completed tasks: compressed, append-only archive segments.
+
+Each archival run writes one new segment to data/tasks_archive/. A
+segment is never modified afterwards:
+
+    segment-NNNNNN.zz      zlib blocks of BLOCK_TASKS tasks each, as JSON lines, in id order
+    segment-NNNNNN.ids     sorted task ids (uint64), row n of the segment
+    segment-NNNNNN.blocks  byte offset of every block, plus the file size (uint64)
+    completed_by/<user>.idx  (segment, row) of every archived task the user completed
+
+manifest.json lists the segments with their id range and row count. It
+is written last, so a segment without a manifest entry is the remains of
+an interrupted run and is overwritten by the next one. Fetching one task
+reads its segment's id list (cached) and decompresses a single block.
+"""
+import json
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from urllib.parse import quote
+
+from .locking import file_lock, atomic_write_json, read_json
+
+BLOCK_TASKS = 256  # Tasks per compressed block; one lookup decompresses one block
+POINTER = struct.Struct("<II")  # (segment number, row) in a completer index
+
+
+class TaskArchive:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.manifest_file = self.directory / "manifest.json"
+        self.completers_dir = self.directory / "completed_by"
+        self.segments = []  # [{"number", "min_id", "max_id", "count"}], oldest first
+        self.ids = {}  # segment number -> array of ids, loaded on first lookup
+        self.blocks = {}  # segment number -> array of block offsets
+        self.manifest_stat = None
+        self.load()
+
+    def load(self):
+        """Re-read the manifest if another process has added a segment"""
+        try:
+            stat = os.stat(self.manifest_file)
+            manifest_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            manifest_stat = None
+        if manifest_stat != self.manifest_stat:
+            manifest = read_json(self.manifest_file) or {}
+            self.segments = manifest.get("segments", [])
+            self.manifest_stat = manifest_stat
+
+    def path(self, number, suffix):
+        return self.directory / f"segment-{number:06d}.{suffix}"
+
+    def completer_path(self, username):
+        return self.completers_dir / f"{quote(str(username), safe='')}.idx"
+
+    def __len__(self):
+        return sum(segment["count"] for segment in self.segments)
+
+    def add(self, tasks):
+        """Write `tasks` as a new segment; durable when this returns"""
+        tasks = sorted(tasks, key=lambda task: task["id"])
+        if not tasks:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.completers_dir.mkdir(exist_ok=True)
+        with file_lock(self.manifest_file):
+            self.load()
+            number = self.segments[-1]["number"] + 1 if self.segments else 1
+
+            data, offsets = bytearray(), array('Q')
+            for start in range(0, len(tasks), BLOCK_TASKS):
+                offsets.append(len(data))
+                block = "".join(json.dumps(task) + "\n" for task in tasks[start:start + BLOCK_TASKS])
+                data += zlib.compress(block.encode(), 6)
+            offsets.append(len(data))
+            ids = array('Q', (task["id"] for task in tasks))
+            for suffix, content in (("zz", data), ("ids", ids.tobytes()), ("blocks", offsets.tobytes())):
+                with open(self.path(number, suffix), 'wb') as f:
+                    f.write(content)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            pointers = {}
+            for row, task in enumerate(tasks):
+                if task.get("completed_by"):
+                    pointers.setdefault(task["completed_by"], bytearray()).extend(POINTER.pack(number, row))
+            for username, records in pointers.items():
+                with open(self.completer_path(username), 'ab') as f:
+                    f.write(records)
+
+            self.segments.append({"number": number, "min_id": ids[0], "max_id": ids[-1], "count": len(ids)})
+            atomic_write_json(self.manifest_file, {"segments": self.segments})
+
+    def segment_ids(self, number):
+        ids = self.ids.get(number)
+        if ids is None:
+            ids = self.ids[number] = array('Q')
+            with open(self.path(number, "ids"), 'rb') as f:
+                ids.frombytes(f.read())
+        return ids
+
+    def block_lines(self, number, block):
+        """The JSON lines of one block of a segment, undecoded"""
+        offsets = self.blocks.get(number)
+        if offsets is None:
+            offsets = self.blocks[number] = array('Q')
+            with open(self.path(number, "blocks"), 'rb') as f:
+                offsets.frombytes(f.read())
+        with open(self.path(number, "zz"), 'rb') as f:
+            f.seek(offsets[block])
+            data = f.read(offsets[block + 1] - offsets[block])
+        return zlib.decompress(data).splitlines()
+
+    def read_block(self, number, block):
+        """Tasks of one block of a segment"""
+        return [json.loads(line) for line in self.block_lines(number, block)]
+
+    def get(self, task_id):
+        """The archived task with `task_id`, or None"""
+        for segment in reversed(self.segments):
+            if not segment["min_id"] <= task_id <= segment["max_id"]:
+                continue
+            ids = self.segment_ids(segment["number"])
+            row = bisect_left(ids, task_id)
+            if row < len(ids) and ids[row] == task_id:
+                return json.loads(self.block_lines(segment["number"], row // BLOCK_TASKS)[row % BLOCK_TASKS])
+        return None
+
+    def __contains__(self, task_id):
+        for segment in self.segments:
+            if segment["min_id"] <= task_id <= segment["max_id"]:
+                ids = self.segment_ids(segment["number"])
+                row = bisect_left(ids, task_id)
+                if row < len(ids) and ids[row] == task_id:
+                    return True
+        return False
+
+    def completed_by(self, username):
+        """Archived tasks `username` completed, oldest archival first"""
+        try:
+            with open(self.completer_path(username), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        counts = {segment["number"]: segment["count"] for segment in self.segments}
+        tasks, blocks, seen = [], {}, set()
+        for number, row in POINTER.iter_unpack(data[:len(data) - len(data) % POINTER.size]):
+            if row >= counts.get(number, 0):
+                continue  # Left by an interrupted run
+            key = (number, row // BLOCK_TASKS)
+            if key not in blocks:
+                blocks[key] = self.block_lines(*key)
+            task = json.loads(blocks[key][row % BLOCK_TASKS])
+            # An interrupted run's segment number is reused, so its stale pointers may land elsewhere
+            if task.get("completed_by") == username and task["id"] not in seen:
+                seen.add(task["id"])
+                tasks.append(task)
+        return tasks
+
+    def __iter__(self):
+        """Every archived task, segment by segment"""
+        for segment in self.segments:
+            number = segment["number"]
+            for block in range((segment["count"] + BLOCK_TASKS - 1) // BLOCK_TASKS):
+                yield from self.read_block(number, block)
@@ -0,0 +1,205 @@
+"""Streaming bulk import and export of tasks (JSONL or CSV).
+
+Import reads the input one row at a time and works in batches of
+BATCH_ROWS, so memory does not grow with the size of the file. Each row
+needs a description, a creator and a reward. Rows go through the same
+reward rule as the Create Task screen (AppState.validate_task_reward). The
+creator must be a registered account with enough eddies, checked row by
+row with AppState.validate_task_input. For each batch:
+- every creator is debited once, for the sum of their accepted rows,
+  and those balance changes are made durable together (group_commit);
+- the batch's tasks are added with a single task log write.
+As with Create Task, the debit has no ledger entry: the task record is
+the audit trail (reconcile charges every task's reward to its creator).
+With JSON storage the change reaches the account through the intent
+journal, like any other change without a ledger entry.
+Rejected rows are counted by reason and the first MAX_ERRORS are kept
+with their line numbers.
+
+Export writes tasks one at a time in id order, optionally filtered by
+status, and with the archived ones (task_archive) first if asked.
+"""
+import csv
+import json
+import time
+
+from .state import AppState
+from .storage import get_backend
+from .task_manager import TaskManager
+
+BATCH_ROWS = 10000
+MAX_DESCRIPTION = 100  # As the Create Task prompt
+MAX_ERRORS = 100
+EXPORT_FIELDS = ("id", "description", "creator", "reward", "status", "created_at", "completed_by", "time_era")
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return "csv" if str(path).lower().endswith(".csv") else "jsonl"
+
+
+def read_rows(f, fmt):
+    """Yield (line number, row dict or None if unreadable) from an open text file"""
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            row = None
+        yield line_no, row if isinstance(row, dict) else None
+
+
+def parse_row(row):
+    """(task fields, None) for a valid row, else (None, reason)"""
+    if row is None:
+        return None, "unreadable row"
+    description = str(row.get("description") or "").strip()
+    creator = str(row.get("creator") or "").strip()
+    reward = row.get("reward")
+    if not description:
+        return None, "description is empty"
+    if len(description) > MAX_DESCRIPTION:
+        return None, f"description is over {MAX_DESCRIPTION} characters"
+    if not creator:
+        return None, "creator is empty"
+    if isinstance(reward, str):  # Every CSV value is a string
+        try:
+            reward = int(reward.strip())
+        except ValueError:
+            return None, "reward is not a whole number"
+    if not isinstance(reward, int) or isinstance(reward, bool):
+        return None, "reward is not a whole number"
+    valid, message = AppState.validate_task_reward(reward)
+    if not valid:
+        return None, message
+    task = {"description": description, "creator": creator, "reward": reward}
+    if row.get("time_era"):
+        task["time_era"] = str(row["time_era"])
+    return task, None
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.batches = 0
+        self.reasons = {}  # reason -> rows
+        self.errors = []  # First MAX_ERRORS (line, reason)
+        self.started = time.perf_counter()
+
+    def reject(self, line_no, reason):
+        self.rejected += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line_no, reason))
+
+    def as_dict(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "seconds": round(seconds, 3),
+            "tasks_per_second": round(self.imported / seconds) if seconds else 0,
+            "reasons": dict(sorted(self.reasons.items())),
+            "errors": [{"line": line_no, "reason": reason} for line_no, reason in sorted(self.errors)],
+        }
+
+
+def import_batch(backend, task_manager, batch, report):
+    """Debit the creators and add the tasks of one batch of (line number, task)"""
+    with backend.group_commit(), task_manager.transaction():
+        rows = {}  # creator -> [(line number, task)], in file order
+        for line_no, task in batch:
+            rows.setdefault(task["creator"], []).append((line_no, task))
+
+        accepted = []
+        for creator, creator_rows in rows.items():
+            if backend.get_password_hash(creator) is None:
+                for line_no, _ in creator_rows:
+                    report.reject(line_no, "creator is not registered")
+                continue
+            stats = backend.load_stats(creator)
+            if stats is None:
+                for line_no, _ in creator_rows:
+                    report.reject(line_no, "creator has no stats record")
+                continue
+            available = stats.get("eddie_balance", 0)
+            affordable, cost = [], 0
+            for line_no, task in creator_rows:
+                if AppState.validate_task_input(task["reward"], available - cost)[0]:
+                    cost += task["reward"]
+                    affordable.append((line_no, task))
+                else:
+                    report.reject(line_no, "creator has not enough eddies")
+            if not affordable:
+                continue
+            if backend.change_balances(creator, eddie=-cost) is None:
+                # Another session spent the eddies since load_stats
+                for line_no, _ in affordable:
+                    report.reject(line_no, "creator has not enough eddies")
+                continue
+            accepted.extend(affordable)
+
+        accepted.sort(key=lambda row: row[0])  # Ids follow the file order
+        task_manager.create_tasks([task for _, task in accepted])
+    report.imported += len(accepted)
+    report.batches += 1
+
+
+def import_tasks(f, fmt="jsonl", batch_rows=None, backend=None, task_manager=None, progress=None):
+    """Import every row of the open file `f`; returns the report as a dict"""
+    batch_rows = batch_rows or BATCH_ROWS
+    backend = backend or get_backend()
+    task_manager = task_manager or TaskManager(backend)
+    report = ImportReport()
+    batch = []
+    for line_no, row in read_rows(f, fmt):
+        task, reason = parse_row(row)
+        if task is None:
+            report.reject(line_no, reason)
+            continue
+        batch.append((line_no, task))
+        if len(batch) >= batch_rows:
+            import_batch(backend, task_manager, batch, report)
+            batch = []
+            if progress:
+                progress(report)
+    if batch:
+        import_batch(backend, task_manager, batch, report)
+    task_manager.wait_for_compaction()
+    return report.as_dict()
+
+
+def iter_export(task_manager, status=None, archived=False):
+    """Tasks to export, in id order within each tier"""
+    if archived:
+        for task in task_manager.archive:
+            if status is None or task.get("status") == status:
+                yield task
+    tasks = task_manager.store.with_status(status) if status else task_manager.store
+    yield from tasks
+
+
+def export_tasks(out, fmt="jsonl", status=None, archived=False, task_manager=None):
+    """Write tasks to the open text file `out`; returns how many"""
+    task_manager = task_manager or TaskManager()
+    written = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(out, EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for task in iter_export(task_manager, status, archived):
+            writer.writerow(task)
+            written += 1
+    else:
+        for task in iter_export(task_manager, status, archived):
+            out.write(json.dumps(task) + "\n")
+            written += 1
+    return written
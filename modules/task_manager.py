@@ -1,67 +1,215 @@
-import json
-from pathlib import Path
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
 
-TASKS_FILE = Path("data/tasks.json")
+from .storage import get_backend
+from .task_search import parse_query
+
+_shared = {}
+
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ZAMAN_ARCHIVE_AFTER_DAYS", 30))
+
+
+def shared_task_manager(backend=None):
+    """The process's TaskManager for `backend`, loaded on first use and kept across logins"""
+    backend = backend or get_backend()
+    task_manager = _shared.get(backend)
+    if task_manager is None:
+        task_manager = _shared[backend] = TaskManager(backend)
+    else:
+        task_manager.refresh()  # Catch up with other sessions since it was last used
+    return task_manager
 
 class TaskManager:
-    def __init__(self):
-        self.tasks = []
+    """Task marketplace logic on top of the storage backend's task log.
+
+    The log keeps an indexed in-memory TaskStore in sync with disk;
+    mutations run inside transaction() so they see every other session's
+    writes first.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self.log = self.backend.task_log()
+        self._archive = None
         self.initialize_data_dir()
 
+    @property
+    def store(self):
+        return self.log.store
+
+    @property
+    def archive(self):
+        """Cold tier of old completed tasks, opened on first use"""
+        if self._archive is None:
+            self._archive = self.backend.task_archive()
+        else:
+            self._archive.load()  # Pick up segments other processes added
+        return self._archive
+
+    @property
+    def tasks(self):
+        """All tasks in id order"""
+        return self.store.to_list()
+
     def initialize_data_dir(self):
-        """Ensure data directory exists"""
-        TASKS_FILE.parent.mkdir(parents=True, exist_ok=True)
-        if not TASKS_FILE.exists():
-            with open(TASKS_FILE, 'w') as f:
-                json.dump([], f)
-        self.load_tasks()
+        """Ensure task storage exists and load it"""
+        self.log.initialize()
 
     def load_tasks(self):
-        """Load tasks from file"""
-        try:
-            with open(TASKS_FILE, 'r') as f:
-                self.tasks = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            self.tasks = []
+        """Reload every task from storage"""
+        self.log.load()
+
+    def refresh(self):
+        """Pick up tasks created or completed by other sessions"""
+        self.log.refresh()
+
+    def poll_changes(self, cursor):
+        """Catch up with other sessions, then the open-task changes since `cursor` (see TaskStore)"""
+        self.log.poll()
+        return self.store.changes_since(cursor)
+
+    def transaction(self):
+        return self.log.transaction()
+
+    def savepoint(self):
+        """Nested block (inside transaction()) whose task and storage writes are undone if it raises"""
+        return self.log.savepoint()
 
     def save_tasks(self):
-        """Save tasks to file"""
-        with open(TASKS_FILE, 'w') as f:
-            json.dump(self.tasks, f, indent=2)
+        """Write a full snapshot now (JSON storage) and wait for it"""
+        self.log.wait_for_compaction()
+        self.log.compact(wait=True)
+
+    def wait_for_compaction(self):
+        self.log.wait_for_compaction()
 
-    def create_task(self, description, creator, eddie_cost, user_balance):
-        """Returns (success: bool, message: str, task: dict)"""
+    def create_task(self, description, creator, eddie_cost, user_balance=None):
+        """Returns (success: bool, message: str, task: dict).
+
+        `user_balance` is the creator's eddies, checked against the cost;
+        leave it out when the caller has already charged the creator.
+        """
         if not isinstance(eddie_cost, int) or eddie_cost <= 0:
             return False, "Eddie cost must be a positive number", None
-            
-        if user_balance < eddie_cost:
+
+        if user_balance is not None and user_balance < eddie_cost:
             return False, f"Not enough eddies (Need {eddie_cost}, have {user_balance})", None
-            
-        task = {
-            "id": len(self.tasks) + 1,
-            "description": description,
-            "creator": creator,
-            "reward": eddie_cost,  # Using reward instead of eddies_value
-            "status": "open",
-            "created_at": datetime.now().isoformat(),
-            "completed_by": None
-        }
-    
-        self.tasks.append(task)
-        self.save_tasks()
+
+        with self.transaction():
+            task = {
+                "id": self.store.allocate_id(),
+                "description": description,
+                "creator": creator,
+                "reward": eddie_cost,  # Using reward instead of eddies_value
+                "status": "open",
+                "created_at": datetime.now().isoformat(),
+                "completed_by": None
+            }
+            self.store.add(task)
+            self.log.append({"op": "create", "task": task})
         return True, f"Task created for {eddie_cost} eddies", task
 
+    def create_tasks(self, tasks):
+        """Add already validated and paid-for tasks with one log write (inside transaction()).
+
+        Each item holds description, creator, reward and optionally time_era.
+        """
+        created_at = datetime.now().isoformat()
+        records = []
+        for fields in tasks:
+            task = {"id": self.store.allocate_id(), **fields, "status": "open",
+                    "created_at": created_at, "completed_by": None}
+            self.store.add(task)
+            records.append({"op": "create", "task": task})
+        if records:
+            self.log.append(*records)
+        return records
+
     def get_all_tasks(self):
         """Get all open tasks"""
-        return [t for t in self.tasks if t['status'] == 'open']
+        return self.store.with_status('open')
+
+    def open_task_count(self):
+        return self.store.count_status('open')
+
+    def open_tasks_window(self, start, limit):
+        """Open tasks `start`..`start + limit` in id order, without copying the rest"""
+        return self.store.status_window('open', start, limit)
+
+    def open_task_position(self, task_id):
+        """Index of `task_id` (or the next open id after it) in the open-task list"""
+        return self.store.status_position('open', task_id)
+
+    def open_tasks_sorted(self, field, start, limit, descending=False, low=None, high=None):
+        """Open tasks ordered by `field` ("reward" or "created_at"), optionally within [low, high]"""
+        return self.store.ordered_window(field, start, limit, descending, low, high)
+
+    def top_open_tasks(self, field, k, low=None, high=None):
+        """The `k` open tasks with the highest `field`, e.g. best-paying or newest"""
+        return self.store.ordered_window(field, 0, k, True, low, high)
+
+    def open_sorted_count(self, field, low=None, high=None):
+        lo, hi = self.store.ordered_range(field, low, high)
+        return hi - lo
+
+    def open_sorted_position(self, field, task_id, descending=False, low=None, high=None):
+        return self.store.ordered_position(field, task_id, descending, low, high)
+
+    def sort_task_ids(self, task_ids, field, descending=False):
+        """Order a set of open task ids (e.g. search results) by `field`"""
+        return sorted(task_ids, key=lambda task_id: self.store.sort_key(self.store.get(task_id), field),
+                      reverse=descending)
+
+    def search_open_tasks(self, query):
+        """Ids of open tasks matching a search such as: hover era:future reward:100-500"""
+        text, filters = parse_query(query)
+        return self.store.search(text, **filters)
+
+    def get_task(self, task_id):
+        """Look up a task by id"""
+        return self.store.get(task_id)
+
+    def find_task(self, task_id):
+        """Look up a task by id in the hot store, then in the archive"""
+        task = self.store.get(task_id)
+        if task is None:
+            task = self.archive.get(task_id)
+        return task
+
+    def tasks_completed_by(self, username):
+        """Every task `username` completed, archived ones included, in id order"""
+        tasks = {task["id"]: task for task in self.archive.completed_by(username)}
+        for task in self.store.with_status('completed'):
+            if task.get("completed_by") == username:
+                tasks[task["id"]] = task
+        return [tasks[task_id] for task_id in sorted(tasks)]
+
+    def archive_completed(self, older_than_days=ARCHIVE_AFTER_DAYS):
+        """Move completed tasks older than `older_than_days` to the archive; returns how many"""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        with self.transaction():
+            newest = self.store.next_id - 1  # Kept hot so reloading never hands out its id again
+            tasks = [task for task in self.store.with_status('completed')
+                     if task["id"] != newest and (task.get("completed_at") or task.get("created_at") or "") < cutoff]
+            if not tasks:
+                return 0
+            archive = self.archive
+            # Tasks already archived by a run that died before logging its removal
+            archive.add([task for task in tasks if task["id"] not in archive])
+            ids = [task["id"] for task in tasks]
+            for task_id in ids:
+                self.store.remove(task_id)
+            self.log.append({"op": "archive", "ids": ids})
+        return len(ids)
 
     def complete_task(self, task_id, username):
-        """Mark task as completed"""
-        for task in self.tasks:
-            if task['id'] == task_id and task['status'] == 'open':
-                task['status'] = 'completed'
-                task['completed_by'] = username
-                self.save_tasks()
-                return task['reward']
-        return None
\ No newline at end of file
+        """Mark task as completed; None if it is unknown or already taken"""
+        with self.transaction():
+            task = self.store.get(task_id)
+            if task is None or task['status'] != 'open':
+                return None
+            completed_at = datetime.now().isoformat()
+            self.store.set_status(task_id, 'completed', completed_by=username, completed_at=completed_at)
+            self.log.append({"op": "complete", "id": task_id, "completed_by": username,
+                             "completed_at": completed_at})
+        return task['reward']
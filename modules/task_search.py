@@ -0,0 +1,142 @@
+import re
+from bisect import bisect_left, insort
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+REWARD_BUCKET = 100  # Eddies per reward facet bucket
+FACETS = ("creator", "era", "reward")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def parse_query(query):
+    """Split "hover creator:future_tech era:future reward:100-500" into keyword args"""
+    terms, filters = [], {}
+    for part in query.split():
+        name, sep, value = part.partition(":")
+        if sep and name.lower() in FACETS and value:
+            name = name.lower()
+            if name == "reward":
+                low, dash, high = value.partition("-")
+                try:
+                    filters["min_reward"] = int(low) if low else None
+                    filters["max_reward"] = int(high) if high else (None if dash else int(low))
+                except ValueError:
+                    continue
+            else:
+                filters[name] = value
+        else:
+            terms.append(part)
+    return " ".join(terms), filters
+
+
+class TaskIndex:
+    """Inverted index over open tasks' descriptions plus facet indexes.
+
+    Facets are creator, time_era and REWARD_BUCKET-wide reward ranges. The
+    index is maintained incrementally as tasks open and close, so it only
+    ever holds the open workload.
+    """
+
+    def __init__(self):
+        self.terms = {}    # token -> set of task ids
+        self.vocabulary = []  # Sorted tokens, for prefix matches
+        self.creators = {}  # creator -> set of task ids
+        self.eras = {}     # time_era -> set of task ids
+        self.rewards = {}  # reward // REWARD_BUCKET -> set of task ids
+        self.reward_of = {}  # task id -> reward, for exact range edges
+
+    def __len__(self):
+        return len(self.reward_of)
+
+    def add(self, task):
+        task_id = task["id"]
+        if task_id in self.reward_of:
+            self.remove(task)
+        for token in set(tokenize(task.get("description", ""))):
+            ids = self.terms.get(token)
+            if ids is None:
+                ids = self.terms[token] = set()
+                insort(self.vocabulary, token)
+            ids.add(task_id)
+        self.creators.setdefault(task.get("creator"), set()).add(task_id)
+        if task.get("time_era"):
+            self.eras.setdefault(task["time_era"], set()).add(task_id)
+        reward = task.get("reward", 0)
+        self.rewards.setdefault(reward // REWARD_BUCKET, set()).add(task_id)
+        self.reward_of[task_id] = reward
+
+    def _discard(self, index, key, task_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(task_id)
+            if not ids:
+                del index[key]
+                return True
+        return False
+
+    def remove(self, task):
+        task_id = task["id"]
+        reward = self.reward_of.pop(task_id, None)
+        if reward is None:
+            return
+        for token in set(tokenize(task.get("description", ""))):
+            if self._discard(self.terms, token, task_id):
+                pos = bisect_left(self.vocabulary, token)
+                if pos < len(self.vocabulary) and self.vocabulary[pos] == token:
+                    del self.vocabulary[pos]
+        self._discard(self.creators, task.get("creator"), task_id)
+        self._discard(self.eras, task.get("time_era"), task_id)
+        self._discard(self.rewards, reward // REWARD_BUCKET, task_id)
+
+    def prefix_ids(self, prefix):
+        """Ids of tasks with any token starting with `prefix`"""
+        ids = set()
+        pos = bisect_left(self.vocabulary, prefix)
+        while pos < len(self.vocabulary) and self.vocabulary[pos].startswith(prefix):
+            ids |= self.terms[self.vocabulary[pos]]
+            pos += 1
+        return ids
+
+    def reward_ids(self, min_reward, max_reward):
+        low = min_reward if min_reward is not None else 0
+        high = max_reward if max_reward is not None else max(self.reward_of.values(), default=0)
+        ids = set()
+        for bucket in range(low // REWARD_BUCKET, high // REWARD_BUCKET + 1):
+            bucket_ids = self.rewards.get(bucket, ())
+            if low <= bucket * REWARD_BUCKET and (bucket + 1) * REWARD_BUCKET - 1 <= high:
+                ids |= bucket_ids  # Bucket lies entirely inside the range
+            else:
+                ids.update(i for i in bucket_ids if low <= self.reward_of[i] <= high)
+        return ids
+
+    def search(self, text="", creator=None, era=None, min_reward=None, max_reward=None):
+        """Sorted ids of open tasks matching every given term and facet.
+
+        All words must match; the last one also matches as a prefix, so
+        results narrow while the user is still typing.
+        """
+        candidates = []
+        words = tokenize(text)
+        for n, word in enumerate(words):
+            if n == len(words) - 1:
+                candidates.append(self.prefix_ids(word))
+            else:
+                candidates.append(self.terms.get(word, set()))
+        if creator is not None:
+            candidates.append(self.creators.get(creator, set()))
+        if era is not None:
+            candidates.append(self.eras.get(era, set()))
+        if min_reward is not None or max_reward is not None:
+            candidates.append(self.reward_ids(min_reward, max_reward))
+
+        if not candidates:
+            return sorted(self.reward_of)
+        candidates.sort(key=len)  # Intersect starting from the smallest set
+        result = set(candidates[0])
+        for ids in candidates[1:]:
+            result &= ids
+            if not result:
+                break
+        return sorted(result)
@@ -0,0 +1,244 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from itertools import count
+
+from .task_search import TaskIndex
+
+ORDERED_FIELDS = {"reward": 0, "created_at": ""}  # Sortable open-task fields and their defaults
+FEED_SIZE = 4096  # Open-task changes kept for changes_since(); a reader further behind reloads
+_epochs = count(1)  # Tells the feeds of successive stores (e.g. after a reload) apart
+
+
+class TaskStore:
+    """In-memory task table indexed by id, status and creator.
+
+    Secondary indexes hold sorted id lists, so listing the open tasks or a
+    creator's tasks costs O(k) in the result size and keeps id order. The
+    full-text/facet index over open tasks is built on first search and then
+    kept up to date by add/remove/set_status, as are the ordered indexes on
+    ORDERED_FIELDS (sorted (value, id) lists over open tasks).
+
+    Every task that opens or stops being open after construction is also
+    recorded in a sequence-numbered feed, so a view can catch up with
+    changes_since() instead of re-reading the whole list.
+    """
+
+    def __init__(self, tasks=()):
+        self.by_id = {}
+        self.by_status = {}   # status -> sorted list of task ids
+        self.by_creator = {}  # creator -> sorted list of task ids
+        self.next_id = 1
+        self._search = None  # TaskIndex over open tasks, built on first use
+        self._ordered = {}  # field -> sorted list of (value, id) for open tasks, built on first use
+        self.epoch = next(_epochs)
+        self.seq = 0
+        self.feed = None  # Loading is not a change
+        for task in tasks:
+            self.add(task)
+        self.feed = deque(maxlen=FEED_SIZE)  # (seq, task id, now open)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, task_id):
+        return task_id in self.by_id
+
+    def __iter__(self):
+        """Tasks in id order"""
+        for task_id in sorted(self.by_id):
+            yield self.by_id[task_id]
+
+    def allocate_id(self):
+        """Hand out the next id; ids are never reused, even after removals"""
+        task_id = self.next_id
+        self.next_id += 1
+        return task_id
+
+    def _index(self, index, key, task_id):
+        ids = index.setdefault(key, [])
+        if not ids or ids[-1] < task_id:
+            ids.append(task_id)  # Common case: ids arrive in increasing order
+        else:
+            insort(ids, task_id)
+
+    def _unindex(self, index, key, task_id):
+        ids = index.get(key)
+        if not ids:
+            return
+        pos = bisect_left(ids, task_id)
+        if pos < len(ids) and ids[pos] == task_id:
+            del ids[pos]
+        if not ids:
+            del index[key]
+
+    def add(self, task):
+        """Insert a task that already carries an id"""
+        task_id = task["id"]
+        if task_id in self.by_id:
+            self.remove(task_id)
+        self.by_id[task_id] = task
+        self._index(self.by_status, task.get("status"), task_id)
+        self._index(self.by_creator, task.get("creator"), task_id)
+        self.next_id = max(self.next_id, task_id + 1)
+        if task.get("status") == "open":
+            self._open_added(task)
+        return task
+
+    def remove(self, task_id):
+        task = self.by_id.pop(task_id, None)
+        if task is not None:
+            self._unindex(self.by_status, task.get("status"), task_id)
+            self._unindex(self.by_creator, task.get("creator"), task_id)
+            if task.get("status") == "open":
+                self._open_removed(task)
+        return task
+
+    def get(self, task_id):
+        return self.by_id.get(task_id)
+
+    def set_status(self, task_id, status, **fields):
+        """Move a task to a new status, updating the status index in place"""
+        task = self.by_id.get(task_id)
+        if task is None:
+            return None
+        was_open = task.get("status") == "open"
+        if was_open:
+            self._open_removed(task)
+        self._unindex(self.by_status, task.get("status"), task_id)
+        task["status"] = status
+        task.update(fields)
+        self._index(self.by_status, status, task_id)
+        if status == "open":
+            self._open_added(task)
+        return task
+
+    def sort_key(self, task, field):
+        value = task.get(field)
+        return (ORDERED_FIELDS[field] if value is None else value, task["id"])
+
+    def _open_added(self, task):
+        """Keep the lazily built open-task indexes and the feed current"""
+        self._record(task["id"], True)
+        if self._search is not None:
+            self._search.add(task)
+        for field, keys in self._ordered.items():
+            insort(keys, self.sort_key(task, field))
+
+    def _open_removed(self, task):
+        self._record(task["id"], False)
+        if self._search is not None:
+            self._search.remove(task)
+        for field, keys in self._ordered.items():
+            key = self.sort_key(task, field)
+            pos = bisect_left(keys, key)
+            if pos < len(keys) and keys[pos] == key:
+                del keys[pos]
+
+    def _record(self, task_id, opened):
+        if self.feed is not None:
+            self.seq += 1
+            self.feed.append((self.seq, task_id, opened))
+
+    def changes_since(self, cursor):
+        """(new cursor, [[task id, now open], ...]) for open-task changes after `cursor`.
+
+        A cursor is [epoch, seq]; pass None to get the current one. The
+        changes are None when the feed no longer reaches back that far
+        (or the store was replaced), and the reader must start over.
+        """
+        now = [self.epoch, self.seq]
+        if cursor is None or cursor == now:
+            return now, []
+        epoch, seq = cursor
+        if epoch != self.epoch or seq > self.seq or (self.feed and self.feed[0][0] > seq + 1):
+            return now, None
+        latest = {}  # Only the last change per task matters
+        for change_seq, task_id, opened in reversed(self.feed):
+            if change_seq <= seq:
+                break
+            latest.setdefault(task_id, opened)
+        return now, [[task_id, opened] for task_id, opened in latest.items()]
+
+    def apply(self, record):
+        """Apply one task log record ({"op": "create"|"complete"|"archive", ...})"""
+        if record["op"] == "create":
+            self.add(record["task"])
+        elif record["op"] == "complete":
+            fields = {"completed_by": record["completed_by"]}
+            if "completed_at" in record:
+                fields["completed_at"] = record["completed_at"]
+            self.set_status(record["id"], "completed", **fields)
+        elif record["op"] == "archive":
+            for task_id in record["ids"]:  # Moved to the cold tier (see task_archive)
+                self.remove(task_id)
+
+    @property
+    def search_index(self):
+        if self._search is None:
+            self._search = TaskIndex()
+            for task_id in self.by_status.get("open", ()):
+                self._search.add(self.by_id[task_id])
+        return self._search
+
+    def search(self, text="", **filters):
+        """Ids of open tasks matching `text` and facet filters, in id order"""
+        return self.search_index.search(text, **filters)
+
+    def ordered_index(self, field):
+        keys = self._ordered.get(field)
+        if keys is None:
+            keys = self._ordered[field] = sorted(
+                self.sort_key(self.by_id[task_id], field) for task_id in self.by_status.get("open", ()))
+        return keys
+
+    def ordered_range(self, field, low=None, high=None):
+        """Positions [lo, hi) of open tasks with `low` <= field <= `high` in the field's index"""
+        keys = self.ordered_index(field)
+        lo = 0 if low is None else bisect_left(keys, (low,))
+        hi = len(keys) if high is None else bisect_right(keys, (high, float("inf")))
+        return lo, max(lo, hi)
+
+    def ordered_window(self, field, start, limit, descending=False, low=None, high=None):
+        """`limit` open tasks from position `start` when sorted by `field` (ties by id)"""
+        keys = self.ordered_index(field)
+        lo, hi = self.ordered_range(field, low, high)
+        if descending:
+            end = hi - start
+            selected = reversed(keys[max(lo, end - limit):max(lo, end)])
+        else:
+            selected = keys[lo + start:min(hi, lo + start + limit)]
+        return [self.by_id[task_id] for _, task_id in selected]
+
+    def ordered_position(self, field, task_id, descending=False, low=None, high=None):
+        """Position of open task `task_id` in the field's order, None if not in range"""
+        task = self.by_id.get(task_id)
+        if task is None or task.get("status") != "open":
+            return None
+        lo, hi = self.ordered_range(field, low, high)
+        pos = bisect_left(self.ordered_index(field), self.sort_key(task, field))
+        if not lo <= pos < hi:
+            return None
+        return hi - 1 - pos if descending else pos - lo
+
+    def with_status(self, status):
+        """Tasks with the given status in id order"""
+        return [self.by_id[task_id] for task_id in self.by_status.get(status, ())]
+
+    def status_window(self, status, start, limit):
+        """`limit` tasks with `status` starting at position `start`, in id order"""
+        ids = self.by_status.get(status, ())
+        return [self.by_id[task_id] for task_id in ids[start:start + limit]]
+
+    def status_position(self, status, task_id):
+        """Position of `task_id` (or of the next higher id) among tasks with `status`"""
+        return bisect_left(self.by_status.get(status, ()), task_id)
+
+    def created_by(self, creator):
+        """Tasks created by `creator` in id order"""
+        return [self.by_id[task_id] for task_id in self.by_creator.get(creator, ())]
+
+    def count_status(self, status):
+        return len(self.by_status.get(status, ()))
+
+    def to_list(self):
+        return list(self)
@@ -1,23 +1,26 @@
 import curses
 from curses import textpad
 
+from .screen import screen_for
+
 class TaskUI:
     def __init__(self, stdscr):
         self.stdscr = stdscr
-        self.height, self.width = stdscr.getmaxyx()
+        self.screen = screen_for(stdscr)
         
     def draw_input_box(self, y, prompt):
         """Draw labeled input box"""
-        self.stdscr.addstr(y, 0, prompt)
-        textpad.rectangle(self.stdscr, y+1, 0, y+3, self.width-2)
+        self.screen.put(y, 0, prompt)
+        textpad.rectangle(self.stdscr, y+1, 0, y+3, self.screen.width-2)
+        self.screen.forget(range(y+1, y+4))  # The box and the input echoed into it
         self.stdscr.refresh()
         return y+2  # Return input line position
 
     def get_task_input(self, state):
         """Get task details from user"""
         try:
-            self.stdscr.clear()
-            self.stdscr.addstr(0, 0, "CREATE NEW TASK", curses.A_BOLD)
+            with self.screen.frame("task_input_frame"):
+                self.screen.put(0, 0, "CREATE NEW TASK", curses.A_BOLD)
             
             # Description
             desc_y = self.draw_input_box(2, "Task Description:")
@@ -1,201 +1,248 @@
 import curses
-from curses import textpad
-import json
+
+from . import metrics
+from .screen import color, screen_for
 
 class ZamanUI:
     def __init__(self, stdscr):
         self.stdscr = stdscr
-        self.height, self.width = self.stdscr.getmaxyx()
+        self.screen = screen_for(stdscr)  # Shared with the login and marketplace screens
         curses.curs_set(0)  # Hide cursor
         curses.noecho()     # Don't echo key presses
         curses.cbreak()     # React to keys immediately
         self.stdscr.keypad(True)  # Enable special keys
-        self.init_colors()
-    def init_colors(self):
-        curses.start_color()
-        curses.init_pair(1, curses.COLOR_MAGENTA, curses.COLOR_BLACK)
-        curses.init_pair(2, curses.COLOR_CYAN, curses.COLOR_BLACK)
-        curses.init_pair(3, curses.COLOR_BLUE, curses.COLOR_BLACK)
-        curses.init_pair(4, curses.COLOR_GREEN, curses.COLOR_BLACK)
-        curses.init_pair(5, curses.COLOR_RED, curses.COLOR_BLACK)
-        curses.init_pair(6, curses.COLOR_YELLOW, curses.COLOR_BLACK)
-    
+
+    @property
+    def height(self):
+        return self.screen.height
+
+    @property
+    def width(self):
+        return self.screen.width
+
     def handle_resize(self):
-        self.height, self.width = self.stdscr.getmaxyx()
-        self.stdscr.clear()
-        curses.resizeterm(self.height, self.width)
-    
-    def safe_addstr(self, y, x, text, attr=curses.A_NORMAL):
-        """Safe string writing with boundary checking"""
-        if y < 0 or x < 0 or y >= self.height or x >= self.width:
-            return
-        text = text[:self.width - x - 1]
-        try:
-            self.stdscr.addstr(y, x, text, attr)
-        except:
-            pass
-    
+        self.screen.resize()
+
     def render_main_menu(self, state):
-        self.stdscr.clear()
-        self.height, self.width = self.stdscr.getmaxyx()
-        
-        # Header with balances
-        header = f"⏳ {state.toki_balance} toki  💳 {state.eddie_balance} eddie"
-        header_x = max(0, self.width - len(header) - 1)
-        self.safe_addstr(0, header_x, header, curses.color_pair(2))
-        
-        # Menu title
-        self.safe_addstr(2, 0, f"ZAMAN NETWORK: {state.username}", curses.color_pair(1))
-        
-        # Menu options
-        for idx, option in enumerate(state.menu_options):
-            y = 4 + idx
-            if y >= self.height - 2:
-                break
-                
-            color = curses.color_pair(4)  # Green
-            if idx == state.selected_option:
-                color = curses.color_pair(3) | curses.A_REVERSE
-            
-            self.safe_addstr(y, 2, f"{idx+1}. {option}", color)
-        
-        # Instructions at bottom
-        instr_y = min(self.height - 1, 10)
-        self.safe_addstr(instr_y, 0, "↑↓: Navigate  ENTER: Select", curses.color_pair(2))
-        
-        self.stdscr.refresh()
-    
+        with self.screen.frame("render_main_menu"):
+            # Header with balances
+            header = f"⏳ {state.toki_balance} toki  💳 {state.eddie_balance} eddie"
+            header_x = max(0, self.width - len(header) - 3)  # The two emoji take two columns each
+            self.screen.put(0, header_x, header, color("info"))
+
+            # Menu title
+            self.screen.put(2, 0, f"ZAMAN NETWORK: {state.username}", color("title"))
+
+            # Menu options
+            for idx, option in enumerate(state.menu_options):
+                y = 4 + idx
+                if y >= self.height - 2:
+                    break
+
+                attr = color("success")  # Green
+                if idx == state.selected_option:
+                    attr = color("highlight") | curses.A_REVERSE
+
+                self.screen.put(y, 2, f"{idx+1}. {option}", attr)
+
+            # Instructions at bottom
+            instr_y = min(self.height - 1, 10)
+            self.screen.put(instr_y, 0, "↑↓: Navigate  ENTER: Select", color("info"))
+
     def get_numeric_input(self, prompt):
         """Get numeric input from user"""
-        self.stdscr.addstr(self.height-3, 0, prompt, curses.color_pair(6))
+        self.screen.put(self.height-3, 0, prompt, color("prompt"))
         curses.echo()
         curses.curs_set(1)
         input_str = self.stdscr.getstr(self.height-2, 0, 10).decode()
         curses.noecho()
         curses.curs_set(0)
+        self.screen.forget([self.height-2])  # Echoed input
         try:
             return int(input_str)
         except ValueError:
             return None
-    
+
     def show_message(self, message, is_success=True):
         """Show status message"""
-        color = curses.color_pair(4) if is_success else curses.color_pair(5)
-        self.safe_addstr(self.height-4, 0, message, color)
-        self.safe_addstr(self.height-2, 0, "Press any key to continue...", curses.color_pair(2))
+        attr = color("success") if is_success else color("error")
+        self.screen.put(self.height-4, 0, message, attr)
+        self.screen.put(self.height-2, 0, "Press any key to continue...", color("info"))
         self.stdscr.getch()
-    
+
     def handle_menu_selection(self, state):
         option = state.menu_options[state.selected_option]
-        
-        
+
+
         if option == "Cash Out Tokis":
             self.handle_cash_out(state)
         elif option == "Buy Tokis":
             self.handle_buy_toki(state)
         elif option == "View Ledger":
             self.view_ledger(state)
+        elif option == "Transaction History":
+            self.view_history(state)
         elif option == "Logout":
             return "logout"
         return None
 
     def view_ledger(self, state):
         """Display transaction ledger"""
-        self.stdscr.clear()
-        try:
-            with open(state.ledger_file, 'r') as f:
-                ledger = json.load(f)
-                
-            self.safe_addstr(0, 0, "ZAMAN LEDGER", curses.A_BOLD | curses.color_pair(1))
-            self.safe_addstr(2, 0, f"Total Fees Collected: {ledger['total_fees']}", curses.color_pair(2))
-            
+        state.ledger.refresh()
+        with self.screen.frame("ledger_frame"):
+            self.screen.put(0, 0, "ZAMAN LEDGER", curses.A_BOLD | color("title"))
+            self.screen.put(2, 0, f"Total Fees Collected: {state.ledger.total_fees}", color("info"))
+
             row = 4
-            for tx in reversed(ledger['transactions'][-10:]):  # Show last 10
+            for tx in state.ledger.recent(10):  # Show last 10
                 if row >= self.height - 2:
                     break
-                
+
                 tx_str = (f"{tx['timestamp'][:16]} | {tx['username']} | {tx['type']} | "
                          f"Amount: {tx['amount']} | Fee: {tx['fee']}")
-                self.safe_addstr(row, 0, tx_str, curses.color_pair(3))
+                self.screen.put(row, 0, tx_str, color("highlight"))
                 row += 1
-                
-        except FileNotFoundError:
-            self.safe_addstr(2, 0, "No ledger data found", curses.color_pair(5))
-            
-        self.safe_addstr(self.height-2, 0, "Press any key to continue...", curses.color_pair(2))
+
+            if not state.ledger.count:
+                self.screen.put(4, 0, "No ledger data found", color("error"))
+
+            self.screen.put(self.height-2, 0, "Press any key to continue...", color("info"))
         self.stdscr.getch()
-    
+
+    def view_diagnostics(self):
+        """Live instrumentation numbers (hidden: "D" in the main menu)"""
+        while True:
+            with self.screen.frame("diagnostics_frame"):
+                self.screen.put(0, 0, "DIAGNOSTICS", curses.A_BOLD | color("title"))
+                if not metrics.ENABLED:
+                    self.screen.put(2, 0, "Instrumentation is off. Start with ZAMAN_METRICS=1 to collect timings.",
+                                    color("prompt"))
+                else:
+                    snapshot = metrics.registry.snapshot()
+                    self.screen.put(1, 0, f"Up {snapshot['uptime_s']}s, dumped to {metrics.METRICS_FILE} "
+                                          f"every {metrics.DUMP_INTERVAL:g}s", color("info"))
+                    self.screen.put(3, 0, f"{'timer':<20} {'count':>8} {'mean us':>10} {'p50 us':>9} "
+                                          f"{'p95 us':>9} {'p99 us':>9} {'max us':>10}", curses.A_BOLD)
+                    row = 4
+                    for name, t in snapshot["timers"].items():
+                        self.screen.put(row, 0, f"{name:<20} {t['count']:>8} {t['mean_us']:>10} {t['p50_us']:>9} "
+                                                f"{t['p95_us']:>9} {t['p99_us']:>9} {t['max_us']:>10}",
+                                        color("success"))
+                        row += 1
+                    row += 1
+                    for name, value in snapshot["counters"].items():
+                        self.screen.put(row, 0, f"{name:<20} {value:>8}", color("highlight"))
+                        row += 1
+                self.screen.put(self.height-2, 0, f"Last frame {self.screen.last_frame_ms:.2f} ms | "
+                                                  f"W: Write metrics file now | any other key: Back",
+                                color("info"))
+
+            key, _ = self.screen.read_key(1000)  # Redraw every second while open
+            if key == -1:
+                continue
+            if key in (ord('w'), ord('W')) and metrics.ENABLED:
+                metrics.registry.dump()
+                continue
+            if key == curses.KEY_RESIZE:
+                self.handle_resize()
+                continue
+            return
+
+    def view_history(self, state):
+        """Page through this user's own transactions, newest first"""
+        page_size = max(1, self.height - 6)
+        cursors = [None]  # `before` cursor of every page visited so far
+        transactions, next_cursor = state.history_page(None, page_size)
+
+        while True:
+            with self.screen.frame("history_frame"):
+                self.screen.put(0, 0, f"TRANSACTION HISTORY: {state.username}", curses.A_BOLD | color("title"))
+                self.screen.put(1, 0, f"Page {len(cursors)}", color("info"))
+
+                row = 3
+                for tx in transactions:
+                    tx_str = (f"{tx['timestamp'][:16]} | {tx['type']} | "
+                             f"Amount: {tx['amount']} | Fee: {tx['fee']}")
+                    self.screen.put(row, 0, tx_str, color("highlight"))
+                    row += 1
+                if not transactions:
+                    self.screen.put(row, 0, "No transactions yet", color("error"))
+
+                self.screen.put(self.height-2, 0, "PgDn: Older  PgUp: Newer  Q: Back", color("info"))
+            key, count = self.screen.read_key()
+
+            if key == curses.KEY_NPAGE and next_cursor is not None:
+                for _ in range(count):  # Held PgDn: skip the pages in between
+                    if next_cursor is None:
+                        break
+                    cursors.append(next_cursor)
+                    transactions, next_cursor = state.history_page(next_cursor, page_size)
+            elif key == curses.KEY_PPAGE and len(cursors) > 1:
+                del cursors[max(1, len(cursors) - count):]
+                transactions, next_cursor = state.history_page(cursors[-1], page_size)
+            elif key in (ord('q'), ord('Q'), 27):
+                break
+            elif key == curses.KEY_RESIZE:
+                self.handle_resize()
+
     def handle_earn_toki(self, state):
-        self.stdscr.clear()
         self.render_main_menu(state)
-        
+
         amount = self.get_numeric_input("Enter tokis earned (2-3 per task):")
         if amount is None:
             self.show_message("Invalid amount! Must be a number", False)
             return
-        
+
         success, message = state.earn_toki(amount)
         self.show_message(message, success)
-    
+
     def handle_cash_out(self, state):
-        self.stdscr.clear()
         self.render_main_menu(state)
-        
+
         amount = self.get_numeric_input("Enter tokis to cash out (1 toki = 190 eddies):")
         if amount is None:
             self.show_message("Invalid amount! Must be a number", False)
             return
-        
+
         success, message = state.cash_out(amount)
         self.show_message(message, success)
-    
+
     def handle_buy_toki(self, state):
-        self.stdscr.clear()
         self.render_main_menu(state)
-        
+
         amount = self.get_numeric_input("Enter tokis to buy (190 eddies = 1 toki):")
         if amount is None:
             self.show_message("Invalid amount! Must be a number", False)
             return
-        
+
         success, message = state.buy_toki(amount)
         self.show_message(message, success)
-    
+
     def handle_create_task(self, state):
         """Returns True if task was created successfully"""
-        self.stdscr.clear()
-        # Add this at the start of handle_create_task:
-        self.safe_addstr(0, 40, f"Your Eddie Balance: {state.eddie_balance}", curses.color_pair(2))
-        # Get task description
-        self.safe_addstr(0, 0, "Enter task description (max 100 chars):", curses.color_pair(3))
+        with self.screen.frame("create_task_frame"):
+            self.screen.put(0, 40, f"Your Eddie Balance: {state.eddie_balance}", color("info"))
+            # Get task description
+            self.screen.put(0, 0, "Enter task description (max 100 chars):", color("highlight"))
         curses.echo()
         description = self.stdscr.getstr(1, 0, 100).decode().strip()
         curses.noecho()
-        
+        self.screen.forget([1, 2])  # Echoed input, up to two lines on a narrow screen
+
         if not description:
             self.show_message("Description cannot be empty!", False)
             return False
-        
+
         # Get Eddie cost
-        self.safe_addstr(3, 0, "Enter Eddie cost (90-950):", curses.color_pair(3))
+        self.screen.put(3, 0, "Enter Eddie cost (90-950):", color("highlight"))
         eddie_cost = self.get_numeric_input("Eddie cost:")
-        
+
         if not (90 <= eddie_cost <= 950):
             self.show_message("Eddie cost must be 190-950", False)
             return False
-        
+
         # Attempt creation
-        success, message, task = state.task_manager.create_task(
-            description=description,
-            creator=state.username,
-            eddie_cost=eddie_cost,
-            user_balance=state.eddie_balance
-        )
-        
-        if success:
-            state.eddie_balance -= eddie_cost
-            state.save_stats()
-        
+        success, message, task = state.create_task(description, eddie_cost)
+
         self.show_message(message, success)
         return success
-    
\ No newline at end of file
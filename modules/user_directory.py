@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from .locking import file_lock, atomic_write_json, read_json
+
+SHARD_COUNT = 1024  # ~1k accounts per shard at a million users
+
+
+class UserDirectory:
+    """Credentials sharded by username hash into append-only files.
+
+    users/<shard>.jsonl holds one {"username", "password_hash"} line per
+    account whose name hashes to that shard. Registering appends a line to
+    one shard. A lookup stats the shard and reads only the bytes appended
+    since this process last read it, so neither depends on how many
+    accounts exist elsewhere. The shard count lives in users/meta.json.
+    The first line for a name wins, so a registration can never overwrite
+    an existing account.
+    """
+
+    def __init__(self, directory, legacy_file=None, shards=SHARD_COUNT):
+        self.directory = Path(directory)
+        self.meta_file = self.directory / "meta.json"
+        self.legacy_file = Path(legacy_file) if legacy_file else None  # Old single users.json
+        self.shards = shards
+        self.cache = {}  # shard -> {"users": {...}, "inode": ..., "offset": ...}
+
+    def initialize(self):
+        """Create the shards, importing users.json on first run"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.meta_file):
+            meta = read_json(self.meta_file)
+            if isinstance(meta, dict):
+                self.shards = meta["shards"]
+                return
+            legacy = read_json(self.legacy_file, {}) if self.legacy_file else {}
+            lines = {}
+            for username, password_hash in (legacy.items() if isinstance(legacy, dict) else ()):
+                lines.setdefault(self.shard(username), []).append(self.record(username, password_hash))
+            for shard, records in lines.items():
+                with open(self.shard_path(shard), 'w') as f:
+                    f.write("".join(records))
+            # Written last: until it exists, a crashed import is simply redone from scratch
+            atomic_write_json(self.meta_file, {"shards": self.shards, "version": 1})
+
+    def shard(self, username):
+        digest = hashlib.blake2b(username.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.shards
+
+    def shard_path(self, shard):
+        return self.directory / f"{shard:03x}.jsonl"
+
+    @staticmethod
+    def record(username, password_hash):
+        return json.dumps({"username": username, "password_hash": password_hash}) + "\n"
+
+    def load_shard(self, shard):
+        """Cached users of one shard, reading only what was appended since last time"""
+        path = self.shard_path(shard)
+        entry = self.cache.get(shard)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.cache.pop(shard, None)
+            return {}
+        if entry is None or entry["inode"] != stat.st_ino or stat.st_size < entry["offset"]:
+            entry = self.cache[shard] = {"users": {}, "inode": stat.st_ino, "offset": 0}
+        if stat.st_size > entry["offset"]:
+            with open(path, 'rb') as f:
+                f.seek(entry["offset"])
+                data = f.read()
+            data = data[:data.rfind(b"\n") + 1]  # A registration still being written
+            users = entry["users"]
+            for line in data.splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                users.setdefault(record["username"], record["password_hash"])
+            entry["offset"] += len(data)
+        return entry["users"]
+
+    def get(self, username):
+        """Password hash of `username`, or None"""
+        return self.load_shard(self.shard(username)).get(username)
+
+    def add(self, username, password_hash):
+        """Append a new account; False if the name is taken"""
+        shard = self.shard(username)
+        path = self.shard_path(shard)
+        with file_lock(path):
+            if username in self.load_shard(shard):
+                return False
+            with open(path, 'ab+') as f:
+                data = self.record(username, password_hash).encode()
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data  # Seal a torn line left by a crashed registration
+                f.write(data)
+        return True
+
+    def __iter__(self):
+        """(username, password_hash) pairs, shard by shard"""
+        for shard in range(self.shards):
+            yield from self.load_shard(shard).items()
+
+    def __len__(self):
+        return sum(len(self.load_shard(shard)) for shard in range(self.shards))
@@ -0,0 +1,109 @@
+"""AccountTable: slots, records, journals and growth of the mapped file."""
+import json
+import multiprocessing
+
+from modules import account_table
+from modules.account_table import AccountTable
+from modules.storage import DEFAULT_STATS
+
+STATS = {"toki_balance": 10, "eddie_balance": 500, "tasks_completed": 0}
+
+
+def test_journal_path_stays_in_the_journal_dir(tmp_path):
+    table = AccountTable(tmp_path / "accounts")
+    for username in ("../escape", "a/b", "..", "100%"):
+        path = table.journal_path(username)
+        assert path.parent == table.journal_dir
+    assert table.journal_path("alice").name == "alice.journal"
+
+
+def test_growing_the_table_closes_replaced_maps(tmp_path, monkeypatch):
+    monkeypatch.setattr(account_table, "GROW_RECORDS", 1)
+    table = AccountTable(tmp_path / "accounts")
+    table.initialize()
+    for n in range(200):
+        table.write(f"user{n}", {**STATS, "toki_balance": n})
+    retired = list(table.retired)
+    assert retired
+    table.close()
+    assert all(mapped.closed for mapped in retired)
+    assert table.read("user199")["toki_balance"] == 199  # Reopened on demand
+    table.close()
+
+
+def allocate_users(directory, prefix, count):
+    table = AccountTable(directory)
+    for n in range(count):
+        table.write(f"{prefix}{n}", {**STATS, "toki_balance": n})
+    table.close()
+
+
+def test_slots_are_unique_across_processes_and_reopening(tmp_path, monkeypatch):
+    monkeypatch.setattr(account_table, "GROW_RECORDS", 3)  # Processes grow the file under each other
+    directory = tmp_path / "accounts"
+    AccountTable(directory).initialize()  # The empty table, before the processes race to create it
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=allocate_users, args=(directory, f"p{index}-", 40))
+               for index in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    table = AccountTable(directory)
+    accounts = dict(table)
+    assert len(accounts) == 160
+    slots = [table.slot(username) for username in accounts]
+    assert sorted(slots) == list(range(160))  # None given out twice, none skipped
+    assert all(accounts[f"p{index}-{n}"]["toki_balance"] == n for index in range(4) for n in range(40))
+    assert table.slot("nobody") is None
+    assert table.slot("nobody", create=True) == 160
+    table.close()
+
+
+def test_a_torn_index_line_is_sealed_before_the_next_slot(tmp_path):
+    directory = tmp_path / "accounts"
+    table = AccountTable(directory)
+    table.write("alice", STATS)
+    shard_path = table.shard_path(table.shard("alice"))
+    with open(shard_path, 'ab') as f:
+        f.write(b'{"username": "ghost", "sl')  # A crash while recording a slot
+    other = next(f"user{n}" for n in range(1000) if table.shard(f"user{n}") == table.shard("alice"))
+    table.write(other, {**STATS, "toki_balance": 7})
+    table.close()
+
+    reopened = AccountTable(directory)
+    assert reopened.read("alice") == {**STATS, "version": 0, "ledger_seq": 0, "journal_seq": 0}
+    assert reopened.read(other)["toki_balance"] == 7
+    assert reopened.slot("ghost") is None
+    reopened.close()
+
+
+def test_stats_files_and_their_journals_are_imported_once(tmp_path):
+    legacy = tmp_path / "stats"
+    legacy.mkdir()
+    (legacy / "alice.json").write_text(json.dumps({**STATS, "version": 3, "journal_seq": 1}))
+    (legacy / "alice.journal").write_text(
+        json.dumps({"seq": 1, "deltas": [0, -100, 0]}) + "\n"  # Already in the stats file
+        + json.dumps({"seq": 2, "deltas": [0, -50, 0]}) + "\n"
+        + '{"seq": 3, "del')  # Torn
+    (legacy / "bob.json").write_text("not json")
+    stale = tmp_path / ".accounts.import"  # Left by an import that crashed
+    (stale / "index").mkdir(parents=True)
+    (stale / "table.bin").write_bytes(b"partial")
+
+    table = AccountTable(tmp_path / "accounts", legacy)
+    assert table.read("alice") == {**STATS, "eddie_balance": 450, "version": 4,
+                                   "ledger_seq": 0, "journal_seq": 2}
+    assert table.read("bob") == {**DEFAULT_STATS, "version": 0, "ledger_seq": 0, "journal_seq": 0}
+    assert not stale.exists()
+    table.write("alice", {**STATS, "eddie_balance": 1})
+    table.close()
+
+    (legacy / "carol.json").write_text(json.dumps(STATS))  # Too late: stats/ is only read once
+    table = AccountTable(tmp_path / "accounts", legacy)
+    assert table.read("alice")["eddie_balance"] == 1
+    assert table.read("carol") is None
+    assert (legacy / "alice.json").exists()
+    table.close()
@@ -0,0 +1,29 @@
+"""The marketplace screen's search results outlive tasks other sessions take."""
+from modules import browse_tasks
+from modules.browse_tasks import BrowseTasks
+from modules.storage import JSONBackend
+from modules.task_manager import TaskManager
+
+
+class FakeScreen:
+    def getmaxyx(self):
+        return 30, 100
+
+
+def test_search_window_drops_tasks_gone_since_the_last_poll(tmp_path, monkeypatch):
+    monkeypatch.setattr(browse_tasks, "screen_for", lambda stdscr: None)  # Nothing is drawn
+    backend = JSONBackend(tmp_path / "data")
+    backend.initialize()
+    task_manager = TaskManager(backend)
+    ids = [task_manager.create_task(f"Deliver crate {n}", "alice", 100, 10**9)[2]["id"] for n in range(5)]
+    browse = BrowseTasks(FakeScreen(), task_manager, None)
+    browse.query = "crate"
+    browse.reload()
+    assert browse.total == 5
+
+    task_manager.complete_task(ids[1], "bob")  # The feed has not been polled since
+    browse.results.insert(2, 999)  # An id no longer in the store, as after archiving
+
+    tasks = browse.tasks_window(0, 10)
+    assert [task["id"] for task in tasks] == [ids[0], ids[2], ids[3], ids[4]]
+    assert browse.total == 4
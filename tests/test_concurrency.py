@@ -0,0 +1,61 @@
+"""Sessions in separate processes sharing one data/ never complete a task twice."""
+import multiprocessing
+
+import pytest
+
+from modules.state import AppState
+from modules.storage import DEFAULT_STATS, JSONBackend, SQLiteBackend
+from modules.task_manager import TaskManager
+
+WORKERS = 4
+TASKS = 40
+
+
+def open_backend(kind, data_dir):
+    backend = SQLiteBackend(data_dir / "zaman.db") if kind == "sqlite" else JSONBackend(data_dir)
+    backend.initialize()
+    return backend
+
+
+def worker(kind, data_dir, username, task_ids, results):
+    backend = open_backend(kind, data_dir)  # Its own connection and files, like another session
+    state = AppState(username, backend, task_manager=TaskManager(backend))
+    won = [task_id for task_id in task_ids if state.complete_task(task_id)]
+    state.logout()
+    results.put((username, won))
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_each_task_is_completed_and_paid_exactly_once(tmp_path, kind):
+    backend = open_backend(kind, tmp_path)
+    usernames = [f"worker{n}" for n in range(WORKERS)]
+    for username in usernames:
+        backend.add_user(username, "unused", dict(DEFAULT_STATS))
+    manager = TaskManager(backend)
+    rewards = {}
+    for n in range(TASKS):
+        task = manager.create_task(f"Race {n}", "publisher", 10 + n, 10**9)[2]
+        rewards[task["id"]] = task["reward"]
+    manager.wait_for_compaction()
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(kind, tmp_path, username, list(rewards), results))
+                 for username in usernames]
+    for process in processes:
+        process.start()
+    outcomes = dict(results.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    won = [task_id for ids in outcomes.values() for task_id in ids]
+    assert sorted(won) == sorted(rewards)  # Every task once, none twice
+
+    backend = open_backend(kind, tmp_path)
+    manager = TaskManager(backend)
+    for username, ids in outcomes.items():
+        assert all(manager.get_task(task_id)["completed_by"] == username for task_id in ids)
+        stats = backend.load_stats(username)
+        assert stats["tasks_completed"] == len(ids)
+        assert stats["eddie_balance"] == DEFAULT_STATS["eddie_balance"] + sum(rewards[i] for i in ids)
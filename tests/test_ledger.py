@@ -0,0 +1,113 @@
+"""Ledger: segments, checkpoint recovery and the per-user history index."""
+import json
+import shutil
+
+from modules.ledger import Ledger
+
+
+def entry(username, fee=0.0, amount=1):
+    return {"username": username, "type": "buy", "amount": amount, "fee": fee,
+            "timestamp": "2026-01-01T00:00:00"}
+
+
+def open_ledger(tmp_path, **kwargs):
+    return Ledger(tmp_path / "ledger", tmp_path / "zaman_ledger.json", **kwargs)
+
+
+def test_torn_tail_is_cut_and_the_next_append_starts_clean(tmp_path):
+    ledger = open_ledger(tmp_path)
+    ledger.append_many([entry("alice", 0.5), entry("bob", 0.25)])
+    segment = ledger.segment_path(ledger.segment)
+    complete = segment.stat().st_size
+    with open(segment, 'ab') as f:
+        f.write(b'{"username": "alice", "type": "bu')  # A crash in the middle of a write
+
+    ledger = open_ledger(tmp_path)
+    assert segment.stat().st_size == complete
+    assert (ledger.count, ledger.total_fees) == (2, 0.75)
+    ledger.append(entry("alice", 1.0))
+    assert [tx["seq"] for tx in ledger.iter_transactions()] == [1, 2, 3]
+    assert ledger.total_fees == 1.75
+
+
+def test_records_past_the_checkpoint_are_folded_in_once(tmp_path):
+    ledger = open_ledger(tmp_path)
+    ledger.append(entry("alice", 0.5))
+    stale = ledger.checkpoint_file.read_text()
+    ledger.append_many([entry("alice", 0.25), entry("bob", 1.0)])
+    ledger.checkpoint_file.write_text(stale)  # Crash after the write, before the checkpoint
+
+    ledger = open_ledger(tmp_path)
+    assert (ledger.count, ledger.total_fees) == (3, 1.75)
+    assert json.loads(ledger.checkpoint_file.read_text())["count"] == 3
+    # Their index pointers were already written; recovery must not add them again
+    assert [tx["seq"] for tx in ledger.history("alice")[0]] == [2, 1]
+    assert [tx["seq"] for tx in ledger.history("bob")[0]] == [3]
+
+
+def test_recovery_follows_segments_rolled_over_after_the_checkpoint(tmp_path):
+    ledger = open_ledger(tmp_path, segment_max_bytes=1)  # Every append opens a new segment
+    ledger.append(entry("alice", 0.5))
+    stale = ledger.checkpoint_file.read_text()
+    for _ in range(3):
+        ledger.append(entry("alice", 0.5))
+    ledger.checkpoint_file.write_text(stale)
+
+    ledger = open_ledger(tmp_path, segment_max_bytes=1)
+    assert ledger.segment_numbers() == [1, 2, 3, 4]
+    assert (ledger.segment, ledger.count, ledger.total_fees) == (4, 4, 2.0)
+
+
+def test_lost_checkpoint_is_rebuilt_from_the_segments(tmp_path):
+    ledger = open_ledger(tmp_path, segment_max_bytes=1)
+    for fee in (0.1, 0.2, 0.3):
+        ledger.append(entry("alice", fee))
+    ledger.checkpoint_file.unlink()
+
+    ledger = open_ledger(tmp_path, segment_max_bytes=1)
+    assert (ledger.count, ledger.total_fees) == (3, 0.6)
+    ledger.append(entry("alice"))
+    assert [tx["seq"] for tx in ledger.iter_transactions()] == [1, 2, 3, 4]
+
+
+def test_legacy_single_file_ledger_is_imported(tmp_path):
+    legacy = {"total_fees": 1.5, "transactions": [entry("alice", 1.0), entry("bob", 0.5)]}
+    (tmp_path / "zaman_ledger.json").write_text(json.dumps(legacy))
+    ledger = open_ledger(tmp_path)
+    assert (ledger.count, ledger.total_fees) == (2, 1.5)
+    assert ledger.load() == {"total_fees": 1.5, "transactions": legacy["transactions"]}
+
+
+def all_pages(ledger, username, limit):
+    pages, cursor = [], None
+    while True:
+        page, cursor = ledger.history(username, cursor, limit)
+        pages.append([tx["seq"] for tx in page])
+        if cursor is None:
+            return pages
+
+
+def test_history_pages_back_through_one_users_entries(tmp_path):
+    ledger = open_ledger(tmp_path, segment_max_bytes=300)  # Pointers span several segments
+    for n in range(25):
+        ledger.append_many([entry("alice", amount=n), entry("bob", amount=n)])
+    assert len(ledger.segment_numbers()) > 3
+
+    pages = all_pages(ledger, "alice", 10)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sum(pages, []) == list(range(49, 0, -2))  # Alice's seqs, newest first
+    assert ledger.history("carol") == ([], None)
+
+
+def test_index_is_rebuilt_from_the_segments(tmp_path):
+    ledger = open_ledger(tmp_path, segment_max_bytes=300)
+    for n in range(12):
+        ledger.append(entry("a/b" if n % 3 else "alice", amount=n))  # "/" must not leave index/
+    before = {name: all_pages(ledger, name, 4) for name in ("alice", "a/b")}
+    with open(ledger.segment_path(ledger.segment), 'ab') as f:
+        f.write(b'{"username": "alice", "amo')  # Torn tail: no pointer may lead to it
+    shutil.rmtree(ledger.index_dir)
+
+    ledger = open_ledger(tmp_path, segment_max_bytes=300)
+    assert sorted(p.name for p in ledger.index_dir.iterdir()) == ["a%2Fb.idx", "alice.idx"]
+    assert {name: all_pages(ledger, name, 4) for name in ("alice", "a/b")} == before
@@ -0,0 +1,19 @@
+"""Archive queries agree with a plain scan of the JSON segments."""
+import random
+from datetime import timedelta
+
+import pytest
+
+from benchmarks.bench_ledger_archive import fill, scan
+from modules.ledger import Ledger
+
+
+@pytest.mark.parametrize("metric, by", [("count", None), ("amount", None), ("fee", "day"),
+                                        ("amount", "type"), ("amount", "user"), ("count", "user")])
+def test_filtered_queries_match_a_scan(tmp_path, metric, by):
+    start = fill(tmp_path / "ledger", 3000, 40, 30, random.Random(7))
+    ledger = Ledger(tmp_path / "ledger", tmp_path / "none.json")
+    ledger.archive.compact(ledger)
+    week = {"types": "buy", "since": (start + timedelta(days=7)).date().isoformat(),
+            "until": (start + timedelta(days=13)).date().isoformat()}
+    assert ledger.summarize(metric, by, **week) == scan(ledger, metric, by, week)
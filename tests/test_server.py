@@ -0,0 +1,105 @@
+"""Server requests act on the storage the server owns."""
+import asyncio
+import json
+
+import auth
+from modules.passwords import hash_password
+from modules import stats_cache
+from modules.account_table import AccountTable
+from modules.server import Session, ZamanServer
+from modules.storage import DEFAULT_STATS, JSONBackend, SQLiteBackend
+from modules.task_manager import TaskManager
+
+
+def test_failed_request_rolls_back_its_partial_writes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # error.log
+    backend = SQLiteBackend(tmp_path / "zaman.db")
+    backend.initialize()
+    for username in ("alice", "bob"):
+        backend.add_user(username, "unused", dict(DEFAULT_STATS))
+    server = ZamanServer(backend)
+    ok, _, task = server.task_manager.create_task("Deliver chips", "alice", 100, 10**9)
+    assert ok
+
+    alice, bob = Session(), Session()
+    server.start_session(alice, "alice")
+    server.start_session(bob, "bob")
+
+    def fail(*args):
+        raise RuntimeError("settlement failed")
+    # The task row is written before the reward is settled, so this fails halfway
+    monkeypatch.setattr(backend.settlements, "submit", fail)
+
+    responses = server.run_batch([
+        (alice, {"id": 1, "op": "buy_toki", "amount": 1}, None),
+        (bob, {"id": 2, "op": "complete_task", "task_id": task["id"]}, None),
+        (alice, {"id": 3, "op": "buy_toki", "amount": 1}, None),
+    ])
+    assert [r["ok"] for r in responses] == [True, False, True]
+
+    assert TaskManager(backend).get_task(task["id"])["status"] == "open"
+    assert server.task_manager.get_task(task["id"])["status"] == "open"
+    assert backend.load_stats("alice")["toki_balance"] == DEFAULT_STATS["toki_balance"] + 2
+    assert backend.load_stats("bob")["tasks_completed"] == 0
+    assert [e["username"] for e in backend.ledger.recent()] == ["alice", "alice"]
+    backend.close()
+
+
+def test_register_and_login_use_the_server_backend(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("ZAMAN_KDF", "pbkdf2:1000")
+    monkeypatch.setenv("ZAMAN_STORAGE", "json")  # What auth falls back to without the server's backend
+    auth.session_tokens.clear()  # The server holds this dict; no tokens from other tests' logins
+    backend = SQLiteBackend(tmp_path / "served" / "zaman.db")
+    backend.initialize()
+    backend.add_user("alice", hash_password("secret"), dict(DEFAULT_STATS))
+    server = ZamanServer(backend)
+
+    async def scenario():
+        address = f"unix:{tmp_path / 'zaman.sock'}"
+        await server.start(address)
+        reader, writer = await asyncio.open_unix_connection(str(tmp_path / "zaman.sock"))
+
+        async def call(op, **arguments):
+            writer.write(json.dumps({"id": 1, "op": op, **arguments}).encode() + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        replies = [await call("register", username="bob", password="pw"),
+                   await call("login", username="bob", password="pw"),
+                   await call("login", username="alice", password="secret"),
+                   await call("login", username="alice", password="wrong")]
+        replies.append(await call("resume", token=replies[0]["result"]["token"]))
+        writer.close()
+        await server.close(address)
+        return replies
+
+    replies = asyncio.run(scenario())
+    assert [r["ok"] for r in replies] == [True, True, True, False, True]
+    assert backend.get_password_hash("bob") is not None
+    # Tokens are signed with the served data dir's key, not one in the cwd's data/
+    assert (tmp_path / "served" / "session.key").exists()
+    assert not (tmp_path / "data").exists()
+    backend.close()
+
+
+def test_close_writes_what_the_batches_left_behind(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(stats_cache, "STATS_FLUSH_INTERVAL", 60)  # Only close() can write the record
+    backend = JSONBackend(tmp_path / "data")
+    backend.initialize()
+    backend.add_user("alice", "unused", dict(DEFAULT_STATS))
+    server = ZamanServer(backend)
+    alice = Session()
+
+    async def scenario():
+        await server.start(f"unix:{tmp_path / 'zaman.sock'}")
+        future = asyncio.get_running_loop().create_future()
+        server.start_session(alice, "alice")
+        await server.queue.put((alice, {"id": 1, "op": "buy_toki", "amount": 1}, future))
+        await server.close()  # Straight away: the request is still queued
+        return future.result()
+
+    assert asyncio.run(scenario())["ok"]
+    record = AccountTable(tmp_path / "data" / "accounts").read("alice")
+    assert record["toki_balance"] == DEFAULT_STATS["toki_balance"] + 1
@@ -0,0 +1,56 @@
+"""A settlement batch that fails part-way loses no reward and counts none twice."""
+import pytest
+
+from modules.settlement import SettlementPipeline
+from modules.storage import DEFAULT_STATS, JSONBackend, SQLiteBackend
+
+
+def open_backend(kind, data_dir):
+    backend = SQLiteBackend(data_dir / "zaman.db") if kind == "sqlite" else JSONBackend(data_dir)
+    backend.initialize()
+    return backend
+
+
+def rewards(backend, username):
+    return [entry for entry in backend.ledger.history(username, limit=100)[0] if entry["type"] == "task_reward"]
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_users_not_settled_are_retried_with_the_next_batch(tmp_path, monkeypatch, kind):
+    monkeypatch.setenv("ZAMAN_COMMIT_MODE", "async")  # Queue, settle on flush()
+    backend = open_backend(kind, tmp_path)
+    for username in ("alice", "bob"):
+        backend.add_user(username, "unused", dict(DEFAULT_STATS))
+    pipeline = backend._settlements = SettlementPipeline(backend, interval=3600)
+    pipeline.submit("alice", 1, 100)
+    pipeline.submit("bob", 2, 50)
+    pipeline.submit("alice", 3, 20)
+
+    change_balances = backend.change_balances
+    seen = {}
+
+    def failing_for_bob(username, *args, **kwargs):
+        if username == "bob":  # After alice's change was handed over
+            seen["alice"] = pipeline.pending("alice")
+            raise OSError("disk full")
+        return change_balances(username, *args, **kwargs)
+
+    monkeypatch.setattr(backend, "change_balances", failing_for_bob)
+    with pytest.raises(OSError):
+        pipeline.flush()
+    assert seen["alice"] == (0, 0)  # In the stored balance already, not also pending
+
+    assert backend.load_stats("alice")["eddie_balance"] == 620
+    assert backend.load_stats("alice")["tasks_completed"] == 2
+    assert pipeline.pending("alice") == (0, 0)
+    assert backend.load_stats("bob")["eddie_balance"] == 500
+    assert pipeline.pending("bob") == (50, 1)  # Back in the queue
+
+    monkeypatch.setattr(backend, "change_balances", change_balances)
+    pipeline.flush()
+    assert backend.load_stats("bob")["eddie_balance"] == 550
+    assert pipeline.pending("bob") == (0, 0)
+    assert backend.load_stats("alice")["eddie_balance"] == 620  # Not credited a second time
+    assert [entry["amount"] for entry in rewards(backend, "alice")] == [120]
+    assert [entry["amount"] for entry in rewards(backend, "bob")] == [50]
+    backend.close()
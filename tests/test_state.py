@@ -0,0 +1,30 @@
+"""AppState: balance changes and the tasks they pay for."""
+import pytest
+
+from modules.state import AppState
+from modules.storage import DEFAULT_STATS, JSONBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = JSONBackend(tmp_path / "data")
+    backend.initialize()
+    backend.add_user("alice", "unused", dict(DEFAULT_STATS))
+    yield backend
+    backend.close()
+
+
+def test_validate_task_input_checks_reward_and_balance():
+    assert AppState.validate_task_input(100, 100) == (True, "")
+    assert AppState.validate_task_input(100, 99) == (False, "Not enough eddies (Need 100, have 99)")
+    assert AppState.validate_task_input(5, 1000) == (False, "Eddies must be between 10-950")
+
+
+def test_create_task_charges_only_what_it_creates(backend):
+    state = AppState("alice", backend)
+    success, message, task = state.create_task("Too dear", DEFAULT_STATS["eddie_balance"] + 1)
+    assert not success and task is None and message.startswith("Not enough eddies")
+    success, _, task = state.create_task("Affordable", 100)
+    assert success and task["reward"] == 100
+    assert backend.load_stats("alice")["eddie_balance"] == DEFAULT_STATS["eddie_balance"] - 100
+    assert [t["id"] for t in state.task_manager.get_all_tasks()] == [task["id"]]
@@ -0,0 +1,82 @@
+"""Written-behind balances survive a crash through the ledger and the intent journal."""
+import multiprocessing
+import os
+
+from modules import stats_cache
+from modules.account_table import AccountTable
+from modules.state import AppState
+from modules.storage import DEFAULT_STATS, JSONBackend
+from modules.task_manager import TaskManager
+
+BALANCES = ("toki_balance", "eddie_balance", "tasks_completed")
+
+
+def session_then_crash(data_dir, conn):
+    backend = JSONBackend(data_dir)
+    backend.initialize()
+    state = AppState("alice", backend, task_manager=TaskManager(backend))
+    bought = state.buy_toki(1)[0]  # Ledger entry
+    created = state.create_task("Paid from the journal", 100)[0]  # No ledger entry: intent journal
+    conn.send((bought and created, {field: getattr(state, field) for field in BALANCES}))
+    os._exit(0)  # No flush, no atexit: the records are never written
+
+
+def balances(stats):
+    return {field: stats[field] for field in BALANCES}
+
+
+def test_crashed_sessions_changes_are_replayed(tmp_path, monkeypatch):
+    monkeypatch.setattr(stats_cache, "STATS_FLUSH_INTERVAL", 3600)  # Only an explicit flush writes
+    data_dir = tmp_path / "data"
+    backend = JSONBackend(data_dir)
+    backend.initialize()
+    backend.add_user("alice", "unused", dict(DEFAULT_STATS))
+    backend.close()
+
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=session_then_crash, args=(data_dir, sender))
+    child.start()
+    assert receiver.poll(60), "the session died before answering"
+    succeeded, answered = receiver.recv()
+    child.join()
+    assert succeeded
+
+    table = AccountTable(data_dir / "accounts")
+    assert balances(table.read("alice")) == balances(DEFAULT_STATS)  # The record never saw them
+    journal = table.journal_path("alice")
+    assert journal.exists()
+
+    backend = JSONBackend(data_dir)
+    backend.initialize()
+    assert balances(backend.load_stats("alice")) == answered
+    backend.flush()
+    assert balances(AccountTable(data_dir / "accounts").read("alice")) == answered
+    assert not journal.exists()  # Folded into the record
+
+
+def test_journal_records_are_applied_once_and_torn_lines_ignored(tmp_path, monkeypatch):
+    monkeypatch.setattr(stats_cache, "STATS_FLUSH_INTERVAL", 3600)
+    backend = JSONBackend(tmp_path / "data")
+    backend.initialize()
+    backend.add_user("alice", "unused", dict(DEFAULT_STATS))
+    state = AppState("alice", backend, task_manager=TaskManager(backend))
+    assert state.create_task("Charge", 100)[0]
+    journal = backend.accounts.journal_path("alice")
+    stale = journal.read_bytes()
+    backend.flush()
+    expected = balances(backend.load_stats("alice"))
+
+    # A journal the record already includes (journal_seq), plus a torn record
+    journal.write_bytes(stale + b'{"seq": 2, "deltas": [0, -5')
+    backend = JSONBackend(tmp_path / "data")
+    backend.initialize()
+    assert balances(backend.load_stats("alice")) == expected
+    assert journal.read_bytes() == stale  # The torn line is cut before anything is appended
+
+    state = AppState("alice", backend, task_manager=TaskManager(backend))
+    assert state.create_task("Another", 50)[0]
+    backend.close()
+    backend = JSONBackend(tmp_path / "data")
+    backend.initialize()
+    assert backend.load_stats("alice")["eddie_balance"] == expected["eddie_balance"] - 50
@@ -0,0 +1,31 @@
+"""Bulk import rejects rows it cannot charge for, without aborting the batch."""
+import io
+import json
+
+from modules.storage import DEFAULT_STATS, JSONBackend
+from modules.task_bulk import import_tasks
+from modules.task_manager import TaskManager
+
+
+def test_creator_without_stats_record_is_rejected(tmp_path):
+    backend = JSONBackend(tmp_path / "data")
+    backend.initialize()
+    backend.add_user("alice", "unused", dict(DEFAULT_STATS))
+    backend.users.add("ghost", "unused")  # Registered, but no account record
+    task_manager = TaskManager(backend)
+    rows = [{"description": "Fix the neon", "creator": "alice", "reward": 100},
+            {"description": "Haunt the net", "creator": "ghost", "reward": 100},
+            {"description": "Nobody's task", "creator": "nobody", "reward": 100},
+            {"description": "Too dear", "creator": "alice", "reward": 450}]
+    f = io.StringIO("".join(json.dumps(row) + "\n" for row in rows))
+
+    report = import_tasks(f, backend=backend, task_manager=task_manager)
+
+    assert report["imported"] == 1
+    assert report["errors"] == [
+        {"line": 2, "reason": "creator has no stats record"},
+        {"line": 3, "reason": "creator is not registered"},
+        {"line": 4, "reason": "creator has not enough eddies"},
+    ]
+    assert [t["creator"] for t in task_manager.get_all_tasks()] == ["alice"]
+    assert backend.load_stats("alice")["eddie_balance"] == DEFAULT_STATS["eddie_balance"] - 100
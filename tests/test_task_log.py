@@ -0,0 +1,83 @@
+"""JSONTaskLog: snapshot plus write-ahead log, replayed in order after a crash."""
+import json
+
+import pytest
+
+from modules.storage import JSONBackend
+from modules.storage.json_backend import JSONTaskLog
+from modules.task_manager import TaskManager
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = JSONBackend(tmp_path / "data")
+    backend.initialize()
+    return backend
+
+
+def tasks_on_disk(backend):
+    """What a freshly started session loads"""
+    log = JSONTaskLog(backend.data_dir)
+    log.initialize()
+    return [(task["id"], task["status"], task["completed_by"]) for task in log.store]
+
+
+def crash_before_snapshot(monkeypatch):
+    """Compactions rotate the log but die before writing tasks.json"""
+    monkeypatch.setattr(JSONTaskLog, "write_snapshot", lambda self, snapshot, lock: lock.release())
+
+
+def test_log_is_replayed_over_the_snapshot(backend):
+    manager = TaskManager(backend)
+    ids = [manager.create_task(f"Task {n}", "alice", 100, 10**9)[2]["id"] for n in range(3)]
+    manager.complete_task(ids[1], "bob")
+    assert json.loads((backend.data_dir / "tasks.json").read_text()) == []  # Nothing compacted yet
+    assert tasks_on_disk(backend) == [(ids[0], "open", None), (ids[1], "completed", "bob"),
+                                      (ids[2], "open", None)]
+
+
+def test_torn_last_record_is_ignored_then_cut(backend):
+    manager = TaskManager(backend)
+    first = manager.create_task("Task", "alice", 100, 10**9)[2]["id"]
+    with open(backend.data_dir / "tasks.wal", 'ab') as f:
+        f.write(b'{"op": "create", "task": {"id": 99')  # A crash in the middle of an append
+    assert tasks_on_disk(backend) == [(first, "open", None)]
+
+    manager = TaskManager(backend)
+    second = manager.create_task("Next", "alice", 100, 10**9)[2]["id"]
+    assert second == first + 1
+    assert tasks_on_disk(backend) == [(first, "open", None), (second, "open", None)]
+
+
+def test_rotated_log_is_replayed_before_the_live_one(backend, monkeypatch):
+    crash_before_snapshot(monkeypatch)
+    manager = TaskManager(backend)
+    task_id = manager.create_task("Task", "alice", 100, 10**9)[2]["id"]
+    manager.log.compact(wait=True)
+    manager.complete_task(task_id, "bob")  # Lands in the new log; its task is in the rotated one
+    assert (backend.data_dir / "tasks.wal.old").exists()
+    assert tasks_on_disk(backend) == [(task_id, "completed", "bob")]
+
+    # The next compaction keeps both logs' records, in order, until the snapshot is in
+    other = manager.create_task("Other", "alice", 100, 10**9)[2]["id"]
+    manager.log.compact(wait=True)
+    assert tasks_on_disk(backend) == [(task_id, "completed", "bob"), (other, "open", None)]
+
+    monkeypatch.undo()
+    manager.log.compact(wait=True)
+    assert not (backend.data_dir / "tasks.wal.old").exists()
+    assert [t["id"] for t in json.loads((backend.data_dir / "tasks.json").read_text())] == [task_id, other]
+    assert tasks_on_disk(backend) == [(task_id, "completed", "bob"), (other, "open", None)]
+
+
+def test_other_session_catches_up_across_a_rotation(backend, monkeypatch):
+    crash_before_snapshot(monkeypatch)
+    writer, reader = TaskManager(backend), TaskManager(backend)
+    first = writer.create_task("Before", "alice", 100, 10**9)[2]["id"]
+    reader.refresh()
+    second = writer.create_task("Unseen, then rotated", "alice", 100, 10**9)[2]["id"]
+    writer.log.compact(wait=True)
+    writer.complete_task(first, "bob")
+
+    reader.refresh()  # Rest of the rotated log from its offset, then the new log
+    assert [(t["id"], t["status"]) for t in reader.store] == [(first, "completed"), (second, "open")]
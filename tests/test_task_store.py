@@ -0,0 +1,104 @@
+"""TaskStore: ordered open-task indexes and the change feed."""
+import random
+
+import pytest
+
+from modules import task_store
+from modules.storage import JSONBackend
+from modules.task_manager import TaskManager
+from modules.task_store import TaskStore
+
+
+def make_tasks(n, seed=3):
+    rng = random.Random(seed)
+    return [{"id": i, "description": f"Task {i}", "creator": f"user{i % 7}",
+             "reward": rng.choice((10, 50, 50, 100, 950)),
+             "created_at": f"2026-01-{rng.randint(1, 28):02d}T00:00:00" if i % 11 else None,
+             "status": "completed" if i % 5 == 0 else "open", "completed_by": None}
+            for i in range(1, n + 1)]
+
+
+def expected(store, field, descending=False, low=None, high=None):
+    """Open task ids sorted by `field`, ties by id, the slow way"""
+    default = {"reward": 0, "created_at": ""}[field]
+    rows = sorted(((default if t[field] is None else t[field]), t["id"])
+                  for t in store if t["status"] == "open")
+    rows = [row for row in rows if (low is None or row[0] >= low) and (high is None or row[0] <= high)]
+    ids = [task_id for _, task_id in rows]
+    return ids[::-1] if descending else ids
+
+
+def window_ids(store, field, start, limit, **kwargs):
+    return [t["id"] for t in store.ordered_window(field, start, limit, **kwargs)]
+
+
+@pytest.mark.parametrize("field, low, high", [("reward", None, None), ("reward", 50, 100),
+                                              ("created_at", None, None), ("created_at", "2026-01-10", None)])
+@pytest.mark.parametrize("descending", [False, True])
+def test_ordered_windows_and_positions_match_a_sort(field, low, high, descending):
+    store = TaskStore(make_tasks(200))
+    order = expected(store, field, descending, low, high)
+    for start in (0, 7, len(order) - 3, len(order) + 5):
+        assert window_ids(store, field, start, 10, descending=descending, low=low, high=high) == \
+            order[start:start + 10]
+    for position, task_id in enumerate(order):
+        assert store.ordered_position(field, task_id, descending, low, high) == position
+    assert store.ordered_position(field, 5, descending, low, high) is None  # Completed
+
+
+def test_ordered_index_follows_changes_after_it_was_built():
+    store = TaskStore(make_tasks(100))
+    store.ordered_index("reward")  # Built now; later changes must keep it current
+    store.set_status(2, "completed", completed_by="bob")
+    store.set_status(10, "open")
+    store.remove(3)
+    store.add({"id": store.allocate_id(), "description": "New", "creator": "alice", "reward": 50,
+               "created_at": "2026-02-01T00:00:00", "status": "open", "completed_by": None})
+    store.apply({"op": "archive", "ids": [4, 6]})
+    assert window_ids(store, "reward", 0, 1000) == expected(store, "reward")
+    rebuilt = TaskStore(store.to_list())
+    assert store.ordered_index("reward") == rebuilt.ordered_index("reward")
+
+
+def open_task(task_id):
+    return {"id": task_id, "description": f"Task {task_id}", "creator": "alice", "reward": 10,
+            "created_at": "2026-01-01T00:00:00", "status": "open", "completed_by": None}
+
+
+def test_feed_reports_the_last_change_of_each_task_since_a_cursor():
+    store = TaskStore([open_task(1), open_task(2)])
+    cursor, changes = store.changes_since(None)
+    assert changes == []  # Loading is not a change
+    assert store.changes_since(cursor) == (cursor, [])
+
+    store.add(open_task(3))
+    store.set_status(1, "completed", completed_by="bob")
+    store.add(open_task(4))
+    store.set_status(4, "completed", completed_by="bob")  # Opened and closed again: only the last counts
+    cursor, changes = store.changes_since(cursor)
+    assert sorted(changes) == [[1, False], [3, True], [4, False]]
+    assert store.changes_since(cursor) == (cursor, [])
+
+
+def test_feed_sends_readers_it_cannot_serve_back_to_a_reload(monkeypatch):
+    monkeypatch.setattr(task_store, "FEED_SIZE", 3)
+    store = TaskStore([open_task(1)])
+    behind, _ = store.changes_since(None)
+    for task_id in range(2, 7):
+        store.add(open_task(task_id))
+    now, changes = store.changes_since(behind)
+    assert changes is None  # Older changes already fell out of the feed
+    assert store.changes_since([now[0], now[1] + 1])[1] is None  # A cursor from the future
+    assert TaskStore().changes_since(now)[1] is None  # Another store, e.g. after a reload
+
+
+def test_other_sessions_changes_arrive_through_poll_changes(tmp_path):
+    backend = JSONBackend(tmp_path / "data")
+    backend.initialize()
+    writer, reader = TaskManager(backend), TaskManager(backend)
+    cursor, _ = reader.poll_changes(None)
+    created = writer.create_task("Fresh", "alice", 100, 10**9)[2]["id"]
+    cursor, changes = reader.poll_changes(cursor)
+    assert changes == [[created, True]]
+    writer.complete_task(created, "bob")
+    assert reader.poll_changes(cursor)[1] == [[created, False]]
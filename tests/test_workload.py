@@ -0,0 +1,16 @@
+"""The workload driver runs every operation against the backend it was given."""
+import pytest
+
+import auth
+from benchmarks.workload import run
+
+
+@pytest.mark.parametrize("storage", ["json", "sqlite"])
+def test_logins_and_registrations_use_the_driver_backend(storage, monkeypatch):
+    monkeypatch.setenv("ZAMAN_KDF", "pbkdf2:1000")  # Keep the KDF cheap
+    monkeypatch.setenv("ZAMAN_STORAGE", "json")  # The default that auth used to fall back to
+    monkeypatch.setattr(auth, "session_tokens", {})  # No tokens from another case's logins
+    report = run(storage, users=5, tasks=10, transactions=60, mix={"login": 1, "register": 1})
+    for op in ("login", "register"):
+        stats = report["ops"][op]
+        assert stats["ok"] == stats["count"], op